@@ -0,0 +1,5 @@
+# Standalone performance benchmarks for the roster scraper.
+#
+# Run them from the repository root, e.g.:
+#
+#     python -m benchmarks.bench_brand_filter
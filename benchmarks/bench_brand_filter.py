@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the brand name filter
+Compares the original per-keyword substring loop with the compiled
+KeywordMatcher at different keyword list sizes
+"""
+
+import argparse
+import random
+import string
+import time
+
+from roster_scraper.matchers import KeywordMatcher
+from roster_scraper.pipelines import BrandNameFilterPipeline
+
+
+FIRST_NAMES = ["Nicole", "Sarah", "John", "Theodore", "Mike", "Emily", "Marco", "Priya"]
+LAST_NAMES = ["Johnson", "Coleman", "Davis", "Turner", "Smith", "Patel", "Costa", "Lee"]
+
+
+def generate_keywords(count, seed=42):
+    """Base brand keywords padded with random lowercase words"""
+    rng = random.Random(seed)
+    keywords = list(BrandNameFilterPipeline.BRAND_KEYWORDS)[:count]
+    seen = set(keywords)
+    while len(keywords) < count:
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12)))
+        if word not in seen:
+            seen.add(word)
+            keywords.append(word)
+    return keywords
+
+
+def generate_names(count, seed=7):
+    rng = random.Random(seed)
+    return [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(count)]
+
+
+def legacy_match(keywords, name):
+    """The original BrandNameFilterPipeline loop"""
+    name = name.lower()
+    for keyword in keywords:
+        if keyword in name:
+            return keyword
+    return None
+
+
+def run_benchmark(keyword_counts, name_count):
+    names = generate_names(name_count)
+
+    print(f"{'keywords':>10} {'build (ms)':>12} {'loop (names/s)':>16} {'matcher (names/s)':>18} {'speedup':>9}")
+    for count in keyword_counts:
+        keywords = generate_keywords(count)
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for name in names:
+            legacy_match(keywords, name)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for name in names:
+            matcher.search(name)
+        matcher_time = time.perf_counter() - start
+
+        print(
+            f"{count:>10} {build_time * 1000:>12.1f} "
+            f"{name_count / loop_time:>16,.0f} {name_count / matcher_time:>18,.0f} "
+            f"{loop_time / matcher_time:>8.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the brand name filter')
+    parser.add_argument('--keywords', type=str, default='20,2000,20000',
+                        help='Comma-separated keyword list sizes (default: 20,2000,20000)')
+    parser.add_argument('--names', type=int, default=20000,
+                        help='Number of names to scan per run (default: 20000)')
+    args = parser.parse_args()
+
+    run_benchmark([int(n) for n in args.keywords.split(',')], args.names)
+
+
+if __name__ == '__main__':
+    main()
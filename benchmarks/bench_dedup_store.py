@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dedup seen-key stores
+Measures insert throughput, the time to reopen a filled store, lookup
+throughput for keys that are present (hits) and absent (misses) and
+resident memory growth for the memory, SQLite and Bloom+SQLite stores.
+Dedup mostly looks up new emails, so misses are the case the Bloom filter
+is for. Each run happens in a fresh process so memory numbers do not leak
+between backends.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.utils import current_rss_mb
+from roster_scraper.stores import MemorySeenStore, SQLiteSeenStore, BloomSeenStore
+
+
+def make_key(i):
+    return f"user{i}@example{i % 500}.com"
+
+
+def open_store(backend, keys, directory):
+    if backend == 'memory':
+        return MemorySeenStore()
+    store = SQLiteSeenStore(os.path.join(directory, f"{backend}.sqlite3"), batch_size=50000)
+    if backend == 'bloom':
+        return BloomSeenStore(store, capacity=keys, error_rate=0.001, batch_size=50000)
+    return store
+
+
+def lookup_rate(store, keys, lookups, hits):
+    start = time.perf_counter()
+    for i in range(lookups):
+        key = make_key(i % keys) if hits else make_key(keys + i)
+        key in store
+    return lookups / (time.perf_counter() - start)
+
+
+def run_one(backend, keys, lookups, queue):
+    with tempfile.TemporaryDirectory() as directory:
+        rss_before = current_rss_mb()
+        store = open_store(backend, keys, directory)
+
+        start = time.perf_counter()
+        for i in range(keys):
+            store.add(make_key(i))
+        if hasattr(store, 'flush'):
+            store.flush()
+        insert_time = time.perf_counter() - start
+        rss_after = current_rss_mb()
+
+        # Startup of the next run: the Bloom filter loads its saved bits
+        reopen_time = None
+        if backend != 'memory':
+            store.close()
+            start = time.perf_counter()
+            store = open_store(backend, keys, directory)
+            reopen_time = time.perf_counter() - start
+
+        hit_rate = lookup_rate(store, keys, lookups, hits=True)
+        miss_rate = lookup_rate(store, keys, lookups, hits=False)
+        store.close()
+        queue.put({
+            'backend': backend,
+            'keys': keys,
+            'insert_per_sec': keys / insert_time,
+            'reopen_seconds': reopen_time,
+            'hit_per_sec': hit_rate,
+            'miss_per_sec': miss_rate,
+            'rss_growth_mb': rss_after - rss_before,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dedup seen-key stores')
+    parser.add_argument('--keys', type=str, default='1000000,50000000',
+                        help='Comma-separated key counts (default: 1000000,50000000)')
+    parser.add_argument('--lookups', type=int, default=200000,
+                        help='Lookups per run (default: 200000)')
+    parser.add_argument('--backends', type=str, default='memory,sqlite,bloom',
+                        help='Comma-separated backends (default: memory,sqlite,bloom)')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    print(
+        f"{'backend':>8} {'keys':>12} {'insert/s':>12} {'reopen (s)':>11} "
+        f"{'hit/s':>12} {'miss/s':>12} {'RSS growth (MB)':>16}"
+    )
+    for keys in (int(k) for k in args.keys.split(',')):
+        for backend in args.backends.split(','):
+            queue = ctx.Queue()
+            process = ctx.Process(target=run_one, args=(backend, keys, args.lookups, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            reopen = '-' if result['reopen_seconds'] is None else f"{result['reopen_seconds']:.3f}"
+            print(
+                f"{result['backend']:>8} {result['keys']:>12,} {result['insert_per_sec']:>12,.0f} "
+                f"{reopen:>11} {result['hit_per_sec']:>12,.0f} {result['miss_per_sec']:>12,.0f} "
+                f"{result['rss_growth_mb']:>16.1f}"
+            )
+
+if __name__ == '__main__':
+    main()
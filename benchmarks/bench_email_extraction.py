@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark email extraction on large listing pages
+Compares the original per-card text join + regex with the single-pass
+page-wide EmailExtractor, using the broad XPath card fallback so nested
+divs are matched the way they are on real pages
+"""
+
+import argparse
+import random
+import re
+import time
+
+from parsel import Selector
+
+from roster_scraper.extractors import EmailExtractor
+from roster_scraper.spiders.shoutt_spider import CARD_XPATH
+
+
+LEGACY_EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+
+
+def generate_page(cards, seed=3):
+    """Listing page with nested creator divs; half the cards show an email"""
+    rng = random.Random(seed)
+    parts = ['<html><body><div class="creator-grid">']
+    for i in range(cards):
+        if i % 2:
+            contact = f'<p>Contact: creator{i}@example.com</p>'
+        else:
+            contact = '<p>Message me on the platform</p>'
+        bio = ' '.join(rng.choice(['video', 'ugc', 'edits', 'brand', 'reels', 'shorts']) for _ in range(30))
+        parts.append(
+            f'<div class="creator-card"><div class="creator-header"><div class="user-avatar"></div>'
+            f'<h3>Creator {i}</h3></div><div class="profile-body"><p>{bio}</p>{contact}</div>'
+            f'<a href="/profiles/{i}">View</a></div>'
+        )
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def legacy_extract(cards):
+    found = {}
+    for card in cards:
+        text_content = ' '.join(card.css('::text').getall())
+        emails_found = re.findall(LEGACY_EMAIL_PATTERN, text_content)
+        if emails_found:
+            found[card.root] = emails_found[0]
+    return found
+
+
+def single_pass_extract(selector, cards):
+    return EmailExtractor().scan(selector.root, [card.root for card in cards])
+
+
+def time_it(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-card vs page-wide email extraction')
+    parser.add_argument('--cards', type=str, default='100,1000,5000',
+                        help='Comma-separated cards per page (default: 100,1000,5000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement, best time is reported (default: 3)')
+    args = parser.parse_args()
+
+    print(f"{'cards':>8} {'matched divs':>13} {'per-card (ms)':>14} {'single-pass (ms)':>17} {'speedup':>9}")
+    for count in (int(c) for c in args.cards.split(',')):
+        selector = Selector(text=generate_page(count))
+        cards = selector.xpath(CARD_XPATH)
+
+        legacy_time, legacy = time_it(lambda: legacy_extract(cards), args.repeat)
+        single_time, single = time_it(lambda: single_pass_extract(selector, cards), args.repeat)
+        if legacy != single:
+            print(f"  warning: results differ on {sum(legacy.get(k) != single.get(k) for k in set(legacy) | set(single))} cards")
+
+        print(
+            f"{count:>8} {len(cards):>13} {legacy_time * 1000:>14.1f} "
+            f"{single_time * 1000:>17.1f} {legacy_time / single_time:>8.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
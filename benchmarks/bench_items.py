@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark the profile item classes
+Compares ProfileItem (scrapy.Item) with the slotted ProfileRecord: resident
+memory per million live items, construction rate, and items/sec through
+the full pipeline chain, which takes the direct-attribute fast paths for
+ProfileRecord. Each class runs in a fresh process so memory numbers do not
+leak between them.
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+from scrapy.exceptions import DropItem
+
+from benchmarks.bench_pipelines import generate_profiles, open_stages
+from benchmarks.utils import current_rss_mb
+from roster_scraper.items import ProfileItem, ProfileRecord
+
+
+ITEM_CLASSES = {
+    'item': ProfileItem,
+    'record': ProfileRecord,
+}
+
+
+def run_one(label, items, chain_items, queue):
+    item_class = ITEM_CLASSES[label]
+    profiles = list(generate_profiles(items, 0.0, 0.0, 0.0, 300))
+
+    # Keep every item alive to measure what each one costs
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    built = [item_class(name=name, email=email, profile_link=link, role_type=role)
+             for name, email, link, role in profiles]
+    build_time = time.perf_counter() - start
+    rss_growth = current_rss_mb() - rss_before
+    del built, profiles
+
+    with tempfile.TemporaryDirectory() as directory:
+        spider, stages = open_stages(directory, ['email', 'brand', 'dedup', 'export'])
+        processed = 0
+        start = time.perf_counter()
+        for name, email, link, role in generate_profiles(chain_items, 0.05, 0.08, 0.10, 300):
+            item = item_class(name=name, email=email, profile_link=link, role_type=role)
+            processed += 1
+            try:
+                for _, pipeline in stages:
+                    item = pipeline.process_item(item, spider)
+            except DropItem:
+                pass
+        # Closing drains the background export writer, so its writes count too
+        for _, pipeline in stages:
+            if hasattr(pipeline, 'close_spider'):
+                pipeline.close_spider(spider)
+        chain_time = time.perf_counter() - start
+
+    queue.put({
+        'class': item_class.__name__,
+        'mb_per_million': rss_growth * 1e6 / items,
+        'built_per_sec': items / build_time,
+        'chain_per_sec': processed / chain_time,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the profile item classes')
+    parser.add_argument('--items', type=int, default=1000000,
+                        help='Live items built for the memory measurement (default: 1000000)')
+    parser.add_argument('--chain-items', type=int, default=200000,
+                        help='Items pushed through the full pipeline chain (default: 200000)')
+    parser.add_argument('--classes', type=str, default='item,record',
+                        help='Comma-separated classes to compare (default: item,record)')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'class':>14} {'MB/million':>12} {'built/s':>12} {'chain items/s':>14}")
+    for label in args.classes.split(','):
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_one, args=(label, args.items, args.chain_items, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(
+            f"{result['class']:>14} {result['mb_per_million']:>12.1f} {result['built_per_sec']:>12,.0f} "
+            f"{result['chain_per_sec']:>14,.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
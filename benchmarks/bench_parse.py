@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark ShouttSpider.parse on offline listing pages
+Feeds the recorded fixtures and synthetic pages of 10 to 5,000 cards into
+parse() as HtmlResponse objects and reports pages/sec, cards/sec and peak
+memory. Results can be saved as JSON and compared with an earlier run to
+flag slowdowns.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks.fixtures import generate_listing_page, load_recorded_pages
+from roster_scraper.items import ProfileItem
+from roster_scraper.selectors import SelectorStrategy
+from roster_scraper.spiders.shoutt_spider import CARD_QUERIES, ShouttSpider
+
+
+BASE_URL = 'https://www.shoutt.co/creators/ugc'
+
+
+def make_response(html):
+    request = Request(BASE_URL, meta={'role_type': 'UGC', 'page_num': 1, 'playwright': True})
+    return HtmlResponse(url=BASE_URL, body=html.encode('utf-8'), encoding='utf-8', request=request)
+
+
+def run_case(name, html, cards, min_time, repeat):
+    """Parse the page for at least min_time seconds, best of `repeat` rounds"""
+    spider = ShouttSpider(roles='UGC', min_per_role=10 ** 9)
+    body = html.encode('utf-8')
+
+    best_rate = 0.0
+    items_per_page = 0
+    for _ in range(repeat):
+        pages = 0
+        items = 0
+        start = time.perf_counter()
+        while True:
+            # A fresh response per page, as the engine would deliver it
+            for result in spider.parse(make_response(html)):
+                if isinstance(result, ProfileItem):
+                    items += 1
+            pages += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best_rate = max(best_rate, pages / elapsed)
+        items_per_page = items / pages
+
+    tracemalloc.start()
+    for _ in spider.parse(make_response(html)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'cards': cards,
+        'page_kb': round(len(body) / 1024, 1),
+        'pages_per_sec': best_rate,
+        'cards_per_sec': best_rate * cards,
+        'items_per_page': items_per_page,
+        'peak_memory_mb': peak / (1024 * 1024),
+    }
+
+
+def count_cards(html):
+    response = make_response(html)
+    return len(SelectorStrategy().first('UGC/card', CARD_QUERIES, lambda q: q.select(response.selector)) or [])
+
+
+def build_cases(card_counts):
+    cases = []
+    for name, html in load_recorded_pages().items():
+        cases.append((f"recorded/{name}", html, count_cards(html)))
+    for count in card_counts:
+        cases.append((f"synthetic/{count}", generate_listing_page(count, seed=count), count))
+        cases.append((f"synthetic-nested/{count}", generate_listing_page(count, seed=count, nested=True), count))
+    return cases
+
+
+def compare(results, baseline_path, threshold):
+    """Print slowdowns against a saved run; return True if any exceed threshold"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {case['name']: case for case in json.load(f)['results']}
+
+    regressed = False
+    print(f"\nComparison with {baseline_path} (threshold {threshold:.0%}):")
+    for case in results:
+        before = baseline.get(case['name'])
+        if before is None:
+            continue
+        change = case['cards_per_sec'] / before['cards_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  <-- SLOWER'
+            regressed = True
+        print(f"  {case['name']:<28} {change:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ShouttSpider.parse on offline pages')
+    parser.add_argument('--cards', type=str, default='10,100,1000,5000',
+                        help='Comma-separated synthetic page sizes (default: 10,100,1000,5000)')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='Seconds to spend on each case (default: 1.0)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Rounds per case, the best is reported (default: 3)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Save results to this JSON file')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative cards/sec drop reported as a slowdown (default: 0.10)')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<28} {'cards':>6} {'KB':>8} {'pages/s':>10} {'cards/s':>12} {'peak MB':>9}")
+    for name, html, cards in build_cases([int(c) for c in args.cards.split(',')]):
+        result = run_case(name, html, cards, args.min_time, args.repeat)
+        results.append(result)
+        print(
+            f"{name:<28} {cards:>6} {result['page_kb']:>8} {result['pages_per_sec']:>10,.1f} "
+            f"{result['cards_per_sec']:>12,.0f} {result['peak_memory_mb']:>9.1f}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark the item pipelines at million-item scale
+Generates synthetic profiles with realistic rates of invalid emails,
+brand-like names and duplicates, then drives them through each pipeline
+stage on its own, through the full chain and optionally through the fused
+single-pass pipeline. Reports items/sec, per-stage
+latency percentiles and RSS growth.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from scrapy.exceptions import DropItem
+
+from benchmarks.utils import current_rss_mb, percentiles
+from roster_scraper.items import ProfileItem
+from roster_scraper.pipelines import (
+    EmailValidationPipeline,
+    BrandNameFilterPipeline,
+    DeduplicationPipeline,
+    CSVExportPipeline,
+    FusedProfilePipeline,
+)
+
+
+FIRST_NAMES = ["Mia", "Oliver", "Priya", "Leo", "Jonas", "Amara", "Rafael", "Nicole", "Sam", "Yuki",
+               "Sarah", "John", "Emily", "Theodore", "Lisa", "Marco", "Aisha", "Tom", "Nina", "Chris"]
+LAST_NAMES = ["Hart", "Grant", "Nair", "Martins", "Keller", "Tanaka", "Bianchi", "Coleman", "Lee", "Costa",
+              "Johnson", "Smith", "Davis", "Patel", "Anderson", "Wilson", "Green", "Clark", "White", "Brown"]
+BRAND_NAMES = ["Creative Studio", "Digital Media Inc", "Design Agency", "The Productions LLC",
+               "Pixel Labs", "Official Channel", "Bright Group", "Acme Co"]
+INVALID_EMAILS = ["not-an-email", "wrong@", "@example.com", "a..b@example.com", "user@exa_mple.com",
+                  "name@domain", "spaces in@example.com"]
+
+
+class BenchSpider:
+    name = 'bench'
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+
+def generate_profiles(count, invalid_rate, brand_rate, duplicate_rate, domains, seed=1):
+    """Yield (name, email, profile_link, role_type) tuples"""
+    rng = random.Random(seed)
+    domain_list = [f"mail{i}.example.com" for i in range(domains - 3)] + ["gmail.com", "outlook.com", "proton.me"]
+    emitted = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < duplicate_rate and emitted:
+            name, email = rng.choice(emitted)
+        else:
+            if roll < duplicate_rate + brand_rate:
+                name = rng.choice(BRAND_NAMES)
+            else:
+                name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            if rng.random() < invalid_rate:
+                email = rng.choice(INVALID_EMAILS)
+            else:
+                email = f"{name.split()[0].lower()}.{i}@{rng.choice(domain_list)}"
+            if len(emitted) < 100000:
+                emitted.append((name, email))
+        yield (name, email, f"https://www.shoutt.co/profile/{i}", "UGC" if i % 2 else "Video")
+
+
+def open_stages(directory, stage_names, fused_steps=FusedProfilePipeline.STEPS):
+    spider = BenchSpider(os.path.join(directory, 'bench_profiles.csv'))
+    factories = {
+        'email': EmailValidationPipeline,
+        'brand': BrandNameFilterPipeline,
+        'dedup': DeduplicationPipeline,
+        'export': CSVExportPipeline,
+        'fused': lambda: FusedProfilePipeline(steps=fused_steps),
+    }
+    stages = []
+    for name in stage_names:
+        pipeline = factories[name]()
+        if hasattr(pipeline, 'open_spider'):
+            pipeline.open_spider(spider)
+        stages.append((name, pipeline))
+    return spider, stages
+
+
+def run(label, stage_names, profiles, directory, sample_every, fused_steps=FusedProfilePipeline.STEPS):
+    spider, stages = open_stages(directory, stage_names, fused_steps)
+    latencies = {name: [] for name in stage_names}
+    dropped = {name: 0 for name in stage_names}
+    perf = time.perf_counter
+
+    rss_before = current_rss_mb()
+    processed = 0
+    start = perf()
+    for name, email, link, role in profiles:
+        item = ProfileItem(name=name, email=email, profile_link=link, role_type=role)
+        sampled = processed % sample_every == 0
+        processed += 1
+        for stage_name, pipeline in stages:
+            t0 = perf() if sampled else 0.0
+            try:
+                item = pipeline.process_item(item, spider)
+            except DropItem:
+                dropped[stage_name] += 1
+                if sampled:
+                    latencies[stage_name].append(perf() - t0)
+                break
+            if sampled:
+                latencies[stage_name].append(perf() - t0)
+    rss_after = current_rss_mb()
+    # Closing drains the background export writer, so its writes count too
+    for _, pipeline in stages:
+        if hasattr(pipeline, 'close_spider'):
+            pipeline.close_spider(spider)
+    elapsed = perf() - start
+
+    print(f"\n{label}: {processed:,} items in {elapsed:.1f}s = {processed / elapsed:,.0f} items/s, "
+          f"RSS +{rss_after - rss_before:.1f} MB")
+    print(f"  {'stage':<8} {'dropped':>10} {'p50 (us)':>10} {'p90 (us)':>10} {'p99 (us)':>10} {'p99.9 (us)':>11}")
+    for stage_name in stage_names:
+        p = percentiles(latencies[stage_name])
+        print(
+            f"  {stage_name:<8} {dropped[stage_name]:>10,} {p[50] * 1e6:>10.1f} {p[90] * 1e6:>10.1f} "
+            f"{p[99] * 1e6:>10.1f} {p[99.9] * 1e6:>11.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the item pipelines')
+    parser.add_argument('--items', type=int, default=1000000,
+                        help='Synthetic profiles per run (default: 1000000)')
+    parser.add_argument('--invalid-rate', type=float, default=0.05,
+                        help='Share of invalid emails (default: 0.05)')
+    parser.add_argument('--brand-rate', type=float, default=0.08,
+                        help='Share of brand-like names (default: 0.08)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.10,
+                        help='Share of repeated profiles (default: 0.10)')
+    parser.add_argument('--domains', type=int, default=300,
+                        help='Distinct email domains (default: 300)')
+    parser.add_argument('--sample-every', type=int, default=10,
+                        help='Time every Nth item for latency percentiles (default: 10)')
+    parser.add_argument('--stages', type=str, default='email,brand,dedup,export',
+                        help='Comma-separated stages to benchmark (default: all four)')
+    parser.add_argument('--skip-isolated', action='store_true',
+                        help='Only run the full chain')
+    parser.add_argument('--fused', action='store_true',
+                        help='Also run the fused single-pass pipeline')
+    parser.add_argument('--fused-steps', type=str, default=','.join(FusedProfilePipeline.STEPS),
+                        help='Comma-separated step order of the fused pipeline (default: FusedProfilePipeline.STEPS)')
+    args = parser.parse_args()
+
+    stage_names = args.stages.split(',')
+    profile_args = (args.items, args.invalid_rate, args.brand_rate, args.duplicate_rate, args.domains)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if not args.skip_isolated:
+            for stage_name in stage_names:
+                run(f"{stage_name} only", [stage_name], generate_profiles(*profile_args), directory, args.sample_every)
+        run("full chain", stage_names, generate_profiles(*profile_args), directory, args.sample_every)
+        if args.fused:
+            run("fused pipeline", ['fused'], generate_profiles(*profile_args), directory, args.sample_every,
+                args.fused_steps.split(','))
+
+
+if __name__ == '__main__':
+    main()
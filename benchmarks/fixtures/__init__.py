@@ -0,0 +1,64 @@
+# Offline listing-page fixtures for the spider benchmarks
+#
+# The .html files are hand-made stand-ins for Shoutt listing pages (one with
+# server-rendered creator cards, one that only matches the broad XPath
+# fallback). generate_listing_page() builds synthetic pages of any size.
+
+import os
+import random
+
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_NAMES = ["Mia", "Oliver", "Priya", "Leo", "Jonas", "Amara", "Rafael", "Nicole", "Sam", "Yuki"]
+LAST_NAMES = ["Hart", "Grant", "Nair", "Martins", "Keller", "Tanaka", "Bianchi", "Coleman", "Lee", "Costa"]
+BIO_WORDS = ["video", "ugc", "edits", "brand", "reels", "shorts", "beauty", "tech", "travel", "food"]
+
+
+def load_recorded_pages():
+    """{fixture name: html} for every .html file in this directory"""
+    pages = {}
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if filename.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, filename), 'r', encoding='utf-8') as f:
+                pages[filename[:-len('.html')]] = f.read()
+    return pages
+
+
+def generate_listing_page(cards, seed=0, mailto_ratio=0.4, text_email_ratio=0.3,
+                          obfuscated_ratio=0.1, nested=False):
+    """Synthetic listing page with `cards` creator cards
+
+    Cards get a mailto link, a plain-text email, an obfuscated email or no
+    email at all according to the ratios. With nested=True the cards only
+    match the broad XPath fallback and contain nested "profile"/"user" divs.
+    """
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Creators</title></head><body><div class="results">']
+    for i in range(cards):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        handle = f"{name.lower().replace(' ', '.')}{i}"
+        bio = ' '.join(rng.choice(BIO_WORDS) for _ in range(20))
+
+        roll = rng.random()
+        contact = ''
+        if roll < mailto_ratio:
+            contact = f'<a href="mailto:{handle}@example.com">Email</a>'
+        elif roll < mailto_ratio + text_email_ratio:
+            contact = f'<p>Contact: {handle}@example.com</p>'
+        elif roll < mailto_ratio + text_email_ratio + obfuscated_ratio:
+            contact = f'<p>Contact: {handle} [at] example [dot] com</p>'
+
+        if nested:
+            parts.append(
+                f'<div class="creator-tile"><div class="user-avatar"></div><h2>{name}</h2>'
+                f'<div class="profile-summary"><p>{bio}</p>{contact}</div>'
+                f'<a href="/profile/{handle}">Profile</a></div>'
+            )
+        else:
+            parts.append(
+                f'<article class="creator-card"><h3 class="creator-name">{name}</h3>'
+                f'<p class="bio">{bio}</p>{contact}<a href="/profile/{handle}">View</a></article>'
+            )
+    parts.append('</div><a class="next" href="?page=2">Next</a></body></html>')
+    return ''.join(parts)
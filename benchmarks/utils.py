@@ -0,0 +1,25 @@
+# Measurement helpers shared by the benchmarks
+
+import resource
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples, points=(50, 90, 99, 99.9)):
+    """{point: value} for the given percentiles of a list of numbers"""
+    if not samples:
+        return {point: 0.0 for point in points}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {point: ordered[min(last, int(round(point / 100 * last)))] for point in points}
@@ -125,14 +125,14 @@ def run_demo():
             print(f"✓ Accepted: {name} ({role}) - {email}")
             
         except DropItem as e:
-            error_msg = str(e)
-            if 'Invalid email' in error_msg:
+            reason = getattr(e, 'reason', None)
+            if reason in ('invalid_email', 'missing_email'):
                 stats['invalid_email'] += 1
                 print(f"✗ Invalid email: {name}")
-            elif 'Brand-like name' in error_msg:
+            elif reason == 'brand_name':
                 stats['brand_filtered'] += 1
                 print(f"✗ Brand filtered: {name}")
-            elif 'Duplicate email' in error_msg:
+            elif reason == 'duplicate_email':
                 stats['duplicates'] += 1
                 print(f"✗ Duplicate: {name}")
     
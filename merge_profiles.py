@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Roster Merge CLI
+Combine profiles files from separate runs and shards into one deduplicated
+output with an external sort-merge, so inputs may be larger than memory.
+"""
+
+import argparse
+import logging
+import os
+import resource
+import sys
+
+from roster_scraper.exporters import FILE_EXTENSIONS
+from roster_scraper.sortmerge import merge_outputs
+
+
+def peak_memory_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Merge roster outputs, keeping the most recent row per email (or profile link)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Merge nightly outputs; newer files win by modification time
+  python merge_profiles.py runs/*.csv --output profiles.csv
+
+  # Merge worker shards, taking the files in the order given
+  python merge_profiles.py --order given profiles.shards/*.jsonl --output profiles.jsonl
+
+  # Bound memory to about 50,000 rows and spill runs to a big disk
+  python merge_profiles.py big/*.csv --output all.csv --chunk-rows 50000 --tmp-dir /mnt/scratch
+        """
+    )
+
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='CSV or JSON Lines (.jsonl) profiles files'
+    )
+
+    parser.add_argument(
+        '--output',
+        type=str,
+        required=True,
+        help='Merged output file'
+    )
+
+    parser.add_argument(
+        '--format',
+        type=str,
+        default=None,
+        choices=sorted(FILE_EXTENSIONS),
+        help='Output format (default: from the --output extension, else csv)'
+    )
+
+    parser.add_argument(
+        '--order',
+        type=str,
+        default='mtime',
+        choices=['mtime', 'given'],
+        help='How inputs are ranked oldest to newest when the same profile appears twice (default: mtime)'
+    )
+
+    parser.add_argument(
+        '--chunk-rows',
+        type=int,
+        default=200000,
+        help='Rows sorted in memory at a time; bounds memory use (default: 200000)'
+    )
+
+    parser.add_argument(
+        '--fan-in',
+        type=int,
+        default=64,
+        help='Run files merged at once (default: 64)'
+    )
+
+    parser.add_argument(
+        '--tmp-dir',
+        type=str,
+        default=None,
+        help='Directory for temporary run files (default: system temp directory)'
+    )
+
+    parser.add_argument(
+        '--log-level',
+        type=str,
+        default='INFO',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+        help='Logging level (default: INFO)'
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s [%(name)s] %(levelname)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    if args.format is None:
+        extension = os.path.splitext(args.output)[1]
+        args.format = next((name for name, ext in FILE_EXTENSIONS.items() if ext == extension), 'csv')
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        parser.error(f"Input not found: {', '.join(missing)}")
+    if os.path.abspath(args.output) in {os.path.abspath(path) for path in args.inputs}:
+        parser.error('--output must not be one of the inputs')
+
+    logging.info(f"Merging {len(args.inputs)} files into {args.output} ({args.format})")
+    counters = merge_outputs(
+        args.inputs, args.output, args.format, order=args.order,
+        chunk_rows=args.chunk_rows, fan_in=args.fan_in, tmp_dir=args.tmp_dir,
+    )
+
+    seconds = counters['seconds']
+    rate = counters['rows_read'] / seconds if seconds else 0.0
+    logging.info(
+        f"Read {counters['rows_read']} rows, wrote {counters['rows_written']}, "
+        f"dropped {counters['duplicates']} duplicates"
+    )
+    logging.info(
+        f"{counters['runs']} sorted runs, {counters['merge_passes']} merge passes, "
+        f"{seconds:.2f}s, {rate:,.0f} rows/sec, peak memory {peak_memory_mb():.1f} MB"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
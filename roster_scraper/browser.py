@@ -0,0 +1,103 @@
+# Pool of warm Playwright pages, kept per browser context
+#
+# scrapy-playwright normally opens a fresh page for every request and closes
+# it afterwards. PagePool keeps a bounded set of pages per key (one key per
+# role, each with its own browser context) and hands an idle page to the next
+# request of the same role, so pages are reused instead of torn down.
+
+import asyncio
+import logging
+from collections import deque
+
+
+def role_context_name(role_type):
+    """Name of the dedicated browser context for a role"""
+    return f"role-{role_type}"
+
+
+class PagePool:
+    """Bounded per-key pool of reusable Playwright pages
+
+    acquire() returns an idle page, or None when the caller may let
+    scrapy-playwright create a new one. Once `size` pages exist for a key,
+    acquire() waits until one is released.
+    """
+
+    def __init__(self, size=2, reset=True):
+        self.size = max(1, size)
+        self.reset = reset
+        self.idle = {}
+        self.live = {}
+        self.waiters = {}
+        self.counters = {
+            'created': 0,
+            'reused': 0,
+            'waited': 0,
+            'discarded': 0,
+        }
+
+    async def acquire(self, key):
+        while True:
+            idle = self.idle.setdefault(key, [])
+            while idle:
+                page = idle.pop()
+                if page.is_closed() or not await self._reset(page):
+                    self._forget(key)
+                    continue
+                self.counters['reused'] += 1
+                return page
+
+            if self.live.get(key, 0) < self.size:
+                # Reserve a slot; the new page is registered on release()
+                self.live[key] = self.live.get(key, 0) + 1
+                self.counters['created'] += 1
+                return None
+
+            self.counters['waited'] += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(key, deque()).append(waiter)
+            await waiter
+
+    def release(self, key, page):
+        """Return a page to the pool, or free its slot if it is gone"""
+        if page is None or page.is_closed():
+            self._forget(key)
+        else:
+            self.idle.setdefault(key, []).append(page)
+        self._wake(key)
+
+    def _forget(self, key):
+        self.counters['discarded'] += 1
+        self.live[key] = max(0, self.live.get(key, 0) - 1)
+
+    def _wake(self, key):
+        waiters = self.waiters.get(key)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def _reset(self, page):
+        if not self.reset:
+            return True
+        try:
+            # Stops scripts and timers left over from the previous listing
+            await page.goto('about:blank')
+        except Exception as e:
+            logging.warning(f"Discarding pooled page that failed to reset: {e}")
+            try:
+                await page.close()
+            except Exception:
+                pass
+            return False
+        return True
+
+    def clear(self):
+        self.idle.clear()
+        self.live.clear()
+        for waiters in self.waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.cancel()
+        self.waiters.clear()
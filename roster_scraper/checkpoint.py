@@ -0,0 +1,153 @@
+# Job directory for crash-safe checkpoint and resume
+#
+# A crawl started with a job directory periodically writes checkpoint.json
+# there: per-role counters, listing pages still pending, pages already
+# completed and how far the output file had been written. The file is
+# replaced atomically, so a crash leaves either the previous checkpoint or
+# the new one. On restart the spider re-issues only the pending pages and the
+# pipelines rebuild their state from the rows already in the output file.
+
+import csv
+import json
+import logging
+import os
+
+from roster_scraper.exporters import read_rows
+
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Formats whose files can be truncated to a row boundary and appended to
+RESUMABLE_FORMATS = ('csv', 'jsonl')
+
+
+class JobCheckpoint:
+    """Checkpoint state of one crawl, kept in a job directory"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.state_path = os.path.join(path, CHECKPOINT_FILE)
+        self.state = self.load()
+        self.output_rows = 0
+        self.output_emails = []
+        self.output_role_counts = {}
+        self.saves = 0
+
+    @property
+    def resumed(self):
+        """Whether a previous run left a checkpoint to continue from"""
+        return self.state is not None
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Unreadable checkpoint {self.state_path}: {e}")
+        logging.info(f"Resuming from checkpoint {self.state_path}")
+        return state
+
+    def save(self, state):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self.state = state
+        self.saves += 1
+
+    def recover_output(self, path, output_format='csv'):
+        """Trim a torn last row from the output and read back what it holds
+
+        Rows written after the last checkpoint are kept: their emails go back
+        into the dedup store, so pages re-parsed on resume add no duplicates.
+        """
+        if output_format not in RESUMABLE_FORMATS:
+            raise ValueError(
+                f"Cannot resume {output_format} output; resumable formats are {', '.join(RESUMABLE_FORMATS)}"
+            )
+        self.output_rows = 0
+        self.output_emails = []
+        self.output_role_counts = {}
+        if not os.path.exists(path):
+            return
+
+        checkpointed = (self.state or {}).get('output_offset', 0)
+        if os.path.getsize(path) < checkpointed:
+            logging.warning(
+                f"{path} is shorter than at the last checkpoint "
+                f"({os.path.getsize(path)} < {checkpointed} bytes); was it modified?"
+            )
+            checkpointed = 0
+        if output_format == 'csv':
+            truncate_partial_record(path, checkpointed)
+        else:
+            truncate_partial_line(path)
+
+        for row in read_rows(path, output_format):
+            self.output_rows += 1
+            if row.get('email'):
+                self.output_emails.append(row['email'])
+            role_type = row.get('role_type')
+            if role_type:
+                self.output_role_counts[role_type] = self.output_role_counts.get(role_type, 0) + 1
+        logging.info(f"Recovered {self.output_rows} rows from {path}")
+
+
+def truncate_partial_line(path):
+    """Cut the file back to just after its last newline
+
+    Only for JSON Lines, where a row never holds a raw newline.
+    """
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position < size:
+            f.truncate(position)
+            logging.warning(f"Dropped {size - position} bytes of a partially written row from {path}")
+
+
+def truncate_partial_record(path, start=0):
+    """Cut a CSV file back to just after its last complete record
+
+    A quoted field may hold newlines, so the records are parsed with the csv
+    module, from start onwards: a byte offset known to be a record boundary,
+    such as the output_offset of the last checkpoint.
+    """
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(start)
+        read = start
+        complete = start
+        line_ended = True
+
+        def lines():
+            nonlocal read, line_ended
+            for line in f:
+                read += len(line)
+                line_ended = line.endswith(b'\n')
+                yield line.decode('utf-8', errors='replace')
+
+        try:
+            for _ in csv.reader(lines(), strict=True):
+                if line_ended:
+                    complete = read
+        except csv.Error:
+            # A quoted field left open by the crash
+            pass
+        if complete < size:
+            f.truncate(complete)
+            logging.warning(f"Dropped {size - complete} bytes of a partially written row from {path}")
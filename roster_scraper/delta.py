@@ -0,0 +1,182 @@
+# Incremental (delta) crawls
+#
+# A delta crawl compares this run against the previous one. The state file
+# keeps a content hash per listing page, with the page's next-page link and
+# the profiles it listed. A page whose content hash has not changed is not
+# parsed again: its profiles are carried forward and the crawl follows the
+# stored next-page link. Profiles are hashed field by field against the
+# previous snapshot (the output file), so only added and changed profiles
+# reach the delta file. Profiles that were listed on a page visited this run
+# but are no longer listed anywhere are written to the delta as removed.
+# When the crawl closes, the snapshot is rewritten with the delta applied.
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+from roster_scraper.exporters import FIELDNAMES, open_row_writer, read_rows
+
+
+DELTA_FIELDNAMES = ['change'] + FIELDNAMES
+
+# Formats the previous snapshot can be read back from
+DELTA_FORMATS = ('csv', 'jsonl')
+
+# Snapshot rows copied per write while applying the delta
+COPY_BATCH_SIZE = 1000
+
+# Markup that changes between identical renders: scripts, styles, comments
+_VOLATILE_RE = re.compile(rb'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.DOTALL | re.IGNORECASE)
+_SPACE_RE = re.compile(rb'\s+')
+
+
+def page_fingerprint(body):
+    """Hash of a page's markup, ignoring scripts, styles and whitespace"""
+    body = _VOLATILE_RE.sub(b'', body)
+    return hashlib.sha1(_SPACE_RE.sub(b' ', body)).hexdigest()
+
+
+def profile_key(email):
+    return (email or '').strip().lower()
+
+
+def profile_hash(row):
+    """Hash of a profile row given in FIELDNAMES order"""
+    return hashlib.sha1('\x1f'.join(value or '' for value in row).encode('utf-8')).hexdigest()
+
+
+def delta_paths(output_file):
+    """Default delta file and state file next to the snapshot"""
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}.delta{ext}", f"{stem}.state.json"
+
+
+class DeltaCrawl:
+    """Previous run's pages and profiles, and what changed in this run"""
+
+    def __init__(self, snapshot_path, output_format='csv', delta_path=None, state_path=None):
+        if output_format not in DELTA_FORMATS:
+            raise ValueError(
+                f"Incremental crawls need {' or '.join(DELTA_FORMATS)} output, not {output_format}"
+            )
+        default_delta, default_state = delta_paths(snapshot_path)
+        self.snapshot_path = snapshot_path
+        self.output_format = output_format
+        self.delta_path = delta_path or default_delta
+        self.state_path = state_path or default_state
+        # Previous run: url -> {'hash', 'role_type', 'next_page', 'profiles'}
+        self.previous_pages = {}
+        # Previous snapshot: profile key -> row hash
+        self.previous_profiles = {}
+        self.pages = {}
+        self.seen = set()
+        self.changes = {}
+        self.counters = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0,
+                         'pages_unchanged': 0, 'pages_changed': 0}
+
+    def load(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.previous_pages = json.load(f).get('pages', {})
+        if os.path.exists(self.snapshot_path):
+            for row in read_rows(self.snapshot_path, self.output_format):
+                values = tuple(row.get(field) for field in FIELDNAMES)
+                self.previous_profiles[profile_key(row.get('email'))] = profile_hash(values)
+        logging.info(
+            f"Delta crawl against {len(self.previous_profiles)} profiles and "
+            f"{len(self.previous_pages)} listing pages from the previous run"
+        )
+        return self
+
+    # Listing pages
+
+    def unchanged_page(self, url, fingerprint):
+        """The previous record of a page if its content hash still matches"""
+        previous = self.previous_pages.get(url)
+        if previous is None or previous['hash'] != fingerprint:
+            return None
+        self.counters['pages_unchanged'] += 1
+        self.pages[url] = previous
+        self.seen.update(previous['profiles'])
+        return previous
+
+    def record_page(self, url, role_type, fingerprint, next_page, emails):
+        self.counters['pages_changed'] += 1
+        self.pages[url] = {
+            'hash': fingerprint,
+            'role_type': role_type,
+            'next_page': next_page,
+            'profiles': [profile_key(email) for email in emails],
+        }
+
+    # Profiles
+
+    def classify(self, row):
+        """'added', 'changed' or None for an unchanged profile row"""
+        key = profile_key(row[FIELDNAMES.index('email')])
+        self.seen.add(key)
+        previous = self.previous_profiles.get(key)
+        if previous == profile_hash(row):
+            self.counters['unchanged'] += 1
+            return None
+        change = 'added' if previous is None else 'changed'
+        if key in self.changes:
+            # Listed twice in this run; the first listing wins, as in dedup
+            return None
+        self.changes[key] = row
+        self.counters[change] += 1
+        return change
+
+    def removed(self):
+        """Previous profiles of pages visited this run, listed nowhere now"""
+        removed = set()
+        for url in self.pages:
+            for key in self.previous_pages.get(url, {}).get('profiles', ()):
+                if key not in self.seen and key in self.previous_profiles:
+                    removed.add(key)
+        return removed
+
+    def finish(self, delta_writer):
+        """Write removed rows to the delta, then apply the delta to the snapshot"""
+        removed = self.removed()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        snapshot = open_row_writer(tmp_path, self.output_format)
+        kept = []
+        removed_rows = []
+        if os.path.exists(self.snapshot_path):
+            for row in read_rows(self.snapshot_path, self.output_format):
+                key = profile_key(row.get('email'))
+                values = tuple(row.get(field) for field in FIELDNAMES)
+                if key in removed:
+                    removed.discard(key)
+                    removed_rows.append(('removed',) + values)
+                elif key not in self.changes:
+                    kept.append(values)
+                    if len(kept) >= COPY_BATCH_SIZE:
+                        snapshot.write_batch(kept)
+                        kept = []
+        kept.extend(self.changes.values())
+        if kept:
+            snapshot.write_batch(kept)
+        snapshot.close()
+        if removed_rows:
+            delta_writer.write_batch(removed_rows)
+        self.counters['removed'] = len(removed_rows)
+        os.replace(tmp_path, self.snapshot_path)
+        self.save()
+        logging.info(
+            f"Delta: {self.counters['added']} added, {self.counters['changed']} changed, "
+            f"{self.counters['removed']} removed, {self.counters['unchanged']} unchanged; "
+            f"{self.counters['pages_unchanged']} listing pages skipped"
+        )
+
+    def save(self):
+        # Pages not visited this run keep their previous record
+        pages = dict(self.previous_pages)
+        pages.update(self.pages)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': pages}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,268 @@
+# Shared work queue for multi-worker crawls
+#
+# With --workers N, run_scraper.py starts N worker processes that each run
+# their own crawler and browser. Instead of a local scheduler frontier, the
+# workers share one queue of listing and detail-page tasks: a worker claims a
+# few tasks, crawls them, and pushes the requests its callbacks yield back to
+# the queue for any worker to pick up. The same backend holds the seen-email
+# set used by DeduplicationPipeline and the accepted count per role, so dedup
+# and quotas are global. Each worker writes its own output shard, and the
+# shards are merged once every worker has finished.
+#
+# SQLiteWorkQueue keeps everything in one SQLite file, which works for
+# processes on one host (or hosts sharing a filesystem that supports SQLite
+# locking). Other backends plug in through WORK_QUEUE_BACKEND and implement
+# the same methods. Shards are always files next to the output, so workers
+# on other hosts need the output directory on shared storage too; a missing
+# shard fails the merge.
+#
+# Claims are leases: a live worker renews its claims every
+# WORKER_HEARTBEAT_INTERVAL seconds, so only the claims of a worker that
+# stopped renewing them are handed out again after WORK_QUEUE_LEASE_TIMEOUT.
+
+import json
+import os
+import sqlite3
+import time
+
+from scrapy.utils.misc import load_object
+
+from roster_scraper.exporters import FIELDNAMES, open_row_writer, read_rows
+
+
+def request_task(request):
+    """The parts of a spider request needed to rebuild it on another worker"""
+    meta = request.meta
+    return {
+        'url': request.url,
+        'role_type': meta.get('role_type'),
+        'page_num': meta.get('page_num'),
+        'detail_name': meta.get('detail_name'),
+        'render': bool(meta.get('playwright')),
+        'priority': request.priority,
+    }
+
+
+def task_key(task):
+    """Identity of a task; a rendered re-fetch of a page is a separate task"""
+    kind = 'detail' if task.get('detail_name') is not None else 'listing'
+    renderer = 'playwright' if task.get('render') else 'http'
+    return f"{kind} {renderer} {task['url']}"
+
+
+def open_work_queue(settings):
+    """Open the backend selected by WORK_QUEUE_BACKEND at WORK_QUEUE"""
+    backend = load_object(settings.get('WORK_QUEUE_BACKEND', 'roster_scraper.distributed.SQLiteWorkQueue'))
+    return backend.from_settings(settings)
+
+
+def shard_path(output_file, worker_id):
+    """Output shard of one worker, in a directory next to the final output"""
+    stem, _ = os.path.splitext(output_file)
+    return os.path.join(f"{stem}.shards", f"worker-{worker_id}.jsonl")
+
+
+def merge_shards(paths, output_file, output_format='csv', batch_size=1000):
+    """Concatenate worker shards into one output, dropping repeated emails
+
+    Raises FileNotFoundError, before writing anything, if a shard is missing.
+    """
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing worker shards: {', '.join(missing)}")
+    seen = set()
+    rows_written = 0
+    writer = open_row_writer(output_file, output_format)
+    try:
+        batch = []
+        for path in paths:
+            for row in read_rows(path, 'jsonl'):
+                email = row.get('email')
+                if email in seen:
+                    continue
+                seen.add(email)
+                batch.append(tuple(row.get(field) for field in FIELDNAMES))
+                if len(batch) >= batch_size:
+                    writer.write_batch(batch)
+                    rows_written += len(batch)
+                    batch = []
+        if batch:
+            writer.write_batch(batch)
+            rows_written += len(batch)
+    finally:
+        writer.close()
+    return rows_written
+
+
+class WorkQueueSeenStore:
+    """Seen-key store interface over a shared work queue"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __contains__(self, key):
+        return self.queue.is_seen(key)
+
+    def add(self, key):
+        return self.queue.add_seen(key)
+
+    def close(self):
+        # The queue belongs to the spider and is closed with it
+        pass
+
+
+class SQLiteWorkQueue:
+    """Tasks, seen emails, role counts and workers in one SQLite file
+
+    Tasks move from queued to claimed to done (or failed or cancelled). A
+    claim not renewed by heartbeat() for lease_timeout seconds is handed out
+    again, so tasks of a worker that died are not lost.
+    """
+
+    def __init__(self, path, lease_timeout=300.0):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit; claims take the write lock explicitly
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                role_type TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'queued',
+                worker TEXT,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, priority DESC, id);
+            CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS quota (role_type TEXT PRIMARY KEY, accepted INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL);
+        ''')
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings['WORK_QUEUE'], lease_timeout=settings.getfloat('WORK_QUEUE_LEASE_TIMEOUT', 300.0))
+
+    # Tasks
+
+    def push(self, task):
+        """Queue a task unless one with the same key exists; True if queued"""
+        cursor = self.conn.execute(
+            'INSERT OR IGNORE INTO tasks (key, payload, role_type, priority) VALUES (?, ?, ?, ?)',
+            (task_key(task), json.dumps(task), task.get('role_type'), task.get('priority') or 0),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, worker, limit=1):
+        """Claim up to `limit` queued tasks, highest priority first"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.execute(
+                "UPDATE tasks SET state = 'queued', worker = NULL WHERE state = 'claimed' AND claimed_at < ?",
+                (now - self.lease_timeout,),
+            )
+            rows = self.conn.execute(
+                "SELECT id, payload FROM tasks WHERE state = 'queued' ORDER BY priority DESC, id LIMIT ?",
+                (limit,),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE tasks SET state = 'claimed', worker = ?, claimed_at = ? WHERE id = ?",
+                [(worker, now, task_id) for task_id, _ in rows],
+            )
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return [(task_id, json.loads(payload)) for task_id, payload in rows]
+
+    def complete(self, task_id):
+        self.conn.execute("UPDATE tasks SET state = 'done' WHERE id = ?", (task_id,))
+
+    def fail(self, task_id):
+        self.conn.execute("UPDATE tasks SET state = 'failed' WHERE id = ?", (task_id,))
+
+    def cancel(self, task_id):
+        self.conn.execute("UPDATE tasks SET state = 'cancelled' WHERE id = ?", (task_id,))
+
+    def heartbeat(self, worker):
+        """Renew the leases of a live worker's claims; returns how many"""
+        now = time.time()
+        self.conn.execute('UPDATE workers SET updated_at = ? WHERE id = ?', (now, worker))
+        cursor = self.conn.execute(
+            "UPDATE tasks SET claimed_at = ? WHERE worker = ? AND state = 'claimed'", (now, worker)
+        )
+        return cursor.rowcount
+
+    def release(self, worker):
+        """Hand a stopping worker's unfinished claims back to the queue"""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET state = 'queued', worker = NULL WHERE worker = ? AND state = 'claimed'", (worker,)
+        )
+        return cursor.rowcount
+
+    def cancel_role(self, role_type):
+        """Drop the queued tasks of a role whose quota is met"""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET state = 'cancelled' WHERE role_type = ? AND state = 'queued'", (role_type,)
+        )
+        return cursor.rowcount
+
+    def unfinished(self):
+        """Tasks queued or being crawled by some worker"""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE state IN ('queued', 'claimed')"
+        ).fetchone()[0]
+
+    def task_counts(self):
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+
+    # Dedup and quotas
+
+    def is_seen(self, key):
+        return self.conn.execute('SELECT 1 FROM seen WHERE key = ?', (key,)).fetchone() is not None
+
+    def add_seen(self, key):
+        """Record key, returning True if no worker had seen it before"""
+        cursor = self.conn.execute('INSERT OR IGNORE INTO seen (key) VALUES (?)', (key,))
+        return cursor.rowcount == 1
+
+    def seen_store(self):
+        return WorkQueueSeenStore(self)
+
+    def add_accepted(self, role_type, count=1):
+        """Add accepted items for a role; returns the count across workers"""
+        self.conn.execute(
+            'INSERT INTO quota (role_type, accepted) VALUES (?, ?) '
+            'ON CONFLICT (role_type) DO UPDATE SET accepted = accepted + excluded.accepted',
+            (role_type, count),
+        )
+        return self.conn.execute('SELECT accepted FROM quota WHERE role_type = ?', (role_type,)).fetchone()[0]
+
+    def role_counts(self):
+        return dict(self.conn.execute('SELECT role_type, accepted FROM quota'))
+
+    # Workers
+
+    def register_worker(self, worker):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO workers (id, state, updated_at) VALUES (?, 'running', ?)", (worker, time.time())
+        )
+
+    def worker_done(self, worker, state='done'):
+        self.conn.execute('UPDATE workers SET state = ?, updated_at = ? WHERE id = ?', (state, time.time(), worker))
+
+    def workers(self):
+        return dict(self.conn.execute('SELECT id, state FROM workers'))
+
+    def close(self):
+        self.conn.close()
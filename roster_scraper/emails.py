@@ -0,0 +1,130 @@
+# Email validation helpers used by the item pipelines
+#
+# Crawls see the same few hundred domains over and over, so running the full
+# email_validator syntax and IDNA checks for every item is mostly repeated
+# work. EmailNormalizer puts a cheap syntax pre-check and two LRU caches in
+# front of the library: one for full addresses and one for domain verdicts.
+
+import re
+from collections import OrderedDict
+
+from email_validator import validate_email, EmailNotValidError, EmailSyntaxError
+from email_validator.rfc_constants import CASE_INSENSITIVE_MAILBOX_NAMES
+from email_validator.syntax import validate_email_domain_name
+
+
+# Anything that fails this can never pass validate_email
+EMAIL_PRECHECK_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Unquoted ASCII dot-atom local parts, which validate_email accepts unchanged
+SIMPLE_LOCAL_PART_RE = re.compile(
+    r"^[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*$"
+)
+
+MAX_EMAIL_LENGTH = 254
+MAX_LOCAL_PART_LENGTH = 64
+
+
+class LRUCache:
+    """Small bounded mapping that evicts the least recently used key"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key):
+        try:
+            value = self.data[key]
+        except KeyError:
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+class EmailNormalizer:
+    """Validate and normalize email addresses with memoized results
+
+    Results (valid or not) are cached per full address. Domain verdicts are
+    cached separately, so a new address at a known domain with a plain ASCII
+    local part never reaches email_validator at all.
+    """
+
+    def __init__(self, cache_size=100000, domain_cache_size=10000):
+        self.addresses = LRUCache(cache_size)
+        self.domains = LRUCache(domain_cache_size)
+        self.counters = {
+            'precheck_rejected': 0,
+            'cache_hit': 0,
+            'cache_miss': 0,
+            'domain_cache_hit': 0,
+            'domain_cache_miss': 0,
+        }
+
+    def normalize(self, email):
+        """Return the normalized address or raise EmailNotValidError"""
+        if len(email) > MAX_EMAIL_LENGTH or not EMAIL_PRECHECK_RE.match(email):
+            self.counters['precheck_rejected'] += 1
+            raise EmailSyntaxError("The email address failed the syntax pre-check.")
+
+        cached = self.addresses.get(email)
+        if cached is not None:
+            self.counters['cache_hit'] += 1
+            normalized, error = cached
+            if error:
+                raise EmailSyntaxError(error)
+            return normalized
+
+        self.counters['cache_miss'] += 1
+        try:
+            normalized = self._validate(email)
+        except EmailNotValidError as e:
+            self.addresses.set(email, (None, str(e)))
+            raise
+        self.addresses.set(email, (normalized, None))
+        return normalized
+
+    def _validate(self, email):
+        local_part, domain_part = email.rsplit('@', 1)
+
+        domain, error = self._domain_verdict(domain_part)
+        if error:
+            raise EmailSyntaxError(error)
+
+        if len(local_part) > MAX_LOCAL_PART_LENGTH or not SIMPLE_LOCAL_PART_RE.match(local_part):
+            # Quoted, internationalized or otherwise unusual local parts
+            # take the full library path
+            return validate_email(email, check_deliverability=False).normalized
+
+        if local_part.lower() in CASE_INSENSITIVE_MAILBOX_NAMES:
+            local_part = local_part.lower()
+
+        normalized = local_part + '@' + domain
+        if len(normalized) > MAX_EMAIL_LENGTH:
+            raise EmailSyntaxError("The email address is too long.")
+        return normalized
+
+    def _domain_verdict(self, domain_part):
+        cached = self.domains.get(domain_part)
+        if cached is not None:
+            self.counters['domain_cache_hit'] += 1
+            return cached
+
+        self.counters['domain_cache_miss'] += 1
+        try:
+            info = validate_email_domain_name(domain_part)
+            verdict = (info['domain'], None)
+        except EmailNotValidError as e:
+            verdict = (None, str(e))
+        self.domains.set(domain_part, verdict)
+        return verdict
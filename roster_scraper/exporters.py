@@ -0,0 +1,294 @@
+# Row writers used by CSVExportPipeline
+#
+# Each writer takes batches of row tuples in ProfileItem field order and
+# appends them to one output file. CSV and JSON Lines use the standard
+# library; Parquet and Arrow need the optional pyarrow package.
+# BackgroundRowWriter wraps any of them so the writes happen on a thread of
+# their own instead of the reactor thread, and hands back a Deferred instead
+# of blocking when that thread falls behind.
+
+import abc
+import collections
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from twisted.internet.defer import Deferred
+
+from roster_scraper.items import ProfileItem
+
+
+FIELDNAMES = list(ProfileItem.fields)
+
+FILE_EXTENSIONS = {
+    'csv': '.csv',
+    'jsonl': '.jsonl',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+
+class CsvRowWriter:
+    def __init__(self, path, fieldnames=FIELDNAMES, append=False):
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(fieldnames)
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesRowWriter:
+    def __init__(self, path, fieldnames=FIELDNAMES, append=False):
+        self.fieldnames = fieldnames
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.encoder = json.JSONEncoder(ensure_ascii=False)
+
+    def write_batch(self, rows):
+        fieldnames = self.fieldnames
+        encode = self.encoder.encode
+        self.file.write(''.join(
+            encode(dict(zip(fieldnames, row))) + '\n' for row in rows
+        ))
+        self.file.flush()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class QueueRowWriter:
+    """Puts each batch on a multiprocessing queue as ('rows', label, rows)"""
+
+    def __init__(self, queue, label):
+        self.queue = queue
+        self.label = label
+
+    def write_batch(self, rows):
+        self.queue.put(('rows', self.label, list(rows)))
+
+    def close(self):
+        # The queue belongs to the parent process
+        pass
+
+
+class BackgroundRowWriter:
+    """Hands batches to a writer thread through a bounded queue
+
+    write_batch returns None as soon as the batch is queued. When
+    max_batches batches are already waiting the batch is held back, in
+    order, and write_batch returns a Deferred that fires on the reactor
+    thread once the writer thread has taken it into the queue. Returning
+    that Deferred from process_item makes Scrapy wait for the disk without
+    blocking the reactor. The file is fsynced at most every fsync_interval
+    seconds while writing (0 turns that off) and always once on close. An
+    error on the writer thread is raised from the next write_batch, drain
+    or close.
+    """
+
+    _STOP = object()
+
+    def __init__(self, writer, max_batches=8, fsync_interval=0.0):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max(1, max_batches))
+        # Batches waiting for room in the queue, with the Deferreds to fire
+        self.overflow = collections.deque()
+        self.overflow_lock = threading.Lock()
+        self.blocked_since = None
+        self.fsync_interval = fsync_interval
+        self.last_fsync = time.monotonic()
+        self.error = None
+        self.counters = {'batches': 0, 'rows': 0, 'blocked': 0, 'blocked_seconds': 0.0,
+                         'fsyncs': 0, 'max_queue_depth': 0,
+                         'write_seconds': 0.0, 'max_write_seconds': 0.0}
+        self.thread = threading.Thread(target=self._run, name='roster-export-writer', daemon=True)
+        self.thread.start()
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() + len(self.overflow)
+
+    def write_batch(self, rows):
+        self._raise_error()
+        batch = list(rows)
+        with self.overflow_lock:
+            if not self.overflow:
+                try:
+                    self.queue.put_nowait(batch)
+                    self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self.queue.qsize())
+                    return None
+                except queue.Full:
+                    self.counters['blocked'] += 1
+                    self.blocked_since = time.monotonic()
+            queued = Deferred()
+            self.overflow.append((batch, queued))
+        return queued
+
+    def drain(self):
+        """Wait until every queued batch has been written"""
+        # Held-back batches keep a queued batch unfinished until they are queued
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.queue.join()
+        self.queue.put(self._STOP)
+        self.thread.join()
+        try:
+            self._raise_error()
+            self._fsync()
+        finally:
+            self.writer.close()
+
+    def _admit_overflow(self):
+        # Called by the writer thread right after it took a batch, so the
+        # queue has room for at least one held-back batch
+        from twisted.internet import reactor
+        with self.overflow_lock:
+            while self.overflow:
+                batch, queued = self.overflow[0]
+                try:
+                    self.queue.put_nowait(batch)
+                except queue.Full:
+                    return
+                self.overflow.popleft()
+                reactor.callFromThread(queued.callback, None)
+            if self.blocked_since is not None:
+                self.counters['blocked_seconds'] += time.monotonic() - self.blocked_since
+                self.blocked_since = None
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if self.overflow:
+                    self._admit_overflow()
+                if batch is self._STOP:
+                    return
+                if self.error is not None:
+                    # Keep draining so producers never block on a dead thread
+                    continue
+                start = time.monotonic()
+                self.writer.write_batch(batch)
+                elapsed = time.monotonic() - start
+                counters = self.counters
+                counters['batches'] += 1
+                counters['rows'] += len(batch)
+                counters['write_seconds'] += elapsed
+                counters['max_write_seconds'] = max(counters['max_write_seconds'], elapsed)
+                if self.fsync_interval > 0 and time.monotonic() - self.last_fsync >= self.fsync_interval:
+                    self._fsync()
+            except Exception as e:
+                logging.error(f"Export writer thread failed: {e}")
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _fsync(self):
+        fsync = getattr(self.writer, 'fsync', None)
+        if fsync is not None:
+            fsync()
+            self.counters['fsyncs'] += 1
+        self.last_fsync = time.monotonic()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Export writer thread failed: {self.error}") from self.error
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(
+            "Parquet and Arrow export require pyarrow. Install it with: pip install pyarrow"
+        )
+    return pyarrow
+
+
+def arrow_schema(fieldnames=FIELDNAMES):
+    """Arrow schema for ProfileItem: every field is a nullable string"""
+    pa = _import_pyarrow()
+    return pa.schema([pa.field(name, pa.string()) for name in fieldnames])
+
+
+class _ArrowBatchWriter(abc.ABC):
+    def __init__(self, path, fieldnames=FIELDNAMES, append=False):
+        if append:
+            raise ValueError("Parquet and Arrow files cannot be appended to")
+        self.pa = _import_pyarrow()
+        self.fieldnames = fieldnames
+        self.schema = arrow_schema(fieldnames)
+        self.writer = self._open(path)
+
+    @abc.abstractmethod
+    def _open(self, path):
+        """The pyarrow writer for path, with write_table() and close()"""
+
+    def write_batch(self, rows):
+        columns = [self.pa.array(column, type=self.pa.string()) for column in zip(*rows)]
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetRowWriter(_ArrowBatchWriter):
+    """Writes each batch as one Parquet row group"""
+
+    def _open(self, path):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, self.schema)
+
+
+class ArrowRowWriter(_ArrowBatchWriter):
+    """Writes each batch as one record batch in an Arrow IPC file"""
+
+    def _open(self, path):
+        import pyarrow.ipc as ipc
+        return ipc.new_file(path, self.schema)
+
+
+ROW_WRITERS = {
+    'csv': CsvRowWriter,
+    'jsonl': JsonLinesRowWriter,
+    'parquet': ParquetRowWriter,
+    'arrow': ArrowRowWriter,
+}
+
+
+def open_row_writer(path, output_format='csv', append=False, fieldnames=FIELDNAMES):
+    try:
+        writer_cls = ROW_WRITERS[output_format]
+    except KeyError:
+        raise ValueError(
+            f"Unknown export format: {output_format} (choose from {', '.join(ROW_WRITERS)})"
+        )
+    return writer_cls(path, fieldnames=fieldnames, append=append)
+
+
+def read_rows(path, output_format='csv'):
+    """Rows of a CSV or JSON Lines export as dicts"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if output_format == 'csv':
+            yield from csv.DictReader(f)
+        elif output_format == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Cannot read back {output_format} output")
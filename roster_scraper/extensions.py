@@ -0,0 +1,305 @@
+# Crawl instrumentation extension
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+#
+# CrawlMetrics times every item pipeline stage and counts accepted and
+# dropped items by reason, times each download (Playwright render or plain
+# HTTP) and each parse callback per role, and publishes the results in
+# Scrapy stats and in Prometheus text format, either as a textfile for
+# node_exporter or from a local HTTP endpoint, refreshed during the crawl.
+# Pipelines report their stage through the timed_stage decorator on their
+# process_item, and the spider middleware reports callback times, both to
+# CrawlMetrics.active.
+
+import functools
+import inspect
+import logging
+import time
+
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet.defer import Deferred
+
+from roster_scraper.metrics import MetricsRegistry
+
+
+def _scraper(crawler):
+    """The running engine's scraper, or None outside a crawl"""
+    try:
+        engine = crawler.engine
+    except (AttributeError, RuntimeError):
+        # Newer Scrapy raises until the crawl has started
+        return None
+    return getattr(engine, 'scraper', None)
+
+
+class CrawlMetrics:
+    """Pipeline, download and parse timing published as stats and Prometheus metrics"""
+
+    # Published so the spider middleware can report callback times
+    active = None
+
+    def __init__(self, stats=None, textfile=None, http_port=None, http_host='127.0.0.1', interval=15.0, crawler=None):
+        self.stats = stats
+        self.crawler = crawler
+        self.textfile = textfile
+        self.http_port = http_port
+        self.http_host = http_host
+        self.interval = interval
+        self.registry = MetricsRegistry()
+        self.stages = []
+        self.refresh_task = None
+        self.listener = None
+        self._describe()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED', True):
+            raise NotConfigured
+        http_port = settings.get('METRICS_HTTP_PORT')
+        ext = cls(
+            stats=crawler.stats,
+            textfile=settings.get('METRICS_TEXTFILE'),
+            http_port=int(http_port) if http_port not in (None, '') else None,
+            http_host=settings.get('METRICS_HTTP_HOST', '127.0.0.1'),
+            interval=settings.getfloat('METRICS_INTERVAL', 15.0),
+            crawler=crawler,
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def _describe(self):
+        describe = self.registry.describe
+        describe('pipeline_stage_seconds', 'histogram', 'Time spent in each item pipeline stage')
+        describe('pipeline_items_total', 'counter', 'Items leaving each pipeline stage, by outcome and drop reason')
+        describe('download_seconds', 'histogram', 'Listing download time per role; renderer="playwright" is render time')
+        describe('parse_seconds', 'histogram', 'Time spent in spider callbacks per role')
+
+    # Pipeline stages
+
+    def check_stages(self):
+        """Warn about loaded pipelines that do not report their timing"""
+        scraper = _scraper(self.crawler) if self.crawler is not None else None
+        if scraper is None:
+            return
+        untimed_stages = [
+            type(pipeline).__name__ for pipeline in scraper.itemproc.middlewares
+            if hasattr(pipeline, 'process_item')
+            and not getattr(pipeline.process_item, 'timed_stage', False)
+        ]
+        if untimed_stages:
+            logging.warning(
+                f"Pipelines without @timed_stage are not timed: {', '.join(untimed_stages)}"
+            )
+
+    async def _timed_awaitable(self, stage, start, awaitable):
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.record_stage(stage, start, e)
+            raise
+        self.record_stage(stage, start)
+        return result
+
+    def record_stage(self, stage, start, dropped=None):
+        if stage not in self.stages:
+            self.stages.append(stage)
+        self.registry.observe('pipeline_stage_seconds', time.perf_counter() - start, stage=stage)
+        if dropped is None:
+            self.registry.inc('pipeline_items_total', stage=stage, outcome='accepted', reason='')
+        elif isinstance(dropped, DropItem):
+            reason = getattr(dropped, 'reason', None) or 'unspecified'
+            self.registry.inc('pipeline_items_total', stage=stage, outcome='dropped', reason=reason)
+        else:
+            self.registry.inc('pipeline_items_total', stage=stage, outcome='error', reason=type(dropped).__name__)
+
+    # Downloads and callbacks
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        renderer = 'playwright' if request.meta.get('playwright') else 'http'
+        role = request.meta.get('role_type') or 'unknown'
+        self.registry.observe('download_seconds', latency, role=role, renderer=renderer)
+
+    def observe_parse(self, role, seconds):
+        self.registry.observe('parse_seconds', seconds, role=role or 'unknown')
+
+    # Publishing
+
+    def publish_stats(self):
+        if self.stats is None:
+            return
+        registry = self.registry
+        for (name, labels), value in registry.counters.items():
+            if name == 'pipeline_items_total':
+                labels = dict(labels)
+                key = f"metrics/pipeline/{labels['stage']}/{labels['outcome']}"
+                if labels['reason']:
+                    key += f"/{labels['reason']}"
+                self.stats.set_value(key, value)
+        for (name, labels), histogram in registry.histograms.items():
+            prefix = 'metrics/' + '/'.join([name.replace('_seconds', '')] + [value for _, value in labels])
+            self.stats.set_value(f"{prefix}/count", histogram.count)
+            self.stats.set_value(f"{prefix}/avg_ms", round(histogram.sum / histogram.count * 1000, 3))
+            self.stats.set_value(f"{prefix}/max_ms", round(histogram.max * 1000, 3))
+
+    def refresh(self):
+        self.publish_stats()
+        if self.textfile:
+            try:
+                self.registry.write_textfile(self.textfile)
+            except OSError as e:
+                logging.warning(f"Could not write metrics textfile {self.textfile}: {e}")
+
+    def start_http(self):
+        from twisted.internet import reactor
+        from twisted.web.resource import Resource
+        from twisted.web.server import Site
+
+        registry = self.registry
+
+        class MetricsResource(Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+                return registry.render().encode('utf-8')
+
+        self.listener = reactor.listenTCP(self.http_port, Site(MetricsResource()), interface=self.http_host)
+        logging.info(f"Serving metrics on http://{self.http_host}:{self.http_port}/metrics")
+
+    def spider_opened(self, spider):
+        CrawlMetrics.active = self
+        self.check_stages()
+        if self.http_port is not None:
+            self.start_http()
+        if self.interval > 0 and (self.textfile or self.stats is not None):
+            from twisted.internet import task
+            self.refresh_task = task.LoopingCall(self.refresh)
+            self.refresh_task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.refresh_task is not None and self.refresh_task.running:
+            self.refresh_task.stop()
+        self.refresh()
+        if self.listener is not None:
+            self.listener.stopListening()
+            self.listener = None
+        if CrawlMetrics.active is self:
+            CrawlMetrics.active = None
+
+
+def timed_stage(process_item):
+    """Decorator reporting a pipeline's process_item to the active CrawlMetrics
+
+    The stage is named after the pipeline class. Drops are counted by their
+    reason; Deferred and awaitable results are timed until they resolve.
+    """
+
+    @functools.wraps(process_item)
+    def timed(self, item, *args):
+        metrics = CrawlMetrics.active
+        if metrics is None:
+            return process_item(self, item, *args)
+        stage = type(self).__name__
+        start = time.perf_counter()
+        try:
+            result = process_item(self, item, *args)
+        except Exception as e:
+            metrics.record_stage(stage, start, e)
+            raise
+        if isinstance(result, Deferred):
+            return result.addCallbacks(
+                lambda value: metrics.record_stage(stage, start) or value,
+                lambda failure: metrics.record_stage(stage, start, failure.value) or failure,
+            )
+        if inspect.isawaitable(result):
+            return metrics._timed_awaitable(stage, start, result)
+        metrics.record_stage(stage, start)
+        return result
+
+    timed.timed_stage = True
+    return timed
+
+
+def untimed(method):
+    """A bound process_item without its timed_stage wrapper
+
+    For stages that run another pipeline inside their own timing, so its
+    time is not counted twice.
+    """
+    wrapped = getattr(method, '__wrapped__', None)
+    return method if wrapped is None else wrapped.__get__(method.__self__)
+
+
+class CrawlCheckpoint:
+    """Periodically saves the crawl position to the spider's job directory
+
+    Pipelines with a checkpoint() method are asked to flush first and may
+    add to the saved state (the export pipeline reports its write offset).
+    A checkpoint is skipped while items are still inside the pipelines, so
+    a page is never recorded as completed before its rows are written.
+    """
+
+    def __init__(self, crawler, interval=30.0):
+        self.crawler = crawler
+        self.interval = interval
+        self.save_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.get('CHECKPOINT_DIR'):
+            raise NotConfigured
+        ext = cls(crawler, interval=settings.getfloat('CHECKPOINT_INTERVAL', 30.0))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def busy(self):
+        slot = getattr(_scraper(self.crawler), 'slot', None)
+        return slot is not None and slot.itemproc_size > 0
+
+    def pipelines(self):
+        scraper = _scraper(self.crawler)
+        if scraper is None:
+            return []
+        return [mw for mw in scraper.itemproc.middlewares if hasattr(mw, 'checkpoint')]
+
+    def save(self, spider, finished=False):
+        job = getattr(spider, 'job', None)
+        if job is None:
+            return False
+        state = {}
+        for pipeline in self.pipelines():
+            state.update(pipeline.checkpoint())
+        state.update(spider.checkpoint_state())
+        state['finished'] = finished
+        job.save(state)
+        if self.crawler.stats is not None:
+            self.crawler.stats.set_value('checkpoint/saves', job.saves)
+        return True
+
+    def save_if_idle(self):
+        if self.busy():
+            logging.debug("Items still in the pipelines, postponing checkpoint")
+            return
+        self.save(self.crawler.spider)
+
+    def spider_opened(self, spider):
+        if self.interval > 0:
+            from twisted.internet import task
+            self.save_task = task.LoopingCall(self.save_if_idle)
+            self.save_task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.save_task is not None and self.save_task.running:
+            self.save_task.stop()
+        self.save(spider, finished=reason == 'finished')
+        logging.info(f"Checkpoint saved to {spider.job.path}")
@@ -0,0 +1,105 @@
+# Page-wide email extraction for the spider
+#
+# Instead of joining every card's text nodes and running a regex per card
+# (which rescans the same text many times when the broad XPath fallback
+# matches nested divs), EmailExtractor walks the page text once, runs one
+# precompiled pattern over it and maps each match back to its card by
+# document position. The same pattern also decodes common obfuscations
+# such as "jane [at] example [dot] com".
+
+import re
+from bisect import bisect_left
+
+from lxml import etree
+
+
+_AT = r'(?:@|\s*[\[\(\{<]\s*at\s*[\]\)\}>]\s*)'
+_DOT = r'(?:\.|\s*[\[\(\{<]\s*dot\s*[\]\)\}>]\s*)'
+
+EMAIL_RE = re.compile(
+    rf'\b([A-Za-z0-9._%+-]+){_AT}([A-Za-z0-9-]+(?:{_DOT}[A-Za-z0-9-]+)*{_DOT}[A-Za-z]{{2,}})\b',
+    re.IGNORECASE,
+)
+_DOT_RE = re.compile(_DOT, re.IGNORECASE)
+
+SKIPPED_TAGS = frozenset(['script', 'style', 'template'])
+
+
+def match_to_email(match):
+    """Rebuild a plain address from a (possibly obfuscated) match"""
+    local_part, domain = match.groups()
+    return f"{local_part}@{_DOT_RE.sub('.', domain)}"
+
+
+def find_emails(text):
+    """All addresses in a string, in order of appearance"""
+    return [match_to_email(m) for m in EMAIL_RE.finditer(text)]
+
+
+class PageEmails:
+    """First email in each card's text, computed on first lookup"""
+
+    def __init__(self, extractor, root, cards):
+        self.extractor = extractor
+        self.root = root
+        self.cards = cards
+        self.emails = None
+
+    def get(self, card):
+        if self.emails is None:
+            self.emails = self.extractor.scan(self.root, self.cards)
+        return self.emails.get(card)
+
+
+class EmailExtractor:
+    """Single-pass email extraction over a document, mapped back to cards"""
+
+    def __init__(self, pattern=EMAIL_RE):
+        self.pattern = pattern
+
+    def for_page(self, root, cards):
+        return PageEmails(self, root, cards)
+
+    def scan(self, root, cards):
+        """Map each card element to the first email in its text, if any"""
+        cards = set(cards)
+        spans = {}
+        pieces = []
+        offset = 0
+        skipping = 0
+
+        for event, element in etree.iterwalk(root, events=('start', 'end')):
+            is_tag = isinstance(element.tag, str)
+            if event == 'start':
+                if element in cards:
+                    spans[element] = [offset, offset]
+                if not is_tag:
+                    continue
+                if element.tag in SKIPPED_TAGS:
+                    skipping += 1
+                elif not skipping and element.text:
+                    pieces.append(element.text)
+                    offset += len(element.text) + 1
+            else:
+                if is_tag and element.tag in SKIPPED_TAGS:
+                    skipping -= 1
+                if element in spans:
+                    spans[element][1] = offset
+                if not skipping and element.tail and element is not root:
+                    pieces.append(element.tail)
+                    offset += len(element.tail) + 1
+
+        # Pieces are joined with a space, matching offsets counted above
+        text = ' '.join(pieces)
+        positions = []
+        emails = []
+        for match in self.pattern.finditer(text):
+            positions.append(match.start())
+            emails.append(match_to_email(match))
+
+        found = {}
+        for card, (start, end) in spans.items():
+            i = bisect_left(positions, start)
+            if i < len(positions) and positions[i] < end:
+                found[card] = emails[i]
+        return found
@@ -0,0 +1,208 @@
+# Cache storage for rendered pages
+#
+# Scrapy's filesystem cache keys entries by request fingerprint, which is the
+# same for the plain HTTP fetch and the Playwright render of a URL, never
+# expires entries per URL and grows without limit. RenderedPageCacheStorage
+# plugs into the stock HttpCacheMiddleware (HTTPCACHE_STORAGE) and keeps the
+# final DOM of each page keyed by canonical URL, role and renderer, stored
+# compressed, with a TTL per URL pattern and least-recently-used eviction
+# once the cache directory passes RENDER_CACHE_MAX_BYTES. In offline mode
+# entries never expire, so a crawl can be replayed from the cache alone.
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from fnmatch import fnmatch
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.url import canonicalize_url
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+COMPRESSIONS = ('gzip', 'zstd', 'none')
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd cache compression requires zstandard. Install it with: pip install zstandard"
+        )
+    return zstandard
+
+
+def compress(data, method='gzip'):
+    if method == 'zstd':
+        return _import_zstandard().ZstdCompressor().compress(data)
+    if method == 'gzip':
+        # Fast level: pages are cached while the crawl is waiting on them
+        return gzip.compress(data, compresslevel=5, mtime=0)
+    return data
+
+
+def decompress(data):
+    """Decompress by magic number, so entries survive a change of method"""
+    if data.startswith(ZSTD_MAGIC):
+        return _import_zstandard().ZstdDecompressor().decompress(data)
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    return data
+
+
+def cache_key(request):
+    """Canonical URL, role and renderer of a request
+
+    The renderer is part of the key so a hybrid crawl's plain HTTP fetch
+    never answers for the rendered page of the same URL.
+    """
+    renderer = 'playwright' if request.meta.get('playwright') else 'http'
+    role_type = request.meta.get('role_type') or ''
+    return f"{canonicalize_url(request.url)} {role_type} {renderer}"
+
+
+class RenderedPageCacheStorage:
+    """Compressed, TTL-aware, size-bounded cache storage for HttpCacheMiddleware"""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.default_ttl = settings.getint('HTTPCACHE_EXPIRATION_SECS', 0)
+        self.ttls = dict(settings.getdict('RENDER_CACHE_TTL'))
+        self.compression = settings.get('RENDER_CACHE_COMPRESSION', 'gzip') or 'none'
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown cache compression: {self.compression} (choose from {', '.join(COMPRESSIONS)})"
+            )
+        if self.compression == 'zstd':
+            _import_zstandard()
+        self.max_bytes = settings.getint('RENDER_CACHE_MAX_BYTES', 0)
+        self.offline = settings.getbool('RENDER_CACHE_OFFLINE', False)
+        self.directory = None
+        # Entry path -> size in bytes, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.counters = {'expired': 0, 'evicted': 0, 'evicted_bytes': 0}
+        self.stats = None
+
+    def open_spider(self, spider):
+        self.directory = os.path.join(self.cachedir, spider.name)
+        os.makedirs(self.directory, exist_ok=True)
+        crawler = getattr(spider, 'crawler', None)
+        self.stats = crawler.stats if crawler is not None else None
+        self.load_index()
+        logging.info(
+            f"Render cache in {self.directory}: {len(self.entries)} entries, "
+            f"{self.total_bytes / 1e6:.1f} MB{' (offline)' if self.offline else ''}"
+        )
+
+    def close_spider(self, spider):
+        self._publish_stats()
+
+    def load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.path, stat.st_size))
+        found.sort()
+        self.entries = OrderedDict((path, size) for _, path, size in found)
+        self.total_bytes = sum(self.entries.values())
+
+    def ttl(self, url):
+        """Seconds an entry for `url` stays fresh; 0 means forever"""
+        for pattern, seconds in self.ttls.items():
+            if fnmatch(url, pattern):
+                return int(seconds)
+        return self.default_ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def retrieve_response(self, spider, request):
+        path = self._path(cache_key(request))
+        try:
+            with open(path, 'rb') as f:
+                data = decompress(f.read())
+        except FileNotFoundError:
+            return None
+        header, _, body = data.partition(b'\n')
+        entry = json.loads(header)
+
+        ttl = self.ttl(request.url)
+        if not self.offline and ttl and time.time() - entry['stored_at'] > ttl:
+            self.counters['expired'] += 1
+            self._remove(path)
+            return None
+
+        # Mark as recently used, here and on disk for the next run
+        if path in self.entries:
+            self.entries.move_to_end(path)
+        os.utime(path)
+
+        headers = Headers([(name, value) for name, value in entry['headers']])
+        url = entry['url']
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, status=entry['status'], headers=headers, body=body, request=request)
+
+    def store_response(self, spider, request, response):
+        key = cache_key(request)
+        path = self._path(key)
+        header = {
+            'key': key,
+            'url': response.url,
+            'status': response.status,
+            'headers': [
+                [name.decode('latin-1'), value.decode('latin-1')]
+                for name, values in response.headers.items() for value in values
+            ],
+            'stored_at': time.time(),
+        }
+        data = compress(json.dumps(header).encode('utf-8') + b'\n' + response.body, self.compression)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self.total_bytes += len(data) - self.entries.pop(path, 0)
+        self.entries[path] = len(data)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        if not self.max_bytes:
+            return
+        while self.total_bytes > self.max_bytes and self.entries:
+            path = next(iter(self.entries))
+            if path == keep:
+                # A single entry larger than the bound stays until the next store
+                break
+            self.counters['evicted'] += 1
+            self.counters['evicted_bytes'] += self.entries[path]
+            self._remove(path)
+        self._publish_stats()
+
+    def _remove(self, path):
+        self.total_bytes -= self.entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _publish_stats(self):
+        if self.stats is None:
+            return
+        for name, value in self.counters.items():
+            self.stats.set_value(f'render_cache/{name}', value)
+        self.stats.set_value('render_cache/entries', len(self.entries))
+        self.stats.set_value('render_cache/bytes', self.total_bytes)
@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+
 import scrapy
 
 
@@ -6,3 +8,42 @@ class ProfileItem(scrapy.Item):
     email = scrapy.Field()
     profile_link = scrapy.Field()
     role_type = scrapy.Field()
+
+
+@dataclass(slots=True)
+class ProfileRecord:
+    """Compact profile item with the ProfileItem fields as slots
+
+    No per-instance dict, so a million of them take a fraction of the memory
+    of ProfileItem. Scrapy handles it through itemadapter's dataclass
+    support, and the pipelines read its attributes directly. Mapping access
+    is kept so code written against ProfileItem works unchanged.
+    """
+
+    name: str = None
+    email: str = None
+    profile_link: str = None
+    role_type: str = None
+
+    def __getitem__(self, key):
+        if key not in PROFILE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in PROFILE_FIELDS:
+            raise KeyError(f"ProfileRecord does not support field: {key}")
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in PROFILE_FIELDS else default
+
+    def row(self):
+        """Field values in export order"""
+        return (self.name, self.email, self.profile_link, self.role_type)
+
+
+PROFILE_FIELDS = frozenset(ProfileItem.fields)
+
+# Item classes the spider can be configured to yield (PROFILE_ITEM_CLASS)
+PROFILE_ITEM_TYPES = (ProfileItem, ProfileRecord)
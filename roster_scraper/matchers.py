@@ -0,0 +1,87 @@
+# Keyword matching helpers used by the item pipelines
+#
+# The brand filter needs to test every scraped name against a keyword list
+# that can grow to tens of thousands of entries. Instead of looping over the
+# list for every item, the keywords are folded into a prefix trie and turned
+# into a single compiled regular expression, so each name is scanned once.
+
+import re
+import logging
+
+
+def load_keywords(path):
+    """Load keywords from a text file, one per line ('#' starts a comment)"""
+    keywords = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            keyword = line.split('#', 1)[0].strip()
+            if keyword:
+                keywords.append(keyword)
+    logging.info(f"Loaded {len(keywords)} keywords from {path}")
+    return keywords
+
+
+def _build_trie(keywords):
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+def _trie_to_pattern(node):
+    """Turn a trie node into a regex fragment that shares common prefixes"""
+    alternatives = []
+    leaves = []
+
+    for char in sorted(k for k in node if k):
+        child = node[char]
+        if len(child) == 1 and '' in child:
+            leaves.append(re.escape(char))
+        else:
+            alternatives.append(re.escape(char) + _trie_to_pattern(child))
+
+    is_atom = not alternatives
+    if leaves:
+        alternatives.append(leaves[0] if len(leaves) == 1 else '[' + ''.join(leaves) + ']')
+    is_atom = is_atom and len(alternatives) == 1
+
+    if len(alternatives) == 1:
+        pattern = alternatives[0]
+    else:
+        pattern = '(?:' + '|'.join(alternatives) + ')'
+
+    if '' in node:
+        return pattern + '?' if is_atom else '(?:' + pattern + ')?'
+    return pattern
+
+
+class KeywordMatcher:
+    """Whole-word, case-insensitive matcher over a fixed keyword list
+
+    All keywords are compiled into one trie-shaped regex anchored on word
+    boundaries, so "co" matches "Acme Co" but not "Nicole".
+    """
+
+    def __init__(self, keywords):
+        normalized = {k.strip().lower() for k in keywords if k and k.strip()}
+        self.keywords = frozenset(normalized)
+        if normalized:
+            pattern = r'(?<!\w)' + _trie_to_pattern(_build_trie(normalized)) + r'(?!\w)'
+            self.regex = re.compile(pattern, re.IGNORECASE)
+        else:
+            self.regex = None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text):
+        """Return the first keyword found in text, or None"""
+        if not text or self.regex is None:
+            return None
+        match = self.regex.search(text)
+        if match:
+            return match.group(0).lower()
+        return None
@@ -0,0 +1,128 @@
+# In-process metrics registry with Prometheus text output
+#
+# CrawlMetrics (see extensions.py) records pipeline stage latencies, drop
+# reasons, download/render times and parse callback times here. The registry
+# renders the Prometheus text exposition format itself, so exporting to a
+# node_exporter textfile or a local HTTP endpoint needs no extra dependency.
+
+import os
+from bisect import bisect_left
+
+
+# Upper bounds in seconds, from sub-millisecond pipeline stages to slow renders
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class MetricsRegistry:
+    """Labelled counters and histograms, rendered in Prometheus text format
+
+    Labels are passed as keyword arguments; each distinct label set is its
+    own series.
+    """
+
+    def __init__(self, namespace='roster'):
+        self.namespace = namespace
+        self.help = {}
+        self.types = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def describe(self, name, kind, help_text):
+        self.types[name] = kind
+        self.help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def render(self):
+        """The whole registry in Prometheus text exposition format"""
+        series = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            series.setdefault(name, []).append(
+                f"{self.namespace}_{name}{_format_labels(labels)} {value}"
+            )
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+            full = f"{self.namespace}_{name}"
+            lines = series.setdefault(name, [])
+            for bound, count in histogram.cumulative():
+                bucket_labels = labels + (('le', _format_bound(bound)),)
+                lines.append(f"{full}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+
+        out = []
+        for name in sorted(series):
+            full = f"{self.namespace}_{name}"
+            if name in self.help:
+                out.append(f"# HELP {full} {self.help[name]}")
+            if name in self.types:
+                out.append(f"# TYPE {full} {self.types[name]}")
+            out.extend(series[name])
+        return '\n'.join(out) + '\n'
+
+    def write_textfile(self, path):
+        """Write atomically, so a scraping node_exporter never sees half a file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
@@ -3,7 +3,23 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
+import re
+import time
+import weakref
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Request
+from scrapy.utils.defer import deferred_from_coro
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.error import TCPTimedOutError, TimeoutError as TwistedTimeoutError
+
+from roster_scraper.browser import PagePool, role_context_name
+from roster_scraper.distributed import request_task
+from roster_scraper.extensions import CrawlMetrics
+from roster_scraper.signals import role_quota_met
+from roster_scraper.throttle import AIMDController
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -33,8 +49,45 @@ class RosterScraperSpiderMiddleware:
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
+        # Time spent inside the callback is reported per role to the
+        # CrawlMetrics extension; time spent downstream is not counted.
+        metrics = CrawlMetrics.active
+        if metrics is None:
+            yield from result
+            return
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                i = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            yield i
+        metrics.observe_parse(response.meta.get('role_type'), elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as process_spider_output, for async callbacks such as
+        # parse_scroll, where the time includes the callback's own awaits
+        metrics = CrawlMetrics.active
+        if metrics is None:
+            async for i in result:
+                yield i
+            return
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                i = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
             yield i
+        metrics.observe_parse(response.meta.get('role_type'), elapsed)
 
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
@@ -53,48 +106,415 @@ class RosterScraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+class WorkQueueSpiderMiddleware:
+    # In a distributed crawl, sends the listing and detail-page requests a
+    # callback yields to the shared work queue instead of the local
+    # scheduler, and marks the response's own task done once the callback
+    # has finished, so the queue never looks empty while a page that may
+    # still add work is being parsed.
+
+    def __init__(self, stats=None):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.get('WORK_QUEUE'):
+            raise NotConfigured('WORK_QUEUE is not set')
+        return cls(stats=crawler.stats)
+
+    def _shared(self, request, spider):
+        return (
+            request.meta.get('role_type')
+            and not request.meta.get('playwright_include_page')
+            and request.callback in (spider.parse, spider.parse_detail)
+        )
+
+    def _route(self, i, spider):
+        """Queue a shareable request; returns True if it was taken"""
+        if not isinstance(i, Request) or not self._shared(i, spider):
+            return False
+        if spider.work_queue.push(request_task(i)) and self.stats is not None:
+            self.stats.inc_value('work_queue/pushed')
+        return True
+
+    def _finish(self, response, spider, failed=False):
+        task_id = response.meta.get('work_task_id')
+        if task_id is not None:
+            spider.task_done(task_id, failed=failed)
+
+    def process_spider_output(self, response, result, spider):
+        try:
+            for i in result:
+                if not self._route(i, spider):
+                    yield i
+        except Exception:
+            self._finish(response, spider, failed=True)
+            raise
+        self._finish(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        try:
+            async for i in result:
+                if not self._route(i, spider):
+                    yield i
+        except Exception:
+            self._finish(response, spider, failed=True)
+            raise
+        self._finish(response, spider)
+
+
 class RosterScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # Blocks resources that Playwright pages do not need (images, media,
+    # fonts, analytics scripts) and counts what was blocked per crawl.
+    #
+    # Blocking happens through scrapy-playwright's PLAYWRIGHT_ABORT_REQUEST
+    # hook, which must be an importable function, so the active middleware
+    # instance is published on the class when the spider opens.
+
+    active = None
+
+    def __init__(self, stats=None, enabled=True, blocked_types=(), deny_patterns=(), allow_patterns=()):
+        self.stats = stats
+        self.enabled = enabled
+        self.blocked_types = frozenset(blocked_types)
+        self.deny_regex = self._compile(deny_patterns)
+        self.allow_regex = self._compile(allow_patterns)
+        self.counted_pages = weakref.WeakSet()
+
+    @staticmethod
+    def _compile(patterns):
+        patterns = [p for p in patterns if p]
+        if not patterns:
+            return None
+        return re.compile('|'.join(f'(?:{p})' for p in patterns))
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        s = cls(
+            stats=crawler.stats,
+            enabled=settings.getbool('RESOURCE_BLOCKER_ENABLED', True),
+            blocked_types=settings.getlist('RESOURCE_BLOCKER_TYPES'),
+            deny_patterns=settings.getlist('RESOURCE_BLOCKER_DENY_PATTERNS'),
+            allow_patterns=settings.getlist('RESOURCE_BLOCKER_ALLOW_PATTERNS'),
+        )
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
+    def should_block(self, resource_type, url):
+        if not self.enabled:
+            return False
+        if self.allow_regex is not None and self.allow_regex.search(url):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        return self.deny_regex is not None and self.deny_regex.search(url) is not None
+
+    def abort_request(self, playwright_request):
+        # Called by scrapy-playwright for every request a page makes
+        resource_type = playwright_request.resource_type
+        if not self.should_block(resource_type, playwright_request.url):
+            return False
+        if self.stats is not None:
+            self.stats.inc_value('resource_blocker/blocked_requests')
+            self.stats.inc_value(f'resource_blocker/blocked_requests/{resource_type}')
+        return True
+
+    def count_response(self, response):
+        # Bytes of blocked requests are never transferred, so they cannot be
+        # measured; count what the allowed requests still cost instead
+        if self.stats is None:
+            return
+        length = response.headers.get('content-length')
+        self.stats.inc_value('resource_blocker/allowed_requests')
+        if length and length.isdigit():
+            self.stats.inc_value('resource_blocker/allowed_bytes', int(length))
+
+    async def watch_page(self, page):
+        if page not in self.counted_pages:
+            self.counted_pages.add(page)
+            page.on('response', self.count_response)
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        # Attach the byte counter to every page that renders a request.
+        # The callback is given by import path so requests stay picklable.
+        if self.enabled and request.meta.get('playwright'):
+            request.meta.setdefault(
+                'playwright_page_init_callback',
+                'roster_scraper.middlewares.watch_page_resources',
+            )
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
         pass
 
     def spider_opened(self, spider):
+        RosterScraperDownloaderMiddleware.active = self
         spider.logger.info("Spider opened: %s" % spider.name)
+        if self.enabled:
+            spider.logger.info(
+                "Blocking Playwright resource types: %s" % ', '.join(sorted(self.blocked_types))
+            )
+
+    def spider_closed(self, spider):
+        if RosterScraperDownloaderMiddleware.active is self:
+            RosterScraperDownloaderMiddleware.active = None
+
+
+class PagePoolMiddleware:
+    # Reuses warm Playwright pages and gives every role its own browser
+    # context (separate cookies and storage) and its own download slot, so
+    # roles render in parallel without sharing state.
+    #
+    # Requests opt out of the pool with meta 'page_pool': False.
+
+    def __init__(self, stats=None, size=2, reset=True, slot_per_role=True):
+        self.stats = stats
+        self.pool = PagePool(size=size, reset=reset)
+        self.slot_per_role = slot_per_role
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PAGE_POOL_ENABLED', True):
+            raise NotConfigured('PAGE_POOL_ENABLED is off')
+        s = cls(
+            stats=crawler.stats,
+            size=settings.getint('PAGE_POOL_SIZE', 2),
+            reset=settings.getbool('PAGE_POOL_RESET', True),
+            slot_per_role=settings.getbool('PAGE_POOL_SLOT_PER_ROLE', True),
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _pooled(self, request):
+        return (
+            request.meta.get('playwright')
+            and request.meta.get('role_type')
+            and request.meta.get('page_pool', True)
+        )
+
+    def _key(self, request):
+        return request.meta.get('playwright_context')
+
+    async def process_request(self, request, spider):
+        role_type = request.meta.get('role_type')
+        if role_type and self.slot_per_role and 'download_slot' not in request.meta:
+            request.meta['download_slot'] = f"{urlparse_cached(request).hostname}-{role_type}"
+
+        if not self._pooled(request):
+            return None
+
+        request.meta.setdefault('playwright_context', role_context_name(role_type))
+        request.meta['playwright_include_page'] = True
+        page = await self.pool.acquire(self._key(request))
+        if page is not None:
+            request.meta['playwright_page'] = page
+        request.meta['page_pool_slot'] = True
+        return None
+
+    def _release(self, request):
+        if not request.meta.pop('page_pool_slot', False):
+            return
+        page = request.meta.pop('playwright_page', None)
+        self.pool.release(self._key(request), page)
+        self._publish_stats()
+
+    def process_response(self, request, response, spider):
+        self._release(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._release(request)
+
+    def _publish_stats(self):
+        if self.stats is None:
+            return
+        for key, value in self.pool.counters.items():
+            self.stats.set_value(f'page_pool/{key}', value)
+
+    def spider_closed(self, spider):
+        # Pages close together with their browser contexts
+        self._publish_stats()
+        self.pool.clear()
+
+
+class RoleQuotaMiddleware:
+    # Stops spending renders on roles whose quota the pipelines have met.
+    #
+    # Requests of a satisfied role still waiting in the scheduler are
+    # dropped when they reach the downloader, and Playwright requests of
+    # that role already rendering are cancelled by closing their page.
+    #
+    # Every tracked render asks scrapy-playwright for its page, which puts
+    # it in meta as soon as it is opened. Pages nobody else asked for (not
+    # pooled, not kept by the spider) are closed here once the response or
+    # error comes back.
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.satisfied = set()
+        self.in_flight = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('QUOTA_CANCEL_ENABLED', True):
+            raise NotConfigured('QUOTA_CANCEL_ENABLED is off')
+        s = cls(stats=crawler.stats)
+        crawler.signals.connect(s.role_quota_met, signal=role_quota_met)
+        return s
+
+    def _count(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(f'quota/{key}')
+
+    def process_request(self, request, spider):
+        role_type = request.meta.get('role_type')
+        if role_type is None:
+            return None
+        if role_type in self.satisfied:
+            self._count('cancelled_queued')
+            raise IgnoreRequest(f"{role_type} quota already met")
+        if request.meta.get('playwright'):
+            if not request.meta.get('playwright_include_page'):
+                request.meta['playwright_include_page'] = True
+                request.meta['quota_closes_page'] = True
+            self.in_flight.setdefault(role_type, set()).add(request)
+        return None
+
+    def _finished(self, request):
+        role_type = request.meta.get('role_type')
+        self.in_flight.get(role_type, set()).discard(request)
+        if request.meta.get('quota_closes_page'):
+            # PagePoolMiddleware has already taken back pooled pages
+            page = request.meta.pop('playwright_page', None)
+            if page is not None and not page.is_closed():
+                deferred_from_coro(page.close())
+        return role_type
+
+    def process_response(self, request, response, spider):
+        role_type = self._finished(request)
+        if role_type in self.satisfied:
+            # Rendered after the quota was met: nothing left to parse it for
+            self._count('discarded_responses')
+            raise IgnoreRequest(f"{role_type} quota already met")
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._finished(request)
+        if request.meta.get('quota_cancelled'):
+            raise IgnoreRequest(f"{request.meta.get('role_type')} quota met while rendering")
+
+    def role_quota_met(self, role, spider):
+        self.satisfied.add(role)
+        for request in self.in_flight.pop(role, ()):
+            request.meta['quota_cancelled'] = True
+            page = request.meta.get('playwright_page')
+            if page is not None and not page.is_closed():
+                self._count('cancelled_in_flight')
+                deferred_from_coro(page.close())
+
+
+class AdaptiveConcurrencyMiddleware:
+    # Adjusts each download slot's concurrency and delay with an AIMD
+    # controller: healthy responses raise concurrency and lower the delay
+    # step by step, while 429/5xx responses, timeouts and slow renders halve
+    # concurrency and double the delay. Sits after RetryMiddleware so it sees
+    # every failed attempt, not just the final one.
+
+    TIMEOUT_ERRORS = (TimeoutError, TwistedTimeoutError, TCPTimedOutError)
+
+    def __init__(self, crawler, controller, backoff_codes=(429, 500, 502, 503, 504)):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller = controller
+        self.backoff_codes = frozenset(backoff_codes)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('AIMD_ENABLED', True):
+            raise NotConfigured('AIMD_ENABLED is off')
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            logging.warning("AUTOTHROTTLE_ENABLED and AIMD_ENABLED both adjust download delays; disable one")
+        controller = AIMDController(
+            min_concurrency=settings.getint('AIMD_MIN_CONCURRENCY', 1),
+            max_concurrency=settings.getint('AIMD_MAX_CONCURRENCY', 4),
+            start_concurrency=settings.getint('AIMD_START_CONCURRENCY', 1),
+            min_delay=settings.getfloat('AIMD_MIN_DELAY', 0.25),
+            max_delay=settings.getfloat('AIMD_MAX_DELAY', 30.0),
+            start_delay=settings.getfloat('DOWNLOAD_DELAY', 2.0),
+            delay_step=settings.getfloat('AIMD_DELAY_STEP', 0.25),
+            decrease_factor=settings.getfloat('AIMD_DECREASE_FACTOR', 0.5),
+            target_latency=settings.getfloat('AIMD_TARGET_LATENCY', 15.0),
+        )
+        backoff_codes = settings.getlist('AIMD_BACKOFF_HTTP_CODES', [429, 500, 502, 503, 504])
+        s = cls(crawler, controller, backoff_codes=[int(code) for code in backoff_codes])
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        request.meta['aimd_sent_at'] = time.monotonic()
+        return None
+
+    def _apply(self, request, state):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+        if self.stats is not None:
+            self.stats.set_value(f'aimd/{key}/concurrency', state.concurrency)
+            self.stats.set_value(f'aimd/{key}/delay', round(state.delay, 3))
+            self.stats.max_value(f'aimd/{key}/max_concurrency', state.concurrency)
+            for name, value in self.controller.counters.items():
+                self.stats.set_value(f'aimd/{name}', value)
+
+    def process_response(self, request, response, spider):
+        key = request.meta.get('download_slot')
+        if key is None or 'cached' in response.flags:
+            # Cache hits say nothing about how the site is coping
+            return response
+        sent_at = request.meta.get('aimd_sent_at')
+        if response.status in self.backoff_codes:
+            state = self.controller.on_congestion(key, sent_at, f'http_{response.status}')
+        else:
+            state = self.controller.on_response(
+                key, request.meta.get('download_latency'), sent_at, request.meta.get('slot_concurrency')
+            )
+        self._apply(request, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        key = request.meta.get('download_slot')
+        if key is None:
+            return None
+        if isinstance(exception, self.TIMEOUT_ERRORS) or 'Timeout' in type(exception).__name__:
+            # Also catches Playwright's own TimeoutError
+            state = self.controller.on_congestion(key, request.meta.get('aimd_sent_at'), 'timeout')
+            self._apply(request, state)
+        return None
+
+    def spider_closed(self, spider):
+        for key, state in self.controller.slots.items():
+            logging.info(f"AIMD final limits for {key}: {state}")
+
+
+def abort_blocked_resource(playwright_request):
+    """PLAYWRIGHT_ABORT_REQUEST hook delegating to the active middleware"""
+    blocker = RosterScraperDownloaderMiddleware.active
+    if blocker is None:
+        return False
+    return blocker.abort_request(playwright_request)
+
+
+async def watch_page_resources(page, request):
+    """playwright_page_init_callback counting bytes of allowed resources"""
+    blocker = RosterScraperDownloaderMiddleware.active
+    if blocker is not None:
+        await blocker.watch_page(page)
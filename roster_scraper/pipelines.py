@@ -3,30 +3,83 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
-import csv
+import os
 import re
+import time
 import logging
 from itemadapter import ItemAdapter
+from scrapy import signals
 from scrapy.exceptions import DropItem
-from email_validator import validate_email, EmailNotValidError
+from scrapy.utils.misc import load_object
+from email_validator import EmailNotValidError
+from roster_scraper.delta import DELTA_FIELDNAMES
+from roster_scraper.emails import EmailNormalizer
+from roster_scraper.exporters import FIELDNAMES, BackgroundRowWriter, QueueRowWriter, open_row_writer
+from roster_scraper.extensions import timed_stage, untimed
+from roster_scraper.items import ProfileRecord
+from roster_scraper.matchers import KeywordMatcher, load_keywords
+from roster_scraper.stores import MemorySeenStore, build_seen_store
+
+
+class ProfileDropped(DropItem):
+    """DropItem with a machine-readable reason, e.g. 'duplicate_email'"""
+    
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
 
 
 class EmailValidationPipeline:
     """Validate email addresses"""
     
+    STATS_PREFIX = 'email_validation'
+    
+    def __init__(self, cache_size=100000, domain_cache_size=10000, stats=None):
+        self.normalizer = EmailNormalizer(cache_size, domain_cache_size)
+        self.stats = stats
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            cache_size=settings.getint('EMAIL_VALIDATION_CACHE_SIZE', 100000),
+            domain_cache_size=settings.getint('EMAIL_VALIDATION_DOMAIN_CACHE_SIZE', 10000),
+            stats=crawler.stats,
+        )
+    
+    def close_spider(self, spider):
+        self._publish_stats()
+        counters = self.normalizer.counters
+        logging.info(
+            f"Email validation cache: {counters['cache_hit']} hits, "
+            f"{counters['cache_miss']} misses, "
+            f"{counters['precheck_rejected']} rejected by pre-check"
+        )
+    
+    def _publish_stats(self):
+        if self.stats is None:
+            return
+        for key, value in self.normalizer.counters.items():
+            self.stats.set_value(f"{self.STATS_PREFIX}/{key}", value)
+    
+    @timed_stage
     def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        email = adapter.get('email')
+        # ProfileRecord fields are plain attributes; skip the adapter
+        adapter = None if type(item) is ProfileRecord else ItemAdapter(item)
+        email = item.email if adapter is None else adapter.get('email')
         
         if not email:
-            raise DropItem(f"Missing email in {item}")
+            raise ProfileDropped('missing_email', f"Missing email in {item}")
         
         try:
             # Validate email
-            valid = validate_email(email, check_deliverability=False)
-            adapter['email'] = valid.normalized
+            normalized = self.normalizer.normalize(email)
         except EmailNotValidError as e:
-            raise DropItem(f"Invalid email {email}: {e}")
+            raise ProfileDropped('invalid_email', f"Invalid email {email}: {e}")
+        if adapter is None:
+            item.email = normalized
+        else:
+            adapter['email'] = normalized
         
         return item
 
@@ -40,55 +93,495 @@ class BrandNameFilterPipeline:
         'gmbh', 'plc', 'co', 'company', 'group', 'the'
     ]
     
+    def __init__(self, keywords=None, keywords_file=None):
+        self.keywords = list(keywords) if keywords is not None else list(self.BRAND_KEYWORDS)
+        self.keywords_file = keywords_file
+        self.matcher = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            keywords=settings.getlist('BRAND_KEYWORDS') or None,
+            keywords_file=settings.get('BRAND_KEYWORDS_FILE'),
+        )
+    
+    def build_matcher(self):
+        keywords = list(self.keywords)
+        if self.keywords_file:
+            keywords.extend(load_keywords(self.keywords_file))
+        self.matcher = KeywordMatcher(keywords)
+        logging.info(f"Brand filter compiled with {len(self.matcher)} keywords")
+        return self.matcher
+    
+    def open_spider(self, spider):
+        self.build_matcher()
+    
+    @timed_stage
     def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        name = adapter.get('name', '').lower()
+        if self.matcher is None:
+            self.build_matcher()
+        
+        if type(item) is ProfileRecord:
+            name = item.name
+        else:
+            name = ItemAdapter(item).get('name')
+        keyword = self.matcher.search(name or '')
         
-        for keyword in self.BRAND_KEYWORDS:
-            if keyword in name:
-                raise DropItem(f"Brand-like name detected: {adapter.get('name')}")
+        if keyword:
+            raise ProfileDropped('brand_name', f"Brand-like name detected: {name}")
         
         return item
 
 
+class RoleQuotaPipeline:
+    """Drop items of a role whose --min-per-role quota is already filled
+    
+    The spider counts an item towards its role when item_scraped fires, after
+    every pipeline, and only stops a role between pages, so the rest of the
+    page that fills a quota would still be exported. This stage lets through
+    only as many items per role as the quota still needs, counting the items
+    it passed that have not yet been scraped or dropped. It runs before dedup
+    so an item dropped here does not claim its address. Delta crawls are left
+    alone: their snapshot needs every profile on the pages they parse.
+    """
+    
+    def __init__(self, stats=None):
+        self.stats = stats
+        # Ids of items let through that have not finished the pipelines, per role
+        self.pending = {}
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(stats=crawler.stats)
+        crawler.signals.connect(s.item_finished, signal=signals.item_scraped)
+        crawler.signals.connect(s.item_finished, signal=signals.item_dropped)
+        crawler.signals.connect(s.item_finished, signal=signals.item_error)
+        return s
+    
+    def item_finished(self, item, spider):
+        for pending in self.pending.values():
+            pending.discard(id(item))
+    
+    def admit(self, item, spider):
+        """Whether the item's role still needs it; claims a place if so"""
+        role_counts = getattr(spider, 'role_counts', None)
+        if role_counts is None or getattr(spider, 'delta', None) is not None:
+            return True
+        role_type = item.role_type if type(item) is ProfileRecord else ItemAdapter(item).get('role_type')
+        if role_type not in role_counts:
+            return True
+        pending = self.pending.setdefault(role_type, set())
+        if role_counts[role_type] + len(pending) >= spider.min_per_role:
+            if self.stats is not None:
+                self.stats.inc_value('quota/dropped_items')
+            return False
+        pending.add(id(item))
+        return True
+    
+    @timed_stage
+    def process_item(self, item, spider):
+        if not self.admit(item, spider):
+            role_type = item.role_type if type(item) is ProfileRecord else ItemAdapter(item).get('role_type')
+            raise ProfileDropped('quota_met', f"{role_type} quota already met")
+        return item
+
+
 class DeduplicationPipeline:
     """Remove duplicate profiles based on email"""
     
-    def __init__(self):
-        self.seen_emails = set()
+    def __init__(self, store=None):
+        self.seen_emails = store if store is not None else MemorySeenStore()
+        self.closed = False
     
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(store=build_seen_store(crawler.settings))
+    
+    def open_spider(self, spider):
+        # Workers of a distributed crawl share one seen set in the work queue
+        work_queue = getattr(spider, 'work_queue', None)
+        if work_queue is not None:
+            self.seen_emails.close()
+            self.seen_emails = work_queue.seen_store()
+        
+        # On resume, emails already in the output count as seen
+        job = getattr(spider, 'job', None)
+        if job is not None and job.resumed:
+            for email in job.output_emails:
+                self.seen_emails.add(email)
+    
+    def checkpoint(self):
+        flush = getattr(self.seen_emails, 'flush', None)
+        if flush is not None and not self.closed:
+            flush()
+        return {}
+    
+    def close_spider(self, spider):
+        self.seen_emails.close()
+        self.closed = True
+    
+    @timed_stage
     def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        email = adapter.get('email')
+        email = item.email if type(item) is ProfileRecord else ItemAdapter(item).get('email')
         
-        if email in self.seen_emails:
-            raise DropItem(f"Duplicate email found: {email}")
+        if not self.seen_emails.add(email):
+            raise ProfileDropped('duplicate_email', f"Duplicate email found: {email}")
         else:
-            self.seen_emails.add(email)
             return item
 
 
 class CSVExportPipeline:
-    """Export items to CSV"""
+    """Export items to CSV, JSON Lines, Parquet or Arrow in buffered batches
+
+    In a delta crawl (spider.delta is set) only added and changed profiles
+    are written, to the delta file; the snapshot is updated on close. With
+    background=True the batches are written by a BackgroundRowWriter thread,
+    off the reactor; while its queue is full, process_item returns a Deferred
+    so Scrapy holds the item until the batch has room.
+    """
     
-    def __init__(self):
-        self.files = {}
-        self.writers = {}
+    def __init__(self, output_format='csv', batch_size=500, flush_interval=5.0, crawler=None,
+                 background=True, queue_size=8, fsync_interval=5.0):
+        self.output_format = output_format
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.crawler = crawler
+        self.background = background
+        self.queue_size = queue_size
+        self.fsync_interval = fsync_interval
+        self.buffer = []
+        self.rows_written = 0
+        self.output_file = None
+        self.writer = None
+        self.flush_task = None
+        self.delta = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            output_format=settings.get('EXPORT_FORMAT', 'csv'),
+            batch_size=settings.getint('EXPORT_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('EXPORT_FLUSH_INTERVAL', 5.0),
+            crawler=crawler,
+            background=settings.getbool('EXPORT_BACKGROUND_WRITER', True),
+            queue_size=settings.getint('EXPORT_QUEUE_SIZE', 8),
+            fsync_interval=settings.getfloat('EXPORT_FSYNC_INTERVAL', 5.0),
+        )
     
     def open_spider(self, spider):
         output_file = getattr(spider, 'output_file', 'profiles.csv')
-        self.file = open(output_file, 'w', newline='', encoding='utf-8')
-        self.writer = csv.DictWriter(
-            self.file,
-            fieldnames=['name', 'email', 'profile_link', 'role_type']
+        self.output_file = output_file
+        
+        # A resumed job appends to the rows its previous run wrote
+        job = getattr(spider, 'job', None)
+        resume = job is not None and job.resumed
+        self.delta = getattr(spider, 'delta', None)
+        if self.delta is not None:
+            output_file = self.delta.delta_path
+            self.writer = open_row_writer(output_file, self.output_format, fieldnames=DELTA_FIELDNAMES)
+        else:
+            # A distributed worker keeps adding to its shard across restarts
+            append = resume or getattr(spider, 'work_queue', None) is not None
+            self.writer = open_row_writer(output_file, self.output_format, append=append)
+        if self.background:
+            self.writer = BackgroundRowWriter(self.writer, self.queue_size, self.fsync_interval)
+        if resume:
+            self.rows_written = job.output_rows
+        self.last_flush = time.monotonic()
+        self.start_flush_task()
+        
+        logging.info(f"{self.output_format.upper()} export started: {output_file}")
+    
+    def start_flush_task(self):
+        # Only schedule timed flushes when running inside a crawl, where the
+        # reactor is managed by Scrapy
+        if self.crawler is not None and self.flush_interval > 0:
+            from twisted.internet import task
+            self.flush_task = task.LoopingCall(self.flush_if_stale)
+            self.flush_task.start(self.flush_interval, now=False)
+    
+    def close_spider(self, spider):
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+        self.flush()
+        if self.delta is not None:
+            self.delta.finish(self.writer)
+            self.rows_written += self.delta.counters['removed']
+            self._publish_delta_stats()
+        self.writer.close()
+        self._publish_writer_stats()
+        logging.info(f"{self.output_format.upper()} export completed: {self.rows_written} rows")
+    
+    def flush(self):
+        """Hand the buffered rows to the writer
+        
+        Returns None, or a Deferred firing once a full background queue has
+        taken the batch.
+        """
+        queued = None
+        if self.buffer:
+            queued = self.writer.write_batch(self.buffer)
+            self.rows_written += len(self.buffer)
+            self.buffer = []
+            self._publish_writer_stats()
+        self.last_flush = time.monotonic()
+        return queued
+    
+    def checkpoint(self):
+        """Flush buffered rows and report how far the output has been written"""
+        self.flush()
+        drain = getattr(self.writer, 'drain', None)
+        if drain is not None:
+            drain()
+        return {
+            'output_file': self.output_file,
+            'output_offset': os.path.getsize(self.output_file),
+            'rows_written': self.rows_written,
+        }
+    
+    def _publish_delta_stats(self):
+        stats = getattr(self.crawler, 'stats', None)
+        if stats is None:
+            return
+        for name, value in self.delta.counters.items():
+            stats.set_value(f'delta/{name}', value)
+    
+    def _publish_writer_stats(self):
+        stats = getattr(self.crawler, 'stats', None)
+        counters = getattr(self.writer, 'counters', None)
+        if stats is None or counters is None:
+            return
+        stats.set_value('export/queue_depth', self.writer.queue_depth)
+        stats.set_value('export/max_queue_depth', counters['max_queue_depth'])
+        stats.set_value('export/blocked', counters['blocked'])
+        stats.set_value('export/blocked_seconds', round(counters['blocked_seconds'], 3))
+        stats.set_value('export/fsyncs', counters['fsyncs'])
+        stats.set_value('export/batches_written', counters['batches'])
+        if counters['batches']:
+            stats.set_value('export/write_latency_avg_ms', round(counters['write_seconds'] * 1000 / counters['batches'], 3))
+            stats.set_value('export/write_latency_max_ms', round(counters['max_write_seconds'] * 1000, 3))
+    
+    def flush_if_stale(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            return self.flush()
+        return None
+    
+    @timed_stage
+    def process_item(self, item, spider):
+        if type(item) is ProfileRecord:
+            row = item.row()
+        else:
+            adapter = ItemAdapter(item)
+            row = tuple(adapter.get(field) for field in FIELDNAMES)
+        if self.delta is not None:
+            change = self.delta.classify(row)
+            if change is None:
+                return item
+            row = (change,) + row
+        self.buffer.append(row)
+        
+        queued = None
+        if len(self.buffer) >= self.batch_size:
+            queued = self.flush()
+        elif self.flush_interval > 0:
+            queued = self.flush_if_stale()
+        if queued is not None:
+            # The writer is behind: hold the item back instead of the reactor
+            return queued.addCallback(lambda _: item)
+        return item
+
+
+class ItemStreamPipeline(CSVExportPipeline):
+    """Send accepted rows to a parent process instead of writing a file
+    
+    run_scraper.py --parallel-roles crawls each role in its own process and
+    passes the queue its parent reads from as the `item_stream` spider
+    argument. Rows go out in export batches; the parent writes the merged
+    output.
+    """
+    
+    def open_spider(self, spider):
+        stream = getattr(spider, 'item_stream', None)
+        if stream is None:
+            raise ValueError("ItemStreamPipeline needs the item_stream spider argument (run_scraper.py --parallel-roles)")
+        label = ','.join(spider.roles)
+        self.writer = QueueRowWriter(stream, label)
+        self.last_flush = time.monotonic()
+        self.start_flush_task()
+        logging.info(f"Streaming rows of {label} to the parent process")
+
+
+class FusedProfilePipeline:
+    """Validation, brand filter, dedup and export in one process_item call
+    
+    Runs the work of the four separate pipelines as steps, in the order of
+    FUSED_PIPELINE_STEPS, on one adapter per item. The default is the staged
+    order (email, brand, dedup, export), which gives the same drop reasons
+    as the separate pipelines. Putting the cheap checks first (brand, dedup,
+    email, export) is faster: dedup then runs against a cache of raw
+    addresses already in the dedup store, so duplicates skip validation.
+    The dedup step only looks addresses up; an item claims its address in
+    the store once every filter step has passed, right before export, so an
+    item dropped by a later step never makes a later one a duplicate. Items
+    are therefore accepted or dropped as by the separate stages in any step
+    order, but an item that fails several checks is counted under the first
+    failing step, so other orders can report other drop reasons.
+    
+    Built from a crawler, it also drops items of a role whose quota is
+    filled (see RoleQuotaPipeline), after the filter steps and before the
+    address is claimed.
+    
+    Drops are counted per reason instead of being raised from each step.
+    Scrapy only learns of a drop through DropItem, so process_item raises one
+    ProfileDropped with a fixed message at the end.
+    """
+    
+    STEPS = ('email', 'brand', 'dedup', 'export')
+    
+    DROP_MESSAGES = {
+        'missing_email': 'Missing email',
+        'invalid_email': 'Invalid email',
+        'brand_name': 'Brand-like name detected',
+        'duplicate_email': 'Duplicate email found',
+        'quota_met': 'Role quota already met',
+    }
+    
+    def __init__(self, steps=STEPS, validation=None, brand_filter=None, dedup=None, export=None,
+                 quota=None, raw_cache_size=100000, stats=None):
+        steps = tuple(steps)
+        unknown = [step for step in steps if step not in self.STEPS]
+        if unknown or len(set(steps)) != len(steps):
+            raise ValueError(
+                f"Invalid fused pipeline steps {list(steps)}; use each of {', '.join(self.STEPS)} at most once"
+            )
+        if 'export' in steps and steps[-1] != 'export':
+            raise ValueError("The export step must come last")
+        self.steps = steps
+        self.validation = validation or EmailValidationPipeline()
+        self.brand_filter = brand_filter or BrandNameFilterPipeline()
+        self.dedup = dedup or DeduplicationPipeline()
+        self.export = (export or CSVExportPipeline()) if 'export' in steps else None
+        self.quota = quota
+        # Export time already counts towards this stage, so skip its own timing
+        self.export_item = untimed(self.export.process_item) if self.export is not None else None
+        # Deferred of the last exported item while the export queue is full
+        self.export_wait = None
+        # Raw addresses whose normalized form is in the dedup store
+        self.raw_seen = set()
+        self.raw_cache_size = raw_cache_size
+        self.stats = stats
+        self.counters = dict.fromkeys(['accepted', 'raw_dedup_hits'] + list(self.DROP_MESSAGES), 0)
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        export_cls = load_object(settings.get('FUSED_EXPORT_PIPELINE') or CSVExportPipeline)
+        return cls(
+            steps=settings.getlist('FUSED_PIPELINE_STEPS') or cls.STEPS,
+            validation=EmailValidationPipeline.from_crawler(crawler),
+            brand_filter=BrandNameFilterPipeline.from_crawler(crawler),
+            dedup=DeduplicationPipeline.from_crawler(crawler),
+            export=export_cls.from_crawler(crawler),
+            quota=RoleQuotaPipeline.from_crawler(crawler),
+            raw_cache_size=settings.getint('FUSED_RAW_EMAIL_CACHE_SIZE', 100000),
+            stats=crawler.stats,
         )
-        self.writer.writeheader()
-        logging.info(f"CSV export started: {output_file}")
+    
+    def open_spider(self, spider):
+        self.brand_filter.open_spider(spider)
+        self.dedup.open_spider(spider)
+        if self.export is not None:
+            self.export.open_spider(spider)
     
     def close_spider(self, spider):
-        self.file.close()
-        logging.info("CSV export completed")
+        self.validation.close_spider(spider)
+        self.dedup.close_spider(spider)
+        if self.export is not None:
+            self.export.close_spider(spider)
+        if self.stats is not None:
+            for name, value in self.counters.items():
+                self.stats.set_value(f'fused/{name}', value)
+        logging.info(
+            f"Fused pipeline: {self.counters['accepted']} accepted, "
+            + ', '.join(f"{self.counters[reason]} {reason}" for reason in self.DROP_MESSAGES)
+        )
+    
+    def checkpoint(self):
+        state = self.dedup.checkpoint()
+        if self.export is not None:
+            state.update(self.export.checkpoint())
+        return state
     
+    def process(self, item, spider=None):
+        """Run the steps on one item; returns the drop reason, or None if accepted"""
+        adapter = None if type(item) is ProfileRecord else ItemAdapter(item)
+        email = item.email if adapter is None else adapter.get('email')
+        normalized = None
+        store = self.dedup.seen_emails
+        
+        for step in self.steps:
+            if step == 'brand':
+                matcher = self.brand_filter.matcher or self.brand_filter.build_matcher()
+                if matcher.search((item.name if adapter is None else adapter.get('name')) or ''):
+                    return self._drop('brand_name')
+            
+            elif step == 'email':
+                if not email:
+                    return self._drop('missing_email')
+                try:
+                    normalized = self.validation.normalizer.normalize(email)
+                except EmailNotValidError:
+                    return self._drop('invalid_email')
+                if adapter is None:
+                    item.email = normalized
+                else:
+                    adapter['email'] = normalized
+            
+            elif step == 'dedup':
+                # Only look here: an item still dropped by a later step must
+                # not claim its address, just as it never reaches the staged
+                # dedup pipeline
+                if normalized is None and 'email' in self.steps:
+                    # Not validated yet: only a known raw address is a sure duplicate
+                    if email in self.raw_seen:
+                        self.counters['raw_dedup_hits'] += 1
+                        return self._drop('duplicate_email')
+                elif (normalized or email) in store:
+                    return self._drop('duplicate_email')
+        
+        # Every filter passed: take a place in the role's quota, claim the
+        # address, then export
+        if self.quota is not None and not self.quota.admit(item, spider):
+            return self._drop('quota_met')
+        if 'dedup' in self.steps and self._seen(email, normalized or email):
+            return self._drop('duplicate_email')
+        if self.export is not None:
+            exported = self.export_item(item, spider)
+            if exported is not item:
+                self.export_wait = exported
+        self.counters['accepted'] += 1
+        return None
+    
+    @timed_stage
     def process_item(self, item, spider):
-        self.writer.writerow(ItemAdapter(item).asdict())
+        reason = self.process(item, spider)
+        if reason is not None:
+            raise ProfileDropped(reason, self.DROP_MESSAGES[reason])
+        if self.export_wait is not None:
+            exported, self.export_wait = self.export_wait, None
+            return exported
         return item
+    
+    def _seen(self, raw, key):
+        """Add key to the dedup store; True if it was already there"""
+        duplicate = not self.dedup.seen_emails.add(key)
+        if len(self.raw_seen) >= self.raw_cache_size:
+            self.raw_seen.clear()
+        self.raw_seen.add(raw)
+        return duplicate
+    
+    def _drop(self, reason):
+        self.counters[reason] += 1
+        return reason
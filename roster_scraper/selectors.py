@@ -0,0 +1,137 @@
+# Precompiled selectors and a learned selector-order cache for the spider
+#
+# ShouttSpider tries several selectors for cards, names, links and the next
+# page link. Query compiles each CSS or XPath expression into an lxml XPath
+# object once. Most candidate lists are priority lists whose candidates are
+# not equivalent (an h3 is a better name than the first link text), so
+# SelectorStrategy keeps their declared order and only skips candidates
+# that match nothing anywhere on the current page. Scopes where any hit is
+# equally correct may learn their winner, which is then tried first; the
+# learned winners can be saved to disk so later runs start warm.
+
+import json
+import logging
+import os
+
+from lxml import etree
+from parsel import Selector
+from parsel.csstranslator import HTMLTranslator
+
+
+_translator = HTMLTranslator()
+
+
+class Query:
+    """A CSS or XPath expression compiled once into an lxml XPath object"""
+
+    def __init__(self, query, css=True):
+        self.query = query
+        self.key = ('css:' if css else 'xpath:') + query
+        expression = _translator.css_to_xpath(query) if css else query
+        self.compiled = etree.XPath(expression, smart_strings=False)
+
+    def __repr__(self):
+        return f"Query({self.key!r})"
+
+    def evaluate(self, selector):
+        try:
+            return self.compiled(selector.root)
+        except (TypeError, etree.XPathError):
+            return []
+
+    def select(self, selector):
+        """Matching elements, wrapped as parsel Selectors"""
+        return [
+            Selector(root=node, type='html')
+            for node in self.evaluate(selector)
+            if not isinstance(node, str)
+        ]
+
+    def getall(self, selector):
+        """Matching text and attribute values"""
+        return [value for value in self.evaluate(selector) if isinstance(value, str)]
+
+    def get(self, selector):
+        """First matching text or attribute value, or None"""
+        for value in self.evaluate(selector):
+            if isinstance(value, str):
+                return value
+        return None
+
+
+class SelectorStrategy:
+    """Selector candidates per scope (e.g. "UGC/name"), tried in priority order
+
+    first() tries the candidates in declared order. Given the `document` an
+    element belongs to, a candidate that comes back empty is checked once
+    against the whole document; if it matches nothing there it is skipped
+    for every other element of that document. A scope evaluated with
+    learn=True tries its last winner first. A winner is only recorded after
+    a pass in declared order, so every higher-priority candidate was empty.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.preferred = {}
+        self.evaluations = 0
+        self.saved = 0
+        self._document = None
+        self._dead = set()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.preferred = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable selector strategy file {self.path}: {e}")
+            self.preferred = {}
+            return
+        logging.info(f"Loaded {len(self.preferred)} learned selectors from {self.path}")
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.preferred, f, indent=2, sort_keys=True)
+
+    def _dead_on(self, document):
+        """Keys of queries known to match nothing in `document`"""
+        if document.root is not self._document:
+            self._document = document.root
+            self._dead = set()
+        return self._dead
+
+    def first(self, scope, queries, evaluate, document=None, learn=False):
+        """Return the first non-empty evaluate(query) result, or None"""
+        dead = self._dead_on(document) if document is not None else ()
+        if learn:
+            preferred = self.preferred.get(scope)
+            query = next((q for q in queries if q.key == preferred), None)
+            if query is not None and query.key not in dead:
+                self.evaluations += 1
+                result = evaluate(query)
+                if result:
+                    self.saved += queries.index(query)
+                    return result
+        else:
+            # Scopes with a fixed priority never keep a learned winner,
+            # including one saved by an older version
+            self.preferred.pop(scope, None)
+
+        for query in queries:
+            if query.key in dead:
+                self.saved += 1
+                continue
+            self.evaluations += 1
+            result = evaluate(query)
+            if result:
+                if learn:
+                    self.preferred[scope] = query.key
+                return result
+            if document is not None:
+                self.evaluations += 1
+                if not query.evaluate(document):
+                    dead.add(query.key)
+        return None
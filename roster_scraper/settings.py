@@ -21,7 +21,8 @@ USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = False
 
-# Concurrency and throttling settings
+# Concurrency and throttling settings. The per-domain values are starting
+# points; AdaptiveConcurrencyMiddleware adjusts each slot while crawling.
 CONCURRENT_REQUESTS = 8
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
 DOWNLOAD_DELAY = 2
@@ -40,6 +41,78 @@ PLAYWRIGHT_LAUNCH_OPTIONS = {
 
 PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 60000
 
+# Warm browser contexts, one per role, created when the browser starts.
+# Roles not listed here get their context on first use.
+PLAYWRIGHT_CONTEXTS = {
+    "role-UGC": {},
+    "role-Video": {},
+}
+PLAYWRIGHT_MAX_PAGES_PER_CONTEXT = 2
+
+# Reuse pages across requests of the same role instead of opening and closing
+# one per request. Each role also gets its own download slot so roles render
+# in parallel while each stays within CONCURRENT_REQUESTS_PER_DOMAIN.
+PAGE_POOL_ENABLED = True
+PAGE_POOL_SIZE = 2
+PAGE_POOL_RESET = True
+PAGE_POOL_SLOT_PER_ROLE = True
+
+# How listing pages are fetched: "hybrid" tries a plain HTTP download first and
+# renders with Playwright only when no creator cards are found, "playwright"
+# always renders, "http" never does
+FETCH_MODE = "hybrid"
+
+# Learned selector order per role and field, kept between runs (None to disable)
+SELECTOR_STRATEGY_FILE = "selector_strategy.json"
+
+# How more cards are reached: "paginate" follows next-page links, "scroll"
+# keeps one rendered page open and scrolls or clicks "Load more", stopping
+# when the role quota is met or no new cards appear for SCROLL_IDLE_TIMEOUT
+HARVEST_MODE = "paginate"
+SCROLL_IDLE_TIMEOUT = 10.0
+SCROLL_STEP_DELAY = 1.0
+SCROLL_MAX_STEPS = 500
+SCROLL_LOAD_MORE_SELECTOR = 'button:has-text("Load more"), button:has-text("Show more"), a:has-text("Load more")'
+
+# Follow the profile link of cards that show no email and look for it on the
+# profile page: plain HTTP first, rendered if nothing is found (unless
+# FETCH_MODE is "http"). Detail pages are queued below listing pages and use
+# their own download slot (added to DOWNLOAD_SLOTS), at most
+# DETAIL_PAGE_CONCURRENCY at a time, and stop for a role as soon as its
+# quota is met.
+DETAIL_PAGES_ENABLED = False
+DETAIL_PAGE_CONCURRENCY = 2
+DETAIL_PAGE_PRIORITY = -10
+
+# Incremental crawl: compare against the previous run's snapshot (the output
+# file) and DELTA_STATE_FILE, skip listing pages whose content hash has not
+# changed, write only added, changed and removed profiles to DELTA_FILE and
+# update the snapshot on close. Both files default to names next to the
+# output file (profiles.delta.csv, profiles.state.json).
+DELTA_CRAWL_ENABLED = False
+DELTA_FILE = None
+DELTA_STATE_FILE = None
+
+# Distributed crawl (run_scraper.py --workers N): worker processes share the
+# listing and detail-page tasks, seen emails and role counts through the
+# queue at WORK_QUEUE, opened with WORK_QUEUE_BACKEND. Each worker keeps up to
+# WORKER_PREFETCH claimed tasks and polls every WORKER_POLL_INTERVAL seconds
+# while other workers may still add work. A running worker renews its claims
+# every WORKER_HEARTBEAT_INTERVAL seconds; claims not renewed for
+# WORK_QUEUE_LEASE_TIMEOUT go back to the queue (a worker died). Shards are
+# written next to the output, so workers on other hosts need it on shared
+# storage.
+WORK_QUEUE = None
+WORK_QUEUE_BACKEND = "roster_scraper.distributed.SQLiteWorkQueue"
+WORK_QUEUE_LEASE_TIMEOUT = 300
+WORKER_ID = None
+WORKER_PREFETCH = 4
+WORKER_POLL_INTERVAL = 1.0
+WORKER_HEARTBEAT_INTERVAL = 60
+
+# Listing URLs per role, replacing or adding to the spider's built-in ones
+ROLE_URLS = {}
+
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
 
@@ -54,34 +127,145 @@ PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 60000
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "roster_scraper.middlewares.RosterScraperSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "roster_scraper.middlewares.RosterScraperSpiderMiddleware": 543,
+    "roster_scraper.middlewares.WorkQueueSpiderMiddleware": 550,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "roster_scraper.middlewares.RosterScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "roster_scraper.middlewares.RosterScraperDownloaderMiddleware": 543,
+    "roster_scraper.middlewares.RoleQuotaMiddleware": 555,
+    # Moved ahead of the page pool so cache hits never take a browser page
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": 556,
+    "roster_scraper.middlewares.PagePoolMiddleware": 560,
+    "roster_scraper.middlewares.AdaptiveConcurrencyMiddleware": 570,
+}
+
+# Adaptive per-slot concurrency and delay (additive increase, multiplicative
+# decrease). Each healthy response lowers the delay by AIMD_DELAY_STEP and,
+# once per round, raises concurrency by one; 429/5xx responses, timeouts and
+# renders slower than AIMD_TARGET_LATENCY halve concurrency and double the
+# delay. DOWNLOAD_DELAY is the starting delay. Slots are per domain and role,
+# so AIMD_MAX_CONCURRENCY above PAGE_POOL_SIZE only helps plain HTTP fetches.
+AIMD_ENABLED = True
+AIMD_MIN_CONCURRENCY = 1
+AIMD_MAX_CONCURRENCY = 4
+AIMD_START_CONCURRENCY = 1
+AIMD_MIN_DELAY = 0.25
+AIMD_MAX_DELAY = 30.0
+AIMD_DELAY_STEP = 0.25
+AIMD_DECREASE_FACTOR = 0.5
+AIMD_TARGET_LATENCY = 15.0
+AIMD_BACKOFF_HTTP_CODES = [429, 500, 502, 503, 504]
+
+# Once the pipelines have accepted --min-per-role items for a role, drop its
+# queued requests and cancel its in-flight renders. The spider closes as soon
+# as every role's quota is met.
+QUOTA_CANCEL_ENABLED = True
+
+# Block resources Playwright pages don't need; we only read the DOM.
+# Allow patterns win over both the blocked types and the deny patterns.
+PLAYWRIGHT_ABORT_REQUEST = "roster_scraper.middlewares.abort_blocked_resource"
+RESOURCE_BLOCKER_ENABLED = True
+RESOURCE_BLOCKER_TYPES = ["image", "media", "font"]
+RESOURCE_BLOCKER_DENY_PATTERNS = [
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"connect\.facebook\.net",
+    r"hotjar\.com",
+    r"segment\.(?:io|com)",
+    r"clarity\.ms",
+]
+RESOURCE_BLOCKER_ALLOW_PATTERNS = []
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "roster_scraper.extensions.CrawlMetrics": 500,
+    "roster_scraper.extensions.CrawlCheckpoint": 510,
+}
+
+# Per-stage pipeline timing, drop reasons, render and parse times. Published
+# in Scrapy stats (metrics/*) and, every METRICS_INTERVAL seconds, in
+# Prometheus text format to METRICS_TEXTFILE and/or an HTTP endpoint
+METRICS_ENABLED = True
+METRICS_INTERVAL = 15.0
+METRICS_TEXTFILE = None  # e.g. "/var/lib/node_exporter/textfile/roster_scraper.prom"
+METRICS_HTTP_PORT = None  # e.g. 9410, serves http://127.0.0.1:9410/metrics
+METRICS_HTTP_HOST = "127.0.0.1"
+
+# Job directory for crash-safe resume (set by run_scraper.py --resume). The
+# crawl position is checkpointed every CHECKPOINT_INTERVAL seconds and on close;
+# only CSV and JSON Lines output can be resumed
+CHECKPOINT_DIR = None
+CHECKPOINT_INTERVAL = 30.0
+
+# Item class yielded by the spider: the slotted ProfileRecord takes less
+# memory than ProfileItem and has fast paths in the pipelines
+PROFILE_ITEM_CLASS = "roster_scraper.items.ProfileRecord"
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "roster_scraper.pipelines.EmailValidationPipeline": 100,
     "roster_scraper.pipelines.BrandNameFilterPipeline": 200,
+    "roster_scraper.pipelines.RoleQuotaPipeline": 250,
     "roster_scraper.pipelines.DeduplicationPipeline": 300,
     "roster_scraper.pipelines.CSVExportPipeline": 400,
 }
 
+# Fused pipeline: the stages above as steps of one pipeline. Enable it
+# by setting ITEM_PIPELINES = {"roster_scraper.pipelines.FusedProfilePipeline": 400}
+# (run_scraper.py --fused-pipeline). Steps run in this order. The staged order
+# below reports the same drop reasons as the separate pipelines; the faster
+# ["brand", "dedup", "email", "export"] uses the raw-email cache to skip
+# validating duplicates, but counts an item that fails several checks under
+# the first one it hits.
+FUSED_PIPELINE_STEPS = ["email", "brand", "dedup", "export"]
+FUSED_RAW_EMAIL_CACHE_SIZE = 100000
+FUSED_EXPORT_PIPELINE = "roster_scraper.pipelines.CSVExportPipeline"
+
+# Email validation caches: normalized results per address and verdicts per domain
+EMAIL_VALIDATION_CACHE_SIZE = 100000
+EMAIL_VALIDATION_DOMAIN_CACHE_SIZE = 10000
+
+# Deduplication store: "memory" (per run) or "sqlite" (persists across runs).
+# DEDUP_BLOOM_ENABLED puts a Bloom filter in front of the SQLite store, saved
+# next to it as <path>.bloom. It only speeds up stores too large for the page
+# cache; see benchmarks/bench_dedup_store.py.
+DEDUP_STORE = "memory"
+DEDUP_STORE_PATH = "seen_emails.sqlite3"
+DEDUP_STORE_BATCH_SIZE = 10000
+DEDUP_BLOOM_ENABLED = False
+DEDUP_BLOOM_CAPACITY = 1000000
+DEDUP_BLOOM_ERROR_RATE = 0.001
+
+# Export: format ("csv", "jsonl", "parquet" or "arrow"; the last two need
+# pyarrow), rows per batch, and seconds before a partial batch is flushed
+EXPORT_FORMAT = "csv"
+EXPORT_BATCH_SIZE = 500
+EXPORT_FLUSH_INTERVAL = 5.0
+
+# Write export batches on a background thread instead of the reactor thread.
+# Up to EXPORT_QUEUE_SIZE batches wait for it; past that items are held back
+# until the disk catches up, without blocking the reactor. The file is fsynced
+# every EXPORT_FSYNC_INTERVAL seconds while writing (0 = off) and on close.
+EXPORT_BACKGROUND_WRITER = True
+EXPORT_QUEUE_SIZE = 8
+EXPORT_FSYNC_INTERVAL = 5.0
+
+# Brand name filter keywords (defaults to BrandNameFilterPipeline.BRAND_KEYWORDS)
+# and an optional file with one extra keyword per line
+#BRAND_KEYWORDS = ["studio", "media", "agency"]
+#BRAND_KEYWORDS_FILE = "brand_keywords.txt"
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# Off while AIMD_ENABLED is on: both would fight over the download delay
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 AUTOTHROTTLE_START_DELAY = 2
 # The maximum download delay to be set in case of high latencies
@@ -99,11 +283,24 @@ RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# The render cache keeps the final DOM of listing and profile pages keyed by
+# canonical URL, role and renderer. HTTPCACHE_EXPIRATION_SECS is the default
+# TTL (0 = never expires) and RENDER_CACHE_TTL overrides it per URL glob,
+# first match wins. Least recently used entries are evicted once the cache
+# passes RENDER_CACHE_MAX_BYTES. RENDER_CACHE_OFFLINE ignores TTLs; together
+# with HTTPCACHE_IGNORE_MISSING it replays a crawl without the network.
+HTTPCACHE_ENABLED = False
+HTTPCACHE_EXPIRATION_SECS = 24 * 3600
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 408, 429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "roster_scraper.httpcache.RenderedPageCacheStorage"
+RENDER_CACHE_TTL = {
+    "*/creators/*": 6 * 3600,
+    "*/profiles/*": 7 * 24 * 3600,
+}
+RENDER_CACHE_COMPRESSION = "gzip"
+RENDER_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RENDER_CACHE_OFFLINE = False
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
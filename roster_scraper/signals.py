@@ -0,0 +1,8 @@
+# Project-specific signals
+#
+# Sent through crawler.signals like Scrapy's own signals; see
+# https://docs.scrapy.org/en/latest/topics/signals.html
+
+# Sent once per role when the pipelines have accepted min_per_role items
+# for it. Arguments: role, spider
+role_quota_met = object()
@@ -0,0 +1,182 @@
+# External sort-merge dedup of roster outputs
+#
+# Combining the outputs of many runs and shards by loading them into one
+# dict needs memory for every row. merge_outputs instead reads the inputs in
+# chunks of chunk_rows rows, sorts each chunk by normalized email and then
+# profile link, and spills it to a temporary run file. The runs are merged
+# with a k-way heap merge, in several passes when there are more runs than
+# fan_in, so memory stays bounded by the chunk size whatever the input size.
+#
+# Rows with the same normalized email (or, without an email, the same
+# profile link) end up next to each other and only the most recent one is
+# kept. Inputs are ranked oldest to newest, by modification time unless
+# they are taken in the order given, and within a file a later row is newer
+# than an earlier one.
+
+import csv
+import heapq
+import logging
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from operator import itemgetter
+
+from roster_scraper.delta import profile_key
+from roster_scraper.exporters import FIELDNAMES, open_row_writer, read_rows
+
+
+# Digits of the zero-padded sequence number, so run files sort as text
+SEQ_WIDTH = 15
+
+OUTPUT_BATCH_SIZE = 1000
+
+_EMAIL = FIELDNAMES.index('email')
+_LINK = FIELDNAMES.index('profile_link')
+
+# Run records are [email key, link key, sequence, *fields]
+_sort_key = itemgetter(0, 1, 2)
+
+
+def input_format(path):
+    return 'jsonl' if path.endswith('.jsonl') else 'csv'
+
+
+def _identity(record):
+    """What makes two records the same profile"""
+    email, link = record[0], record[1]
+    if email:
+        return email
+    if link:
+        return ('', link)
+    # Rows with neither cannot be matched; all of them are kept
+    return ('', '', record[2])
+
+
+def newest_per_profile(records):
+    """Collapse a sorted stream to the most recent record of each profile"""
+    current = None
+    best = None
+    for record in records:
+        identity = _identity(record)
+        if identity != current:
+            if best is not None:
+                yield best
+            current = identity
+            best = record
+        elif record[2] > best[2]:
+            best = record
+    if best is not None:
+        yield best
+
+
+class SortMerge:
+    """One external sort-merge of roster files into a deduplicated output"""
+
+    def __init__(self, chunk_rows=200000, fan_in=64, tmp_dir=None):
+        if chunk_rows < 1 or fan_in < 2:
+            raise ValueError(f"Need chunk_rows >= 1 and fan_in >= 2, got {chunk_rows} and {fan_in}")
+        self.chunk_rows = chunk_rows
+        self.fan_in = fan_in
+        self.tmp_dir = tmp_dir
+        self.directory = None
+        self.run_count = 0
+        self.counters = {'rows_read': 0, 'rows_written': 0, 'duplicates': 0,
+                         'runs': 0, 'merge_passes': 0, 'seconds': 0.0}
+
+    def records(self, paths):
+        """Input rows as run records, numbered oldest to newest"""
+        seq = 0
+        for path in paths:
+            for row in read_rows(path, input_format(path)):
+                values = [row.get(field) or '' for field in FIELDNAMES]
+                yield [profile_key(values[_EMAIL]), values[_LINK].strip(), str(seq).zfill(SEQ_WIDTH)] + values
+                seq += 1
+            logging.info(f"Read {path}: {seq} rows so far")
+
+    def _new_run(self):
+        self.run_count += 1
+        return os.path.join(self.directory, f"run-{self.run_count:06d}.csv")
+
+    def _write_run(self, records):
+        path = self._new_run()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(records)
+        return path
+
+    def spill(self, paths):
+        """Sort the inputs chunk by chunk into run files"""
+        runs = []
+        chunk = []
+        for record in self.records(paths):
+            chunk.append(record)
+            if len(chunk) >= self.chunk_rows:
+                runs.append(self._spill_chunk(chunk))
+                chunk = []
+        if chunk:
+            runs.append(self._spill_chunk(chunk))
+        return runs
+
+    def _spill_chunk(self, chunk):
+        self.counters['rows_read'] += len(chunk)
+        chunk.sort(key=_sort_key)
+        self.counters['runs'] += 1
+        return self._write_run(newest_per_profile(chunk))
+
+    def merged(self, runs, stack):
+        """Sorted, collapsed stream over the given run files"""
+        readers = [csv.reader(stack.enter_context(open(path, newline='', encoding='utf-8'))) for path in runs]
+        return newest_per_profile(heapq.merge(*readers, key=_sort_key))
+
+    def reduce(self, runs):
+        """Merge runs in groups of fan_in until one final merge is left"""
+        while len(runs) > self.fan_in:
+            self.counters['merge_passes'] += 1
+            next_runs = []
+            for i in range(0, len(runs), self.fan_in):
+                group = runs[i:i + self.fan_in]
+                with ExitStack() as stack:
+                    next_runs.append(self._write_run(self.merged(group, stack)))
+                for path in group:
+                    os.remove(path)
+            runs = next_runs
+        return runs
+
+    def run(self, paths, output_file, output_format='csv'):
+        """Merge `paths` (oldest first) into output_file; returns the counters"""
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix='roster-merge-', dir=self.tmp_dir) as directory:
+            self.directory = directory
+            runs = self.reduce(self.spill(paths))
+            self.counters['merge_passes'] += 1
+            writer = open_row_writer(output_file, output_format)
+            try:
+                with ExitStack() as stack:
+                    batch = []
+                    for record in self.merged(runs, stack):
+                        batch.append(tuple(record[3:]))
+                        if len(batch) >= OUTPUT_BATCH_SIZE:
+                            writer.write_batch(batch)
+                            self.counters['rows_written'] += len(batch)
+                            batch = []
+                    if batch:
+                        writer.write_batch(batch)
+                        self.counters['rows_written'] += len(batch)
+            finally:
+                writer.close()
+        self.counters['duplicates'] = self.counters['rows_read'] - self.counters['rows_written']
+        self.counters['seconds'] = time.perf_counter() - start
+        return self.counters
+
+
+def order_inputs(paths, order='mtime'):
+    """Inputs oldest first: by modification time, or as given"""
+    if order == 'mtime':
+        # sorted() is stable, so files with the same mtime keep their order
+        return sorted(paths, key=os.path.getmtime)
+    return list(paths)
+
+
+def merge_outputs(paths, output_file, output_format='csv', order='mtime', **kwargs):
+    """Deduplicate roster files into one output with an external sort-merge"""
+    return SortMerge(**kwargs).run(order_inputs(paths, order), output_file, output_format)
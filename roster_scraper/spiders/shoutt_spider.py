@@ -1,24 +1,158 @@
 import scrapy
+import asyncio
 import logging
 import re
+import os
+import time
+from urllib.parse import urlsplit
+from parsel import Selector
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.defer import deferred_from_coro
+from scrapy.utils.misc import load_object
 from scrapy_playwright.page import PageMethod
-from roster_scraper.items import ProfileItem
+from roster_scraper.browser import role_context_name
+from roster_scraper.checkpoint import JobCheckpoint
+from roster_scraper.delta import DeltaCrawl, page_fingerprint
+from roster_scraper.distributed import open_work_queue, request_task
+from roster_scraper.extractors import EmailExtractor, find_emails
+from roster_scraper.items import PROFILE_ITEM_TYPES, ProfileItem
+from roster_scraper.selectors import Query, SelectorStrategy
+from roster_scraper.signals import role_quota_met
+
+
+FETCH_MODES = ('hybrid', 'playwright', 'http')
+HARVEST_MODES = ('paginate', 'scroll')
+
+# Profile detail pages get their own download slot and browser context, so
+# their concurrency budget and pages never compete with listing pages
+DETAIL_SLOT = 'profile-details'
+DETAIL_CONTEXT = 'profile-details'
+DETAIL_TEXT_XPATH = '//body//text()[not(ancestor::script) and not(ancestor::style)]'
+
+CARD_CSS = '.creator-card, .profile-card, .user-card, article, .member'
+CARD_XPATH = '//div[contains(@class, "profile") or contains(@class, "creator") or contains(@class, "user")]'
+
+# Candidate selectors per field, in priority order. Only the next-page
+# candidates are interchangeable, so only their winner is learned
+CARD_QUERIES = [
+    Query(CARD_CSS),
+    Query(CARD_XPATH, css=False),
+]
+LINK_QUERIES = [
+    Query('a::attr(href)'),
+    Query('.//a/@href', css=False),
+]
+NAME_QUERIES = [
+    Query('.name::text, .creator-name::text, h2::text, h3::text'),
+    Query('.//h2/text() | .//h3/text() | .//*[contains(@class, "name")]/text()', css=False),
+    Query('a::text'),
+]
+MAILTO_QUERY = Query('[href^="mailto:"]::attr(href)')
+NEXT_PAGE_QUERIES = [
+    Query('.next::attr(href)'),
+    Query('.pagination-next::attr(href)'),
+    Query('a[rel="next"]::attr(href)'),
+    Query('.page-link.next::attr(href)'),
+    Query('button.next::attr(data-href)'),
+    Query('//a[contains(text(), "Next") or contains(text(), "next")]/@href', css=False),
+]
+
+# Returns the outer HTML of cards not seen by an earlier call and marks them,
+# so each scroll step only ships newly added cards out of the browser
+NEW_CARDS_JS = """
+([css, xpath]) => {
+    let cards = Array.from(document.querySelectorAll(css));
+    if (!cards.length) {
+        const found = document.evaluate(
+            xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < found.snapshotLength; i++) {
+            cards.push(found.snapshotItem(i));
+        }
+    }
+    const fresh = [];
+    for (const card of cards) {
+        if (card.hasAttribute('data-roster-seen')) {
+            continue;
+        }
+        card.setAttribute('data-roster-seen', '1');
+        fresh.push(card.outerHTML);
+    }
+    return fresh;
+}
+"""
+
+
+def url_pattern(url):
+    """Reduce a URL to a pattern shared by its sibling pages
+
+    The query string is dropped and digits in the path are collapsed, so
+    /creators/ugc and /creators/ugc?page=2 share one pattern, as do
+    /creators/ugc/page/2 and /creators/ugc/page/3.
+    """
+    parts = urlsplit(url)
+    path = re.sub(r'\d+', '{n}', parts.path.rstrip('/'))
+    return f"{parts.netloc}{path}"
 
 
 class ShouttSpider(scrapy.Spider):
     name = 'shoutt'
     
-    # Command-line configurable parameters
-    custom_settings = {
-        'CLOSESPIDER_ITEMCOUNT': 200,  # Stop after collecting enough items (can be overridden)
-    }
-    
-    def __init__(self, roles='UGC,Video', min_per_role=50, output_file='profiles.csv', *args, **kwargs):
+    def __init__(self, roles='UGC,Video', min_per_role=50, output_file='profiles.csv', fetch_mode=None, harvest_mode=None, *args, **kwargs):
         super(ShouttSpider, self).__init__(*args, **kwargs)
         self.roles = [role.strip() for role in roles.split(',')]
         self.min_per_role = int(min_per_role)
         self.output_file = output_file
+        # Items accepted by the pipelines per role, fed back via item_scraped
         self.role_counts = {role: 0 for role in self.roles}
+        self.satisfied_roles = set()
+        
+        # How listing pages are fetched: 'hybrid' tries plain HTTP first and
+        # only renders with Playwright when no cards are found
+        self.fetch_mode = fetch_mode or 'hybrid'
+        self.fetch_strategy = {}
+        
+        # How more cards are reached: 'paginate' follows next-page links,
+        # 'scroll' keeps one page open and scrolls or clicks "Load more"
+        self.harvest_mode = harvest_mode or 'paginate'
+        self.scroll_idle_timeout = 10.0
+        self.scroll_step_delay = 1.0
+        self.scroll_max_steps = 500
+        self.load_more_selector = None
+        
+        # Which selector wins per role and field, optionally kept on disk
+        self.selector_strategy = SelectorStrategy()
+        self.email_extractor = EmailExtractor()
+        
+        # Listing pages requested but not yet parsed, and pages already
+        # parsed; checkpointed to the job directory when there is one
+        self.job = None
+        self.pending = {}
+        self.completed = set()
+        self.started_roles = set()
+        
+        # Previous run's page hashes and snapshot in an incremental crawl
+        self.delta = None
+        
+        # Shared task queue when this spider is one worker of several;
+        # claimed_tasks are the queue tasks this worker is crawling
+        self.work_queue = None
+        self.worker_id = None
+        self.worker_prefetch = 4
+        self.worker_poll_interval = 1.0
+        self.worker_heartbeat_interval = 60.0
+        self.heartbeat_task = None
+        self.claimed_tasks = set()
+        
+        # Optional second stage: follow profile links of cards without an
+        # email, at lower priority and with a separate concurrency budget
+        self.detail_pages = False
+        self.detail_concurrency = 2
+        self.detail_priority = -10
+        
+        # Class of the items yielded; crawls use the compact ProfileRecord
+        # (PROFILE_ITEM_CLASS)
+        self.item_class = ProfileItem
         
         # Base URLs for different roles
         self.role_urls = {
@@ -30,24 +164,458 @@ class ShouttSpider(scrapy.Spider):
         logging.info(f"Minimum profiles per role: {self.min_per_role}")
         logging.info(f"Output file: {self.output_file}")
     
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if settings.getbool('DETAIL_PAGES_ENABLED', False):
+            # The downloader sizes the detail slot from DOWNLOAD_SLOTS, so the
+            # budget holds without AIMD, which uses it as the slot's ceiling
+            slots = settings.getdict('DOWNLOAD_SLOTS')
+            slots[DETAIL_SLOT] = {
+                'concurrency': settings.getint('DETAIL_PAGE_CONCURRENCY', 2),
+                **slots.get(DETAIL_SLOT, {}),
+            }
+            settings.set('DOWNLOAD_SLOTS', slots, priority=settings.getpriority('DOWNLOAD_SLOTS') or 'spider')
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        if not kwargs.get('fetch_mode'):
+            spider.fetch_mode = settings.get('FETCH_MODE', 'hybrid')
+        if spider.fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown fetch mode: {spider.fetch_mode} (choose from {', '.join(FETCH_MODES)})")
+        if not kwargs.get('harvest_mode'):
+            spider.harvest_mode = settings.get('HARVEST_MODE', 'paginate')
+        if spider.harvest_mode not in HARVEST_MODES:
+            raise ValueError(f"Unknown harvest mode: {spider.harvest_mode} (choose from {', '.join(HARVEST_MODES)})")
+        spider.scroll_idle_timeout = settings.getfloat('SCROLL_IDLE_TIMEOUT', 10.0)
+        spider.scroll_step_delay = settings.getfloat('SCROLL_STEP_DELAY', 1.0)
+        spider.scroll_max_steps = settings.getint('SCROLL_MAX_STEPS', 500)
+        spider.load_more_selector = settings.get('SCROLL_LOAD_MORE_SELECTOR')
+        spider.selector_strategy = SelectorStrategy(settings.get('SELECTOR_STRATEGY_FILE'))
+        spider.selector_strategy.load()
+        spider.detail_pages = settings.getbool('DETAIL_PAGES_ENABLED', False)
+        spider.detail_concurrency = settings.getint('DETAIL_PAGE_CONCURRENCY', 2)
+        spider.detail_priority = settings.getint('DETAIL_PAGE_PRIORITY', -10)
+        spider.role_urls.update(settings.getdict('ROLE_URLS'))
+        spider.item_class = load_object(settings.get('PROFILE_ITEM_CLASS') or ProfileItem)
+        
+        job_dir = settings.get('CHECKPOINT_DIR')
+        if job_dir:
+            spider.job = JobCheckpoint(job_dir)
+            if spider.job.resumed:
+                spider.restore_checkpoint(spider.job.state)
+                spider.job.recover_output(spider.output_file, settings.get('EXPORT_FORMAT', 'csv'))
+                # Rows in the output are exactly the items accepted so far
+                for role in spider.roles:
+                    spider.role_counts[role] = spider.job.output_role_counts.get(role, 0)
+                spider.satisfied_roles = {
+                    role for role in spider.roles if spider.role_counts.get(role, 0) >= spider.min_per_role
+                }
+        
+        if settings.getbool('DELTA_CRAWL_ENABLED', False):
+            if job_dir:
+                raise ValueError("Incremental crawls rewrite their snapshot on close and cannot be resumed")
+            if settings.get('DEDUP_STORE', 'memory') != 'memory':
+                # A store kept across runs would drop every known profile
+                raise ValueError("Incremental crawls need DEDUP_STORE = 'memory'")
+            spider.delta = DeltaCrawl(
+                spider.output_file,
+                settings.get('EXPORT_FORMAT', 'csv'),
+                delta_path=settings.get('DELTA_FILE'),
+                state_path=settings.get('DELTA_STATE_FILE'),
+            ).load()
+        
+        if settings.get('WORK_QUEUE'):
+            if job_dir or spider.delta is not None:
+                raise ValueError("Distributed crawls keep their state in the work queue; drop --resume and --incremental")
+            if spider.harvest_mode != 'paginate':
+                raise ValueError("Distributed crawls need harvest mode 'paginate'")
+            spider.work_queue = open_work_queue(settings)
+            spider.worker_id = settings.get('WORKER_ID') or f"{os.uname().nodename}-{os.getpid()}"
+            spider.worker_prefetch = settings.getint('WORKER_PREFETCH', 4)
+            spider.worker_poll_interval = settings.getfloat('WORKER_POLL_INTERVAL', 1.0)
+            spider.worker_heartbeat_interval = settings.getfloat(
+                'WORKER_HEARTBEAT_INTERVAL', settings.getfloat('WORK_QUEUE_LEASE_TIMEOUT', 300.0) / 5
+            )
+        
+        crawler.signals.connect(spider.item_accepted, signal=signals.item_scraped)
+        return spider
+    
+    def role_satisfied(self, role_type):
+        return role_type in self.satisfied_roles
+    
+    def item_accepted(self, item, response=None, spider=None):
+        """item_scraped handler: count an item that passed every pipeline"""
+        self.count_accepted(item.get('role_type'))
+    
+    def count_accepted(self, role_type, count=1):
+        if role_type not in self.role_counts:
+            return
+        if self.work_queue is not None:
+            # Quotas are global: the queue counts accepted items of every worker
+            self.role_counts[role_type] = self.work_queue.add_accepted(role_type, count)
+        else:
+            self.role_counts[role_type] += count
+        if self.role_counts[role_type] >= self.min_per_role:
+            self.quota_met(role_type)
+    
+    def quota_met(self, role_type):
+        if role_type in self.satisfied_roles:
+            return
+        self.satisfied_roles.add(role_type)
+        if self.work_queue is not None:
+            self.work_queue.cancel_role(role_type)
+        logging.info(f"{role_type} quota of {self.min_per_role} met")
+        crawler = getattr(self, 'crawler', None)
+        if crawler is None:
+            return
+        crawler.signals.send_catch_log(role_quota_met, role=role_type, spider=self)
+        
+        remaining = [role for role in self.roles if role in self.role_urls and role not in self.satisfied_roles]
+        if not remaining:
+            logging.info("Every role quota is met, closing the spider")
+            engine = crawler.engine
+            if hasattr(engine, 'close_spider_async'):
+                deferred_from_coro(engine.close_spider_async(reason='quota_met'))
+            else:
+                engine.close_spider(self, 'quota_met')
+    
+    def checkpoint_state(self):
+        """Crawl position to save in the job directory"""
+        return {
+            'roles': self.roles,
+            'output_file': self.output_file,
+            'role_counts': self.role_counts,
+            'started_roles': sorted(self.started_roles),
+            'pending': self.pending,
+            'completed': sorted(self.completed),
+            'fetch_strategy': self.fetch_strategy,
+        }
+    
+    def restore_checkpoint(self, state):
+        output_file = state.get('output_file')
+        if output_file and output_file != self.output_file:
+            raise ValueError(
+                f"This job writes to {output_file}; resume it with the same output file, not {self.output_file}"
+            )
+        for role, count in state.get('role_counts', {}).items():
+            self.role_counts[role] = max(count, self.role_counts.get(role, 0))
+        self.started_roles = set(state.get('started_roles', ()))
+        self.pending = dict(state.get('pending', {}))
+        self.completed = set(state.get('completed', ()))
+        self.fetch_strategy.update(state.get('fetch_strategy', {}))
+        logging.info(
+            f"Restored checkpoint: {len(self.pending)} pending pages, "
+            f"{len(self.completed)} completed, counts {self.role_counts}"
+        )
+    
+    def page_done(self, response):
+        url = response.request.url if response.request is not None else response.url
+        self.pending.pop(url, None)
+        self.completed.add(url)
+    
+    def inc_stat(self, key, count=1):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None and crawler.stats is not None:
+            crawler.stats.inc_value(key, count)
+    
+    def should_render(self, url):
+        """Decide whether a listing URL goes straight to Playwright"""
+        if self.fetch_mode == 'playwright':
+            return True
+        if self.fetch_mode == 'http':
+            return False
+        return self.fetch_strategy.get(url_pattern(url)) == 'playwright'
+    
+    def listing_request(self, url, role_type, page_num, render=None):
+        if render is None:
+            render = self.should_render(url)
+        self.pending[url] = {'role_type': role_type, 'page_num': page_num}
+        
+        meta = {
+            'role_type': role_type,
+            'page_num': page_num,
+        }
+        if render:
+            meta['playwright'] = True
+            meta['playwright_page_methods'] = [
+                PageMethod('wait_for_selector', 'body', timeout=30000),
+            ]
+        
+        return scrapy.Request(
+            url=url,
+            callback=self.parse,
+            meta=meta,
+            dont_filter=True,
+        )
+    
+    def detail_request(self, url, role_type, name, render=None):
+        """Request a profile page to find the email its card did not show"""
+        if render is None:
+            render = self.fetch_mode == 'playwright'
+        self.pending[url] = {'role_type': role_type, 'page_num': None, 'detail_name': name}
+        
+        meta = {
+            'role_type': role_type,
+            'detail_name': name,
+            'download_slot': DETAIL_SLOT,
+            'slot_concurrency': self.detail_concurrency,
+        }
+        if render:
+            meta['playwright'] = True
+            meta['playwright_context'] = DETAIL_CONTEXT
+            meta['playwright_page_methods'] = [
+                PageMethod('wait_for_selector', 'body', timeout=30000),
+            ]
+        
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_detail,
+            meta=meta,
+            priority=self.detail_priority,
+            dont_filter=True,
+        )
+    
+    def scroll_request(self, url, role_type):
+        # The spider keeps this page for the whole harvest, so it bypasses
+        # the page pool and is closed by parse_scroll itself
+        self.pending[url] = {'role_type': role_type, 'page_num': 1}
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_scroll,
+            errback=self.close_page_on_error,
+            meta={
+                'playwright': True,
+                'playwright_include_page': True,
+                'playwright_context': role_context_name(role_type),
+                'playwright_page_methods': [
+                    PageMethod('wait_for_selector', 'body', timeout=30000),
+                ],
+                'page_pool': False,
+                # parse_scroll drives the live page, a cached copy is useless
+                'dont_cache': True,
+                'role_type': role_type,
+                'page_num': 1,
+            },
+            dont_filter=True,
+        )
+    
+    async def start(self):
+        # Scrapy 2.13+ reads start requests from start(); older versions
+        # call start_requests() directly
+        if self.work_queue is None:
+            for request in self.start_requests():
+                yield request
+            return
+        async for request in self.queue_requests():
+            yield request
+    
+    async def queue_requests(self):
+        """Crawl tasks claimed from the shared queue until it runs dry
+
+        The first requests of every role are queued by whichever worker
+        starts first; the queue ignores tasks it already has.
+        """
+        queue = self.work_queue
+        queue.register_worker(self.worker_id)
+        if self.worker_heartbeat_interval > 0:
+            from twisted.internet import task
+            self.heartbeat_task = task.LoopingCall(queue.heartbeat, self.worker_id)
+            self.heartbeat_task.start(self.worker_heartbeat_interval, now=False)
+        for request in self.start_requests():
+            queue.push(request_task(request))
+        
+        while True:
+            self.sync_quotas()
+            if all(self.role_satisfied(role) for role in self.roles if role in self.role_urls):
+                break
+            tasks = queue.claim(self.worker_id, self.worker_prefetch - len(self.claimed_tasks))
+            for task_id, task in tasks:
+                if self.role_satisfied(task['role_type']):
+                    queue.complete(task_id)
+                    continue
+                self.claimed_tasks.add(task_id)
+                yield self.task_request(task_id, task)
+            if not tasks:
+                if not self.claimed_tasks and queue.unfinished() == 0:
+                    break
+                await asyncio.sleep(self.worker_poll_interval)
+        logging.info(f"Worker {self.worker_id} found no more work")
+    
+    def sync_quotas(self):
+        """Pick up items accepted by other workers"""
+        for role, count in self.work_queue.role_counts().items():
+            if role in self.role_counts and count > self.role_counts[role]:
+                self.role_counts[role] = count
+                if count >= self.min_per_role and role not in self.satisfied_roles:
+                    logging.info(f"{role} quota met by the other workers")
+                    self.quota_met(role)
+    
+    def task_request(self, task_id, task):
+        if task.get('detail_name') is not None:
+            request = self.detail_request(task['url'], task['role_type'], task['detail_name'], render=task['render'])
+        else:
+            request = self.listing_request(task['url'], task['role_type'], task['page_num'], render=task['render'])
+        request.meta['work_task_id'] = task_id
+        request.errback = self.task_failed
+        return request
+    
+    def task_done(self, task_id, failed=False):
+        if failed:
+            self.work_queue.fail(task_id)
+        else:
+            self.work_queue.complete(task_id)
+        self.claimed_tasks.discard(task_id)
+    
+    def task_failed(self, failure):
+        request = failure.request
+        task_id = request.meta.get('work_task_id')
+        if task_id is None:
+            return
+        if failure.check(IgnoreRequest) and (
+            request.meta.get('quota_cancelled') or self.role_satisfied(request.meta.get('role_type'))
+        ):
+            # Stopped by RoleQuotaMiddleware because the role's quota is met
+            self.work_queue.cancel(task_id)
+            self.claimed_tasks.discard(task_id)
+            return
+        logging.error(f"Task {task_id} failed: {request.url}: {failure.value}")
+        self.task_done(task_id, failed=True)
+    
     def start_requests(self):
         for role in self.roles:
-            if role in self.role_urls:
-                yield scrapy.Request(
-                    url=self.role_urls[role],
-                    callback=self.parse,
-                    meta={
-                        'playwright': True,
-                        'playwright_page_methods': [
-                            PageMethod('wait_for_selector', 'body', timeout=30000),
-                        ],
-                        'role_type': role,
-                        'page_num': 1,
-                    },
-                    dont_filter=True,
-                )
-            else:
+            if role not in self.role_urls:
                 logging.warning(f"Unknown role: {role}")
+                continue
+            if self.role_satisfied(role):
+                logging.info(f"{role} already has {self.role_counts[role]} profiles")
+                continue
+            if role in self.started_roles:
+                # Resumed: only pages left pending by the previous run
+                yield from self.resume_requests(role)
+                continue
+            self.started_roles.add(role)
+            if self.harvest_mode == 'scroll':
+                yield self.scroll_request(self.role_urls[role], role)
+            else:
+                yield self.listing_request(self.role_urls[role], role, 1)
+    
+    def resume_requests(self, role):
+        pages = [
+            (url, info) for url, info in self.pending.items()
+            if info['role_type'] == role and url not in self.completed
+        ]
+        logging.info(f"Resuming {role} with {len(pages)} pending pages")
+        for url, info in pages:
+            if info.get('detail_name') is not None:
+                yield self.detail_request(url, role, info['detail_name'])
+            elif self.harvest_mode == 'scroll':
+                # A scroll position cannot be restored; harvest from the top
+                # and let deduplication skip the cards already exported
+                yield self.scroll_request(url, role)
+            else:
+                yield self.listing_request(url, role, info['page_num'])
+    
+    def extract_profile(self, card, response, role_type=None, page_emails=None):
+        """Pull (name, email, profile_link) out of one creator card
+
+        page_emails maps card elements to the first email in their text; it
+        is built once per page so the text is only scanned once.
+        """
+        strategy = self.selector_strategy
+        
+        # Extract profile link
+        document = Selector(root=card.root.getroottree().getroot(), type='html')
+        profile_link = strategy.first(f'{role_type}/link', LINK_QUERIES, lambda q: q.get(card), document)
+        
+        if profile_link and not profile_link.startswith('http'):
+            profile_link = response.urljoin(profile_link)
+        
+        # Extract name - try multiple selectors
+        name = strategy.first(f'{role_type}/name', NAME_QUERIES, lambda q: q.get(card), document)
+        
+        # Extract email - look for email patterns
+        email = None
+        mailto = MAILTO_QUERY.get(card)
+        if mailto:
+            email = mailto.replace('mailto:', '').strip()
+        
+        if not email:
+            # Try to find email in text content
+            if page_emails is None:
+                page_emails = self.email_extractor.for_page(card.root, [card.root])
+            email = page_emails.get(card.root)
+        
+        return name, email, profile_link
+    
+    def card_item(self, card, response, role_type, page_emails=None):
+        """Build a profile item from a card if it is complete and the role needs more
+
+        With detail pages enabled, a card that has a name and profile link
+        but no email yields a request for the profile page instead.
+        """
+        name, email, profile_link = self.extract_profile(card, response, role_type, page_emails)
+        
+        # Skip roles whose quota is met. Items are counted once the pipelines
+        # accept them, and Scrapy reads this whole callback before any item
+        # reaches them, so this only stops a role between pages, not within
+        # one; RoleQuotaPipeline drops the rest of the page
+        if not name or not profile_link or self.role_satisfied(role_type):
+            return None
+        if email:
+            return self.profile_item(name, email, profile_link, role_type)
+        if self.detail_pages and profile_link not in self.pending and profile_link not in self.completed:
+            self.inc_stat('details/requested')
+            return self.detail_request(profile_link, role_type, name.strip())
+        return None
+    
+    def profile_item(self, name, email, profile_link, role_type):
+        return self.item_class(
+            name=name.strip(),
+            email=email.strip().lower(),
+            profile_link=profile_link,
+            role_type=role_type
+        )
+    
+    def detail_email(self, response):
+        """First address on a profile page that is not the site's own"""
+        candidates = [
+            mailto.replace('mailto:', '').strip() for mailto in MAILTO_QUERY.getall(response.selector)
+        ]
+        candidates += find_emails(' '.join(response.xpath(DETAIL_TEXT_XPATH).getall()))
+        # Footers and contact blocks carry the platform's own addresses
+        site = urlsplit(response.url).hostname or ''
+        site = site[4:] if site.startswith('www.') else site
+        for email in candidates:
+            if email and not email.lower().endswith('@' + site):
+                return email
+        return None
+    
+    def parse_detail(self, response):
+        role_type = response.meta.get('role_type')
+        name = response.meta.get('detail_name')
+        profile_link = response.request.url if response.request is not None else response.url
+        
+        if self.role_satisfied(role_type):
+            self.page_done(response)
+            return
+        
+        email = self.detail_email(response)
+        if not email and not response.meta.get('playwright') and self.fetch_mode != 'http':
+            # The plain HTML may not carry the contact details; render it
+            self.inc_stat('details/render_fallbacks')
+            yield self.detail_request(profile_link, role_type, name, render=True)
+            return
+        
+        self.page_done(response)
+        if email:
+            self.inc_stat('details/emails_found')
+            yield self.profile_item(name, email, profile_link, role_type)
+        else:
+            self.inc_stat('details/no_email')
+            logging.debug(f"No email on profile page {profile_link}")
     
     def parse(self, response):
         role_type = response.meta.get('role_type')
@@ -55,102 +623,167 @@ class ShouttSpider(scrapy.Spider):
         
         logging.info(f"Parsing {role_type} page {page_num}: {response.url}")
         
+        fingerprint = None
+        if self.delta is not None:
+            fingerprint = page_fingerprint(response.body)
+            previous = self.delta.unchanged_page(response.url, fingerprint)
+            if previous is not None:
+                yield from self.replay_page(response, previous)
+                return
+        
         # Extract profile cards - adjust selectors based on actual Shoutt structure
         # These are generic selectors that should work with most creator platforms
-        profile_cards = response.css('.creator-card, .profile-card, .user-card, article, .member')
+        # The broad XPath is only a fallback: it also matches nested divs
+        profile_cards = self.selector_strategy.first(
+            f'{role_type}/card', CARD_QUERIES, lambda q: q.select(response.selector)
+        ) or []
         
-        if not profile_cards:
-            # Try alternative selectors
-            profile_cards = response.xpath('//div[contains(@class, "profile") or contains(@class, "creator") or contains(@class, "user")]')
+        rendered = response.meta.get('playwright', False)
+        pattern = url_pattern(response.url)
         
+        if not rendered and self.fetch_mode == 'hybrid':
+            if not profile_cards:
+                # The server-rendered HTML has no cards; render it instead
+                logging.info(f"No cards in plain HTML for {response.url}, re-requesting with Playwright")
+                self.inc_stat('hybrid/render_fallbacks')
+                yield self.listing_request(response.url, role_type, page_num, render=True)
+                return
+            self.fetch_strategy[pattern] = 'http'
+            self.inc_stat('hybrid/renders_avoided')
+        elif rendered and self.fetch_mode == 'hybrid' and profile_cards:
+            self.fetch_strategy[pattern] = 'playwright'
+        
+        page_emails = self.email_extractor.for_page(
+            response.selector.root, [card.root for card in profile_cards]
+        )
+        emails = []
         for card in profile_cards:
-            # Extract profile link
-            profile_link = card.css('a::attr(href)').get()
-            if not profile_link:
-                profile_link = card.xpath('.//a/@href').get()
-            
-            if profile_link and not profile_link.startswith('http'):
-                profile_link = response.urljoin(profile_link)
-            
-            # Extract name - try multiple selectors
-            name = (
-                card.css('.name::text, .creator-name::text, h2::text, h3::text').get() or
-                card.xpath('.//h2/text() | .//h3/text() | .//*[contains(@class, "name")]/text()').get() or
-                card.css('a::text').get()
-            )
-            
-            # Extract email - look for email patterns
-            email = None
-            email_elements = card.css('[href^="mailto:"]::attr(href)').getall()
-            for elem in email_elements:
-                email = elem.replace('mailto:', '').strip()
-                break
-            
-            if not email:
-                # Try to find email in text content
-                text_content = ' '.join(card.css('::text').getall())
-                email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-                emails_found = re.findall(email_pattern, text_content)
-                if emails_found:
-                    email = emails_found[0]
-            
-            if name and email and profile_link:
-                # Check if we need more profiles of this role
-                if self.role_counts.get(role_type, 0) < self.min_per_role:
-                    self.role_counts[role_type] = self.role_counts.get(role_type, 0) + 1
-                    
-                    yield ProfileItem(
-                        name=name.strip(),
-                        email=email.strip().lower(),
-                        profile_link=profile_link,
-                        role_type=role_type
-                    )
+            item = self.card_item(card, response, role_type, page_emails)
+            if item is not None:
+                if isinstance(item, PROFILE_ITEM_TYPES):
+                    emails.append(item['email'])
+                yield item
         
         # Check if we need more profiles for this role
         current_count = self.role_counts.get(role_type, 0)
-        if current_count < self.min_per_role:
+        next_page = None
+        if not self.role_satisfied(role_type) or self.delta is not None:
             # Look for pagination - next page button
-            next_page = None
-            
-            # Try common pagination selectors
-            next_selectors = [
-                '.next::attr(href)',
-                '.pagination-next::attr(href)',
-                'a[rel="next"]::attr(href)',
-                '.page-link.next::attr(href)',
-                'button.next::attr(data-href)',
-            ]
-            
-            for selector in next_selectors:
-                next_page = response.css(selector).get()
-                if next_page:
-                    break
-            
-            if not next_page:
-                # Try xpath
-                next_page = response.xpath('//a[contains(text(), "Next") or contains(text(), "next")]/@href').get()
-            
+            next_page = self.selector_strategy.first(
+                f'{role_type}/next_page', NEXT_PAGE_QUERIES, lambda q: q.get(response.selector), learn=True
+            )
             if next_page:
                 next_page = response.urljoin(next_page)
+        if self.delta is not None:
+            self.delta.record_page(response.url, role_type, fingerprint, next_page, emails)
+        
+        if not self.role_satisfied(role_type):
+            if next_page:
                 logging.info(f"Following pagination to: {next_page}")
                 
-                yield scrapy.Request(
-                    url=next_page,
-                    callback=self.parse,
-                    meta={
-                        'playwright': True,
-                        'playwright_page_methods': [
-                            PageMethod('wait_for_selector', 'body', timeout=30000),
-                        ],
-                        'role_type': role_type,
-                        'page_num': page_num + 1,
-                    },
-                    dont_filter=True,
-                )
+                yield self.listing_request(next_page, role_type, page_num + 1)
             else:
                 logging.info(f"No more pagination found for {role_type}. Collected {current_count} profiles.")
+        
+        self.page_done(response)
+    
+    def replay_page(self, response, previous):
+        """Carry forward an unchanged listing page without parsing it"""
+        role_type = response.meta.get('role_type')
+        page_num = response.meta.get('page_num', 1)
+        # Only profiles that made it into the snapshot count towards the quota
+        carried = [key for key in previous['profiles'] if key in self.delta.previous_profiles]
+        logging.info(f"{response.url} is unchanged, carrying forward {len(carried)} profiles")
+        self.inc_stat('delta/pages_skipped')
+        self.count_accepted(role_type, len(carried))
+        if previous.get('next_page') and not self.role_satisfied(role_type):
+            yield self.listing_request(previous['next_page'], role_type, page_num + 1)
+        self.page_done(response)
+    
+    async def parse_scroll(self, response):
+        """Harvest cards from one open page by scrolling or clicking "Load more"
+
+        Only cards added since the previous step are pulled out of the page,
+        and items are yielded as soon as they appear. Stops once the role's
+        quota is met or no new cards show up within scroll_idle_timeout.
+        """
+        page = response.meta['playwright_page']
+        role_type = response.meta.get('role_type')
+        logging.info(f"Scroll-harvesting {role_type}: {response.url}")
+        
+        steps = 0
+        last_new_card = time.monotonic()
+        try:
+            while True:
+                fragments = await page.evaluate(NEW_CARDS_JS, [CARD_CSS, CARD_XPATH])
+                
+                if fragments:
+                    last_new_card = time.monotonic()
+                    self.inc_stat('scroll/cards_harvested', len(fragments))
+                    for fragment in fragments:
+                        for card in Selector(text=fragment).xpath('//body/*[1]'):
+                            item = self.card_item(card, response, role_type)
+                            if item is not None:
+                                yield item
+                elif time.monotonic() - last_new_card >= self.scroll_idle_timeout:
+                    logging.info(f"No new {role_type} cards for {self.scroll_idle_timeout}s, stopping")
+                    break
+                
+                if self.role_satisfied(role_type):
+                    break
+                if steps >= self.scroll_max_steps:
+                    logging.info(f"Reached {self.scroll_max_steps} scroll steps for {role_type}, stopping")
+                    break
+                
+                await self.scroll_step(page)
+                steps += 1
+                await page.wait_for_timeout(self.scroll_step_delay * 1000)
+        finally:
+            await page.close()
+        
+        self.page_done(response)
+        logging.info(
+            f"Scroll harvest for {role_type} finished after {steps} steps. "
+            f"Collected {self.role_counts.get(role_type, 0)} profiles."
+        )
+    
+    async def scroll_step(self, page):
+        """Click a visible "Load more" control, or scroll to the bottom"""
+        if self.load_more_selector:
+            button = page.locator(self.load_more_selector).first
+            try:
+                if await button.is_visible():
+                    await button.click(timeout=5000)
+                    self.inc_stat('scroll/load_more_clicks')
+                    return
+            except Exception as e:
+                logging.debug(f"Load more click failed, scrolling instead: {e}")
+        
+        await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+        self.inc_stat('scroll/scrolls')
+    
+    async def close_page_on_error(self, failure):
+        page = failure.request.meta.get('playwright_page')
+        if page is not None and not page.is_closed():
+            await page.close()
+        if failure.check(IgnoreRequest):
+            logging.info(f"Scroll harvest request dropped: {failure.request.url}: {failure.value}")
+            return
+        logging.error(f"Scroll harvest request failed: {failure.request.url}: {failure.value}")
     
     def closed(self, reason):
         logging.info("Spider closed: %s", reason)
+        strategy = self.selector_strategy
+        self.inc_stat('selectors/evaluations', strategy.evaluations)
+        self.inc_stat('selectors/evaluations_saved', strategy.saved)
+        strategy.save()
         for role, count in self.role_counts.items():
             logging.info(f"Total {role} profiles collected: {count}")
+        if self.work_queue is not None:
+            if self.heartbeat_task is not None and self.heartbeat_task.running:
+                self.heartbeat_task.stop()
+            released = self.work_queue.release(self.worker_id)
+            if released:
+                logging.info(f"Returned {released} unfinished tasks to the queue")
+            self.work_queue.worker_done(self.worker_id, 'done' if reason in ('finished', 'quota_met') else reason)
+            self.work_queue.close()
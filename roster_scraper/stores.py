@@ -0,0 +1,285 @@
+# Seen-key stores used by DeduplicationPipeline
+#
+# The default store keeps keys in an in-process set, which is fast but is
+# lost between runs and grows without bound. SQLiteSeenStore keeps keys on
+# disk so they survive across runs, and BloomSeenStore puts a Bloom filter
+# in front of it so most lookups for unseen keys never touch the database.
+# The filter only pays off once the database no longer fits in the page
+# cache (see benchmarks/bench_dedup_store.py), so it is opt-in.
+# The "shared" backend is a SQLiteSeenStore that commits every key at once,
+# so several crawler processes can dedup against one file.
+
+import math
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+
+
+class MemorySeenStore:
+    """In-process set of seen keys"""
+
+    def __init__(self):
+        self.keys = set()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def add(self, key):
+        """Record key, returning True if it had not been seen before"""
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def close(self):
+        pass
+
+
+class SQLiteSeenStore:
+    """Seen keys persisted in a SQLite table that survives across runs"""
+
+    def __init__(self, path, batch_size=10000, timeout=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def __contains__(self, key):
+        row = self.conn.execute('SELECT 1 FROM seen WHERE key = ?', (key,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def __iter__(self):
+        for (key,) in self.conn.execute('SELECT key FROM seen'):
+            yield key
+
+    def add(self, key):
+        """Record key, returning True if it had not been seen before"""
+        cursor = self.conn.execute('INSERT OR IGNORE INTO seen (key) VALUES (?)', (key,))
+        self._written(1)
+        return cursor.rowcount == 1
+
+    def add_many(self, keys):
+        """Insert keys known to be new without checking them one by one"""
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO seen (key) VALUES (?)', ((key,) for key in keys)
+        )
+        self._written(len(keys))
+
+    def _written(self, count):
+        self.pending += count
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for a capacity and false-positive rate"""
+
+    HEADER = struct.Struct('<8sQIQ')
+    MAGIC = b'RSBLOOM1'
+
+    def __init__(self, capacity, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Bloom filter error rate must be between 0 and 1, got {error_rate}")
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        # Positions come straight from one digest wide enough for all of
+        # them, unpacked in a single call
+        width = 4 if self.num_bits < 2 ** 32 else 8
+        self.digest_size = width * self.num_hashes
+        self._unpack = struct.Struct(f"<{self.num_hashes}{'I' if width == 4 else 'Q'}").unpack
+
+    def _positions(self, key):
+        data = key.encode('utf-8')
+        if self.digest_size <= 64:
+            digest = hashlib.blake2b(data, digest_size=self.digest_size).digest()
+        else:
+            digest = hashlib.shake_128(data).digest(self.digest_size)
+        return self._unpack(digest)
+
+    def __contains__(self, key):
+        bits = self.bits
+        num_bits = self.num_bits
+        for pos in self._positions(key):
+            pos %= num_bits
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        """Set the key's bits, returning False if they were all already set"""
+        bits = self.bits
+        num_bits = self.num_bits
+        added = False
+        for pos in self._positions(key):
+            pos %= num_bits
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def save(self, path):
+        """Write the bit array to path, replacing it atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Read bits saved by save(); False if the file is missing or sized differently"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(self.HEADER.size)
+                if len(header) != self.HEADER.size:
+                    return False
+                magic, num_bits, num_hashes, count = self.HEADER.unpack(header)
+                if (magic, num_bits, num_hashes) != (self.MAGIC, self.num_bits, self.num_hashes):
+                    return False
+                if f.readinto(self.bits) != len(self.bits):
+                    return False
+        except FileNotFoundError:
+            return False
+        self.count = count
+        return True
+
+
+def bloom_path(path):
+    """Where BloomSeenStore keeps its bits for the database at path"""
+    return f"{path}.bloom"
+
+
+class BloomSeenStore:
+    """Bloom filter in front of a persistent store
+
+    Keys the filter has never seen are definitely new: they are buffered and
+    written to the backend in batches without a lookup. Only keys that hit
+    the filter (real duplicates or false positives) query the backend.
+
+    The bits are saved next to the database on close and loaded on open, so
+    startup does not read every key. The saved file is removed while the
+    store is open; after a crash, or when it was sized for another capacity,
+    the filter is rebuilt from the backend once.
+    """
+
+    def __init__(self, backend, capacity=1000000, error_rate=0.001, batch_size=10000, path=None):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.path = path or bloom_path(backend.path)
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.pending = set()
+        if self.bloom.load(self.path):
+            os.remove(self.path)
+        else:
+            logging.info(f"Rebuilding the dedup Bloom filter from {backend.path}")
+            for key in backend:
+                self.bloom.add(key)
+        if self.bloom.count > capacity:
+            logging.warning(
+                f"Dedup store holds {self.bloom.count} keys, more than the Bloom "
+                f"filter capacity of {capacity}; false positives will rise"
+            )
+
+    def __contains__(self, key):
+        if key not in self.bloom:
+            return False
+        return key in self.pending or key in self.backend
+
+    def __len__(self):
+        self.flush()
+        return len(self.backend)
+
+    def add(self, key):
+        """Record key, returning True if it had not been seen before"""
+        if not self.bloom.add(key):
+            # Every bit was already set: a real duplicate or a false positive
+            if key in self.pending or key in self.backend:
+                return False
+        self.pending.add(key)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.pending:
+            self.backend.add_many(self.pending)
+            self.pending = set()
+        self.backend.flush()
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+        self.bloom.save(self.path)
+
+
+def _discard_bloom(path):
+    try:
+        os.remove(bloom_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def build_seen_store(settings):
+    """Create the seen-key store selected by the DEDUP_STORE* settings"""
+    backend = settings.get('DEDUP_STORE', 'memory')
+
+    if backend == 'memory':
+        return MemorySeenStore()
+
+    if backend == 'sqlite':
+        path = settings.get('DEDUP_STORE_PATH', 'seen_emails.sqlite3')
+        batch_size = settings.getint('DEDUP_STORE_BATCH_SIZE', 10000)
+        store = SQLiteSeenStore(path, batch_size=batch_size)
+        logging.info(f"Dedup store opened at {path}")
+        if settings.getbool('DEDUP_BLOOM_ENABLED', False):
+            return BloomSeenStore(
+                store,
+                capacity=settings.getint('DEDUP_BLOOM_CAPACITY', 1000000),
+                error_rate=settings.getfloat('DEDUP_BLOOM_ERROR_RATE', 0.001),
+                batch_size=batch_size,
+            )
+        # Keys added without the filter would make its saved bits stale
+        _discard_bloom(path)
+        return store
+
+    if backend == 'shared':
+        # No Bloom filter or batching: keys added by other processes must be
+        # seen, and ours must be visible to them as soon as they are added
+        path = settings.get('DEDUP_STORE_PATH', 'seen_emails.sqlite3')
+        logging.info(f"Shared dedup store opened at {path}")
+        _discard_bloom(path)
+        return SQLiteSeenStore(path, batch_size=1, timeout=60)
+
+    raise ValueError(f"Unknown DEDUP_STORE backend: {backend}")
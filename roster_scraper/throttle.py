@@ -0,0 +1,91 @@
+# Additive-increase/multiplicative-decrease control of downloader slots
+#
+# AutoThrottle only moves the delay, and only towards a latency target. The
+# AIMD controller moves both the concurrency and the delay of each download
+# slot (a domain, or a domain and role when PAGE_POOL_SLOT_PER_ROLE is on):
+# every healthy response nudges the slot a little faster, and any sign of
+# congestion (HTTP 429/5xx, a timeout, a render slower than the target)
+# halves its concurrency and doubles its delay. Like TCP, a slot backs off
+# at most once per round: responses to requests sent before the last
+# decrease cannot trigger another one.
+
+import logging
+import time
+
+
+class SlotState:
+    """Current limits of one download slot"""
+
+    __slots__ = ('concurrency', 'delay', 'successes', 'last_decrease')
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.successes = 0
+        self.last_decrease = float('-inf')
+
+    def __repr__(self):
+        return f"SlotState(concurrency={self.concurrency}, delay={self.delay:.3f})"
+
+
+class AIMDController:
+    """Per-slot concurrency and delay kept between a floor and a ceiling"""
+
+    def __init__(self, min_concurrency=1, max_concurrency=4, start_concurrency=1,
+                 min_delay=0.25, max_delay=30.0, start_delay=2.0, delay_step=0.25,
+                 decrease_factor=0.5, target_latency=15.0):
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"AIMD decrease factor must be between 0 and 1, got {decrease_factor}")
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.start_concurrency = min(max(start_concurrency, self.min_concurrency), self.max_concurrency)
+        self.min_delay = max(0.0, min_delay)
+        self.max_delay = max(self.min_delay, max_delay)
+        self.start_delay = min(max(start_delay, self.min_delay), self.max_delay)
+        self.delay_step = delay_step
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.slots = {}
+        self.counters = {'increases': 0, 'decreases': 0}
+
+    def state(self, key):
+        state = self.slots.get(key)
+        if state is None:
+            state = self.slots[key] = SlotState(self.start_concurrency, self.start_delay)
+        return state
+
+    def on_response(self, key, latency, sent_at, ceiling=None):
+        """A response arrived in `latency` seconds; returns the slot state
+
+        `ceiling` caps this slot below max_concurrency, for slots with a
+        budget of their own such as profile detail pages.
+        """
+        if self.target_latency and latency is not None and latency > self.target_latency:
+            return self.on_congestion(key, sent_at, 'latency')
+
+        state = self.state(key)
+        limit = self.max_concurrency if not ceiling else max(self.min_concurrency, min(ceiling, self.max_concurrency))
+        state.delay = max(self.min_delay, state.delay - self.delay_step)
+        # One more concurrent request per round of `concurrency` successes
+        state.successes += 1
+        if state.concurrency > limit:
+            state.concurrency = limit
+        elif state.successes >= state.concurrency and state.concurrency < limit:
+            state.concurrency += 1
+            state.successes = 0
+            self.counters['increases'] += 1
+        return state
+
+    def on_congestion(self, key, sent_at, reason):
+        """The target pushed back; back off unless already done this round"""
+        state = self.state(key)
+        if sent_at is not None and sent_at <= state.last_decrease:
+            return state
+        state.concurrency = max(self.min_concurrency, int(state.concurrency * self.decrease_factor))
+        state.delay = min(self.max_delay, max(self.min_delay, self.delay_step, state.delay / self.decrease_factor))
+        state.successes = 0
+        state.last_decrease = time.monotonic()
+        self.counters['decreases'] += 1
+        self.counters[f'decreases/{reason}'] = self.counters.get(f'decreases/{reason}', 0) + 1
+        logging.debug(f"AIMD backing off {key} after {reason}: {state}")
+        return state
@@ -5,13 +5,30 @@ A command-line tool for scraping public profiles from Shoutt.
 """
 
 import argparse
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
 import sys
+import time
 import logging
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
+from roster_scraper.distributed import merge_shards, open_work_queue, shard_path
+from roster_scraper.exporters import FIELDNAMES, FILE_EXTENSIONS, open_row_writer
 from roster_scraper.spiders.shoutt_spider import ShouttSpider
 
 
+# Rows per batch a --parallel-roles process streams to its parent, and how
+# often the parent logs per-role progress (seconds)
+STREAM_BATCH_SIZE = 50
+PROGRESS_INTERVAL = 10.0
+
+# Finish reasons of a role crawl that ran to completion
+CLEAN_FINISH_REASONS = ('finished', 'quota_met')
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Scrape public profiles from Shoutt for specified roles',
@@ -27,8 +44,32 @@ Examples:
   # Custom output file
   python run_scraper.py --output custom_profiles.csv
   
+  # Write JSON Lines or Parquet instead of CSV
+  python run_scraper.py --format jsonl
+  python run_scraper.py --format parquet --output roster.parquet
+  
   # Scrape multiple roles
   python run_scraper.py --roles "UGC,Video,Photography" --min-per-role 50
+  
+  # Checkpoint into a job directory; rerun the same command to resume
+  python run_scraper.py --resume jobs/roster
+  
+  # Cache rendered pages, then replay the crawl from the cache alone
+  python run_scraper.py --cache
+  python run_scraper.py --offline
+  
+  # Nightly run: write only new, changed and removed profiles to
+  # profiles.delta.csv and update profiles.csv in place
+  python run_scraper.py --incremental
+  
+  # Four worker processes sharing one queue; output merged at the end
+  python run_scraper.py --workers 4
+  
+  # One process and browser per role, merged into one output
+  python run_scraper.py --roles "UGC,Video,Photography" --parallel-roles
+  
+  # Visit profile pages of creators whose card shows no email
+  python run_scraper.py --detail-pages --detail-concurrency 2
         """
     )
     
@@ -49,8 +90,112 @@ Examples:
     parser.add_argument(
         '--output',
         type=str,
-        default='profiles.csv',
-        help='Output CSV file name (default: profiles.csv)'
+        default=None,
+        help='Output file name (default: profiles.csv, or profiles.<ext> for other formats)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        type=str,
+        default='csv',
+        choices=sorted(FILE_EXTENSIONS),
+        help='Output format; parquet and arrow require pyarrow (default: csv)'
+    )
+    
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=None,
+        help='Rows buffered before each write (default: EXPORT_BATCH_SIZE setting)'
+    )
+    
+    parser.add_argument(
+        '--fetch-mode',
+        type=str,
+        default=None,
+        choices=['hybrid', 'playwright', 'http'],
+        help='How listing pages are fetched (default: FETCH_MODE setting, hybrid)'
+    )
+    
+    parser.add_argument(
+        '--harvest-mode',
+        type=str,
+        default=None,
+        choices=['paginate', 'scroll'],
+        help='Follow next-page links or scroll one open page (default: HARVEST_MODE setting, paginate)'
+    )
+    
+    parser.add_argument(
+        '--detail-pages',
+        action='store_true',
+        help='Follow profile links of cards without an email to find it on the profile page'
+    )
+    
+    parser.add_argument(
+        '--detail-concurrency',
+        type=int,
+        default=None,
+        help='Profile pages fetched at once with --detail-pages (default: DETAIL_PAGE_CONCURRENCY setting, 2)'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only export profiles added, changed or removed since the last run to a delta file next to --output'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='Cache fetched and rendered pages in .scrapy/httpcache and reuse fresh ones'
+    )
+    
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Replay from the page cache only: no network, cached pages never expire'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        type=str,
+        default=None,
+        metavar='JOB_DIR',
+        help='Checkpoint into JOB_DIR and continue from its last checkpoint if there is one'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Crawl with N worker processes sharing one task queue, then merge their output'
+    )
+    
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Join the distributed crawl on --queue as one more worker (e.g. from another host; '
+             'the queue and the --output directory must be on storage shared with the other workers)'
+    )
+    
+    parser.add_argument(
+        '--queue',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='Shared work queue for --workers/--worker (default: <output>.queue.sqlite3)'
+    )
+    
+    parser.add_argument(
+        '--fused-pipeline',
+        action='store_true',
+        help='Run validation, brand filter, dedup and export as one fused item pipeline'
+    )
+    
+    parser.add_argument(
+        '--parallel-roles',
+        action='store_true',
+        help='Crawl each role in its own process and browser; rows are deduped and merged into --output'
     )
     
     parser.add_argument(
@@ -63,6 +208,9 @@ Examples:
     
     args = parser.parse_args()
     
+    if args.output is None:
+        args.output = 'profiles' + FILE_EXTENSIONS[args.format]
+    
     # Configure logging
     logging.basicConfig(
         level=getattr(logging, args.log_level),
@@ -70,27 +218,294 @@ Examples:
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
-    # Get Scrapy settings
-    settings = get_project_settings()
-    settings.set('LOG_LEVEL', args.log_level)
-    
-    # Create crawler process
-    process = CrawlerProcess(settings)
+    # Settings given on the command line; worker processes apply them too
+    overrides = {
+        'LOG_LEVEL': args.log_level,
+        'EXPORT_FORMAT': args.format,
+    }
+    if args.batch_size is not None:
+        overrides['EXPORT_BATCH_SIZE'] = args.batch_size
+    if args.resume:
+        overrides['CHECKPOINT_DIR'] = args.resume
+    if args.incremental:
+        overrides['DELTA_CRAWL_ENABLED'] = True
+    if args.cache or args.offline:
+        overrides['HTTPCACHE_ENABLED'] = True
+    if args.offline:
+        overrides['RENDER_CACHE_OFFLINE'] = True
+        overrides['HTTPCACHE_IGNORE_MISSING'] = True
+    if args.detail_pages:
+        overrides['DETAIL_PAGES_ENABLED'] = True
+    if args.detail_concurrency is not None:
+        overrides['DETAIL_PAGE_CONCURRENCY'] = args.detail_concurrency
+    if args.fused_pipeline:
+        overrides['ITEM_PIPELINES'] = {'roster_scraper.pipelines.FusedProfilePipeline': 400}
     
-    # Start crawling
-    process.crawl(
-        ShouttSpider,
-        roles=args.roles,
-        min_per_role=args.min_per_role,
-        output_file=args.output
-    )
+    spider_kwargs = {
+        'roles': args.roles,
+        'min_per_role': args.min_per_role,
+        'output_file': args.output,
+        'fetch_mode': args.fetch_mode,
+        'harvest_mode': args.harvest_mode,
+    }
     
     logging.info(f"Starting scraper with roles: {args.roles}")
     logging.info(f"Minimum profiles per role: {args.min_per_role}")
-    logging.info(f"Output file: {args.output}")
+    logging.info(f"Output file: {args.output} ({args.format})")
     
+    queue_path = args.queue or os.path.splitext(args.output)[0] + '.queue.sqlite3'
+    if args.worker:
+        # Join a distributed crawl started elsewhere with --workers
+        run_worker(None, queue_path, spider_kwargs, overrides)
+        return 0
+    if args.parallel_roles:
+        if args.resume or args.incremental or args.workers:
+            parser.error('--parallel-roles cannot be combined with --resume, --incremental or --workers')
+        return run_parallel_roles(spider_kwargs, overrides)
+    if args.workers:
+        return run_distributed(args.workers, queue_path, spider_kwargs, overrides)
+    
+    settings = get_project_settings()
+    settings.setdict(overrides)
+    crawl(settings, spider_kwargs)
+    return 0
+
+
+def crawl(settings, spider_kwargs):
+    process = CrawlerProcess(settings)
+    process.crawl(ShouttSpider, **spider_kwargs)
     process.start()
 
 
+def run_worker(worker_id, queue_path, spider_kwargs, overrides):
+    """Run one worker of a distributed crawl; its rows go to a JSON Lines shard"""
+    settings = get_project_settings()
+    settings.setdict(overrides)
+    settings.set('WORK_QUEUE', queue_path)
+    worker_id = worker_id or settings.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+    settings.set('WORKER_ID', worker_id)
+    settings.set('EXPORT_FORMAT', 'jsonl')
+    
+    shard = shard_path(spider_kwargs['output_file'], worker_id)
+    os.makedirs(os.path.dirname(shard), exist_ok=True)
+    crawl(settings, dict(spider_kwargs, output_file=shard))
+
+
+def run_distributed(workers, queue_path, spider_kwargs, overrides):
+    """Start local workers on a shared queue, wait for them and merge their shards
+
+    Returns the exit status: non-zero if any local worker failed.
+    """
+    settings = get_project_settings()
+    settings.setdict(overrides)
+    settings.set('WORK_QUEUE', queue_path)
+    output_file = spider_kwargs['output_file']
+    
+    # A queue with unfinished tasks is a crawl that was interrupted: continue
+    # it. A finished one is replaced, together with its shards.
+    queue = open_work_queue(settings)
+    finished = queue.task_counts() and not queue.unfinished()
+    if not finished:
+        # Claims left by this machine's workers of the interrupted run
+        for i in range(1, workers + 1):
+            queue.release(str(i))
+    queue.close()
+    if finished:
+        logging.info(f"Previous crawl on {queue_path} finished, starting a new one")
+        remove_files([queue_path, queue_path + '-wal', queue_path + '-shm'])
+        shutil.rmtree(os.path.dirname(shard_path(output_file, 'x')), ignore_errors=True)
+    
+    # Each worker gets a fresh interpreter with its own reactor and browser
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    for i in range(1, workers + 1):
+        worker_id = str(i)
+        processes[worker_id] = context.Process(
+            target=run_worker,
+            args=(worker_id, queue_path, spider_kwargs, overrides),
+            name=f"roster-worker-{worker_id}",
+        )
+        processes[worker_id].start()
+    logging.info(f"Started {workers} workers on {queue_path}")
+    for process in processes.values():
+        process.join()
+    
+    queue = open_work_queue(settings)
+    try:
+        # Workers joined from other hosts finish their last tasks too
+        deadline = time.monotonic() + settings.getfloat('WORK_QUEUE_LEASE_TIMEOUT', 300.0)
+        while 'running' in queue.workers().values() and time.monotonic() < deadline:
+            time.sleep(settings.getfloat('WORKER_POLL_INTERVAL', 1.0))
+        worker_states = queue.workers()
+        task_counts = queue.task_counts()
+        role_counts = queue.role_counts()
+    finally:
+        queue.close()
+    
+    failed = {worker_id: p.exitcode for worker_id, p in processes.items() if p.exitcode != 0}
+    for worker_id, state in sorted(worker_states.items()):
+        logging.info(f"Worker {worker_id}: {state}")
+    logging.info(f"Tasks: {task_counts}; accepted per role: {role_counts}")
+    
+    # Every registered worker wrote a shard, on this host only if it shares
+    # the output directory
+    shards = [shard_path(output_file, worker_id) for worker_id in sorted(worker_states)]
+    try:
+        rows = merge_shards(shards, output_file, overrides.get('EXPORT_FORMAT', 'csv'))
+    except FileNotFoundError as e:
+        logging.error(f"{e}; workers on other hosts need the output directory on shared storage")
+        return 1
+    logging.info(f"Merged {len(shards)} shards into {output_file}: {rows} rows")
+    if failed:
+        logging.error(f"Workers exited with errors: {failed}")
+        return 1
+    return 0
+
+
+def remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_role_worker(role, spider_kwargs, overrides, stream):
+    """Crawl one role of a --parallel-roles run, streaming its rows to `stream`"""
+    settings = get_project_settings()
+    settings.setdict(overrides)
+    pipelines = dict(settings.getdict('ITEM_PIPELINES'))
+    if 'roster_scraper.pipelines.CSVExportPipeline' in pipelines:
+        order = pipelines.pop('roster_scraper.pipelines.CSVExportPipeline')
+        pipelines['roster_scraper.pipelines.ItemStreamPipeline'] = order
+    settings.set('ITEM_PIPELINES', pipelines)
+    settings.set('FUSED_EXPORT_PIPELINE', 'roster_scraper.pipelines.ItemStreamPipeline')
+    # Small batches, so the parent sees progress while the crawl runs
+    settings.set('EXPORT_BATCH_SIZE', min(settings.getint('EXPORT_BATCH_SIZE', 500), STREAM_BATCH_SIZE))
+    
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(ShouttSpider)
+    # ItemStreamPipeline finds the queue as a spider argument
+    process.crawl(crawler, **dict(spider_kwargs, roles=role, item_stream=stream))
+    process.start()
+    stats = crawler.stats
+    stream.put(('finished', role, {
+        'reason': stats.get_value('finish_reason'),
+        'items': stats.get_value('item_scraped_count', 0),
+        'errors': stats.get_value('log_count/ERROR', 0),
+    }))
+
+
+def run_parallel_roles(spider_kwargs, overrides):
+    """Crawl each role in its own process and merge the rows they stream back
+    
+    The role processes dedup against one shared seen-email store, so a
+    creator already taken by another role is dropped before it counts
+    towards a quota. The parent checks again before writing, reports each
+    role's written rows against --min-per-role, and returns the exit
+    status: non-zero if any role's process failed or did not finish.
+    """
+    roles = [role.strip() for role in spider_kwargs['roles'].split(',') if role.strip()]
+    output_file = spider_kwargs['output_file']
+    min_per_role = int(spider_kwargs.get('min_per_role') or 0)
+    
+    # A persistent SQLite store is shared as it is; otherwise the roles
+    # share a store that only lives for this run
+    settings = get_project_settings()
+    settings.setdict(overrides)
+    if settings.get('DEDUP_STORE', 'memory') == 'sqlite':
+        seen_path = settings.get('DEDUP_STORE_PATH', 'seen_emails.sqlite3')
+        temporary = []
+    else:
+        seen_path = os.path.splitext(output_file)[0] + '.seen.sqlite3'
+        temporary = [seen_path, seen_path + '-wal', seen_path + '-shm']
+        remove_files(temporary)
+    role_overrides = dict(overrides, DEDUP_STORE='shared', DEDUP_STORE_PATH=seen_path)
+    
+    # Each role gets a fresh interpreter with its own reactor and browser
+    context = multiprocessing.get_context('spawn')
+    stream = context.Queue()
+    processes = {}
+    for role in roles:
+        processes[role] = context.Process(
+            target=run_role_worker,
+            args=(role, spider_kwargs, role_overrides, stream),
+            name=f"roster-role-{role}",
+        )
+        processes[role].start()
+    logging.info(f"Started {len(roles)} role processes: {', '.join(roles)}")
+    
+    email_index = FIELDNAMES.index('email')
+    seen = set()
+    received = dict.fromkeys(roles, 0)
+    written = dict.fromkeys(roles, 0)
+    finished = {}
+    writer = open_row_writer(output_file, overrides.get('EXPORT_FORMAT', 'csv'))
+    last_progress = time.monotonic()
+    try:
+        while True:
+            running = [role for role, process in processes.items() if process.is_alive()]
+            try:
+                # Once every process has exited, drain what is left and stop
+                message = stream.get(timeout=1.0) if running else stream.get_nowait()
+            except queue.Empty:
+                if not running:
+                    break
+                message = None
+            
+            if message is not None:
+                kind, role, payload = message
+                if kind == 'rows':
+                    rows = []
+                    for row in payload:
+                        email = row[email_index]
+                        if email not in seen:
+                            seen.add(email)
+                            rows.append(row)
+                    if rows:
+                        writer.write_batch(rows)
+                    received[role] += len(payload)
+                    written[role] += len(rows)
+                elif kind == 'finished':
+                    finished[role] = payload
+                    logging.info(
+                        f"Role {role} finished ({payload['reason']}): "
+                        f"{received[role]} rows, {written[role]} written"
+                    )
+            
+            if running and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                logging.info('Progress: ' + '; '.join(
+                    f"{role} {written[role]}/{min_per_role} written"
+                    f"{'' if role in finished else ' (running)'}"
+                    for role in roles
+                ))
+    finally:
+        writer.close()
+        for process in processes.values():
+            process.join()
+        remove_files(temporary)
+    
+    failed = {}
+    short = {}
+    for role, process in processes.items():
+        result = finished.get(role, {})
+        reason = result.get('reason')
+        logging.info(
+            f"Role {role}: exit code {process.exitcode}, {reason or 'no finish reason'}, "
+            f"{received[role]} rows received, {written[role]} written, "
+            f"{result.get('errors', 0)} errors"
+        )
+        if process.exitcode != 0 or reason not in CLEAN_FINISH_REASONS:
+            failed[role] = process.exitcode if process.exitcode != 0 else reason
+        elif written[role] < min_per_role:
+            short[role] = written[role]
+    logging.info(f"Merged {len(roles)} roles into {output_file}: {sum(written.values())} rows")
+    if short:
+        logging.warning(f"Roles below --min-per-role {min_per_role} (rows written): {short}")
+    if failed:
+        logging.error(f"Role processes did not finish cleanly: {failed}")
+        return 1
+    return 0
+
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
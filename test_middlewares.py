@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Test script for validating downloader middleware behaviour
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scrapy.http import Request
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from roster_scraper import settings as project_settings
+from roster_scraper.browser import PagePool
+from roster_scraper.middlewares import (
+    PagePoolMiddleware,
+    RosterScraperDownloaderMiddleware,
+    abort_blocked_resource,
+)
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.visited = []
+    
+    def is_closed(self):
+        return self.closed
+    
+    async def goto(self, url):
+        self.visited.append(url)
+
+
+class FakePlaywrightRequest:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+def make_middleware(**overrides):
+    settings = {
+        'RESOURCE_BLOCKER_ENABLED': True,
+        'RESOURCE_BLOCKER_TYPES': project_settings.RESOURCE_BLOCKER_TYPES,
+        'RESOURCE_BLOCKER_DENY_PATTERNS': project_settings.RESOURCE_BLOCKER_DENY_PATTERNS,
+        'RESOURCE_BLOCKER_ALLOW_PATTERNS': [],
+    }
+    settings.update(overrides)
+    crawler = get_crawler(settings_dict=settings)
+    crawler.stats = MemoryStatsCollector(crawler)
+    return RosterScraperDownloaderMiddleware.from_crawler(crawler), crawler.stats
+
+
+def test_resource_blocking():
+    """Test that images and analytics are blocked and counted"""
+    print("Testing resource blocking...")
+    middleware, stats = make_middleware(
+        RESOURCE_BLOCKER_ALLOW_PATTERNS=[r'cdn\.shoutt\.co/avatars/keep'],
+    )
+    RosterScraperDownloaderMiddleware.active = middleware
+    try:
+        cases = [
+            ('https://www.shoutt.co/creators/ugc', 'document', False),
+            ('https://www.shoutt.co/app.js', 'script', False),
+            ('https://cdn.shoutt.co/avatars/1.jpg', 'image', True),
+            ('https://cdn.shoutt.co/avatars/keep.jpg', 'image', False),
+            ('https://fonts.gstatic.com/x.woff2', 'font', True),
+            ('https://www.googletagmanager.com/gtm.js', 'script', True),
+        ]
+        for url, resource_type, blocked in cases:
+            assert abort_blocked_resource(FakePlaywrightRequest(url, resource_type)) is blocked
+            print(f"✓ {resource_type} {url} {'blocked' if blocked else 'allowed'}")
+    finally:
+        RosterScraperDownloaderMiddleware.active = None
+    
+    assert stats.get_value('resource_blocker/blocked_requests') == 3
+    assert stats.get_value('resource_blocker/blocked_requests/image') == 1
+    print("✓ Blocked requests counted in stats")
+    print()
+
+
+def test_page_callback_only_for_playwright():
+    """Test that only rendered requests get the page init callback"""
+    print("Testing page init callback wiring...")
+    middleware, _ = make_middleware()
+    
+    rendered = Request('https://www.shoutt.co/creators/ugc', meta={'playwright': True})
+    plain = Request('https://www.shoutt.co/creators/ugc')
+    middleware.process_request(rendered, None)
+    middleware.process_request(plain, None)
+    
+    assert 'playwright_page_init_callback' in rendered.meta
+    assert 'playwright_page_init_callback' not in plain.meta
+    print("✓ Page init callback only set on Playwright requests")
+    print()
+
+
+def test_page_pool_reuse():
+    """Test that released pages are reset and handed to the next request"""
+    print("Testing page pool reuse...")
+    
+    async def scenario():
+        pool = PagePool(size=1)
+        
+        # No page yet: the caller lets scrapy-playwright create one
+        assert await pool.acquire('role-UGC') is None
+        page = FakePage()
+        
+        # The pool is full, so the next acquire waits for a release
+        waiting = asyncio.ensure_future(pool.acquire('role-UGC'))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        
+        pool.release('role-UGC', page)
+        assert await waiting is page
+        assert page.visited == ['about:blank']
+        
+        # Roles never share pages
+        assert await pool.acquire('role-Video') is None
+        return pool.counters
+    
+    counters = asyncio.run(scenario())
+    assert counters['created'] == 2 and counters['reused'] == 1 and counters['waited'] == 1
+    print(f"✓ Page pool counters: {counters}")
+    print()
+
+
+def test_page_pool_middleware_isolates_roles():
+    """Test that rendered requests get a per-role context and download slot"""
+    print("Testing per-role contexts...")
+    crawler = get_crawler(settings_dict={'PAGE_POOL_SIZE': 1})
+    middleware = PagePoolMiddleware.from_crawler(crawler)
+    
+    ugc = Request('https://www.shoutt.co/creators/ugc', meta={'playwright': True, 'role_type': 'UGC'})
+    video = Request('https://www.shoutt.co/creators/video', meta={'playwright': True, 'role_type': 'Video'})
+    
+    async def scenario():
+        await middleware.process_request(ugc, None)
+        await middleware.process_request(video, None)
+    
+    asyncio.run(scenario())
+    assert ugc.meta['playwright_context'] == 'role-UGC'
+    assert video.meta['playwright_context'] == 'role-Video'
+    assert ugc.meta['download_slot'] != video.meta['download_slot']
+    assert ugc.meta['playwright_include_page']
+    print("✓ Roles use separate contexts and download slots")
+    
+    # A failed download frees the pool slot for the next request
+    middleware.process_exception(ugc, Exception('timeout'), None)
+    assert middleware.pool.live['role-UGC'] == 0
+    print("✓ Failed requests release their pool slot")
+    print()
+
+
+def test_parse_callback_timing():
+    """Test that callback time is reported per role to the metrics extension"""
+    print("Testing parse callback timing...")
+    from scrapy.http import HtmlResponse
+    from roster_scraper.extensions import CrawlMetrics
+    from roster_scraper.middlewares import RosterScraperSpiderMiddleware
+    
+    def callback():
+        yield {'name': 'one'}
+        yield {'name': 'two'}
+    
+    async def async_callback():
+        yield {'name': 'three'}
+    
+    async def drain(results):
+        return [i async for i in results]
+    
+    response = HtmlResponse(
+        'https://www.shoutt.co/creators/ugc',
+        body=b'<html></html>',
+        request=Request('https://www.shoutt.co/creators/ugc', meta={'role_type': 'UGC'}),
+    )
+    middleware = RosterScraperSpiderMiddleware()
+    metrics = CrawlMetrics()
+    CrawlMetrics.active = metrics
+    try:
+        assert len(list(middleware.process_spider_output(response, callback(), None))) == 2
+        results = middleware.process_spider_output_async(response, async_callback(), None)
+        assert len(asyncio.run(drain(results))) == 1
+    finally:
+        CrawlMetrics.active = None
+    
+    assert metrics.registry.histogram('parse_seconds', role='UGC').count == 2
+    print("✓ Sync and async callbacks timed per role")
+    
+    # Download time is split by renderer
+    request = Request('https://www.shoutt.co/creators/ugc', meta={
+        'role_type': 'UGC', 'playwright': True, 'download_latency': 1.5,
+    })
+    metrics.response_received(response, request, None)
+    histogram = metrics.registry.histogram('download_seconds', role='UGC', renderer='playwright')
+    assert histogram.count == 1 and histogram.sum == 1.5
+    print("✓ Playwright render time recorded per role")
+    print()
+
+
+def test_aimd_controller():
+    """Test additive increase, multiplicative decrease and the limits"""
+    print("Testing AIMD controller...")
+    from roster_scraper.throttle import AIMDController
+    
+    controller = AIMDController(
+        min_concurrency=1, max_concurrency=4, start_concurrency=1,
+        min_delay=0.0, max_delay=8.0, start_delay=1.0, delay_step=0.5, target_latency=5.0,
+    )
+    for _ in range(20):
+        state = controller.on_response('shoutt', 0.2, None)
+    assert state.concurrency == 4 and state.delay == 0.0
+    print("✓ Healthy responses raise concurrency to the ceiling and the delay to the floor")
+    
+    sent_at = time.monotonic()
+    state = controller.on_congestion('shoutt', sent_at, 'http_429')
+    assert state.concurrency == 2 and state.delay == 0.5
+    # Responses to requests sent before the back-off don't halve it again
+    state = controller.on_congestion('shoutt', sent_at, 'http_429')
+    assert state.concurrency == 2
+    print("✓ One back-off per round")
+    
+    for _ in range(10):
+        state = controller.on_response('shoutt', 30.0, None)
+    assert state.concurrency == 1 and state.delay == 8.0
+    assert controller.counters['decreases/latency'] == 10
+    print("✓ Slow renders back off down to the floor and up to the maximum delay")
+    print()
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Stand-in server: 429 once more than `limit` requests are in flight"""
+    
+    limit = 2
+    active = 0
+    lock = threading.Lock()
+    
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            limited = cls.active > cls.limit
+        try:
+            time.sleep(0.05)
+            body = b'<html><body>ok</body></html>'
+            self.send_response(429 if limited else 200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+    
+    def log_message(self, format, *args):
+        pass
+
+
+AIMD_CRAWL_SCRIPT = """
+import json, sys
+import scrapy
+from scrapy.crawler import CrawlerProcess
+
+class Burst(scrapy.Spider):
+    name = 'burst'
+    def start_requests(self):
+        for i in range(60):
+            yield scrapy.Request(f'{sys.argv[1]}/p{i}', dont_filter=True)
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+    def parse(self, response):
+        pass
+
+process = CrawlerProcess({
+    'DOWNLOADER_MIDDLEWARES': {'roster_scraper.middlewares.AdaptiveConcurrencyMiddleware': 570},
+    'CONCURRENT_REQUESTS': 16,
+    'DOWNLOAD_DELAY': 0,
+    'RETRY_ENABLED': False,
+    'HTTPERROR_ALLOW_ALL': True,
+    'AIMD_MIN_CONCURRENCY': 1,
+    'AIMD_MAX_CONCURRENCY': 6,
+    'AIMD_START_CONCURRENCY': 6,
+    'AIMD_MIN_DELAY': 0,
+    'AIMD_DELAY_STEP': 0.01,
+    'LOG_LEVEL': 'ERROR',
+})
+crawler = process.create_crawler(Burst)
+process.crawl(crawler)
+process.start()
+json.dump(crawler.stats.get_stats(), open(sys.argv[2], 'w'), default=str)
+"""
+
+
+def test_aimd_against_rate_limited_server():
+    """Test that a crawl backs off from a server that answers 429"""
+    print("Testing AIMD against a rate-limited server...")
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stats_path = os.path.join(tempfile.mkdtemp(), 'stats.json')
+    try:
+        # A fresh process gets its own reactor
+        subprocess.run(
+            [sys.executable, '-c', AIMD_CRAWL_SCRIPT, f'http://127.0.0.1:{server.server_port}', stats_path],
+            check=True, timeout=120, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    finally:
+        server.shutdown()
+    with open(stats_path) as f:
+        stats = json.load(f)
+    
+    assert stats['downloader/response_status_count/429'] > 0
+    assert stats['aimd/decreases/http_429'] > 0
+    key = '127.0.0.1'
+    assert 1 <= stats[f'aimd/{key}/concurrency'] <= 6
+    assert stats[f'aimd/{key}/max_concurrency'] <= 6
+    print(f"✓ Backed off {stats['aimd/decreases/http_429']} times, "
+          f"finished at concurrency {stats[f'aimd/{key}/concurrency']}")
+    print()
+
+
+def test_render_cache(tmp_path=None):
+    """Test the rendered-page cache storage and offline replay"""
+    print("Testing render cache...")
+    import os
+    import tempfile
+    from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+    from scrapy.exceptions import IgnoreRequest
+    from scrapy.http import HtmlResponse
+    from scrapy.spiders import Spider
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    settings = {
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_DIR': directory,
+        'HTTPCACHE_STORAGE': project_settings.HTTPCACHE_STORAGE,
+        'HTTPCACHE_EXPIRATION_SECS': 0,
+        'RENDER_CACHE_TTL': {'*/creators/video*': 1},
+        'RENDER_CACHE_MAX_BYTES': 0,
+    }
+    
+    def open_cache(**overrides):
+        crawler = get_crawler(Spider, settings_dict=dict(settings, **overrides))
+        crawler.spider = Spider.from_crawler(crawler, name='roster')
+        middleware = HttpCacheMiddleware.from_crawler(crawler)
+        middleware.spider_opened(crawler.spider)
+        return middleware, middleware.storage
+    
+    def fetch(middleware, url, role='UGC', render=True, body='<html><body>cards</body></html>'):
+        """Run a request through the cache, downloading on a miss"""
+        request = Request(url, meta={'role_type': role, 'playwright': render})
+        cached = middleware.process_request(request)
+        if cached is not None:
+            return cached
+        response = HtmlResponse(url, body=body.encode(), encoding='utf-8', request=request)
+        return middleware.process_response(request, response)
+    
+    middleware, storage = open_cache()
+    fetch(middleware, 'https://www.shoutt.co/creators/ugc?page=2&sort=new', body='<p>rendered</p>')
+    hit = fetch(middleware, 'https://www.shoutt.co/creators/ugc?sort=new&page=2#top')
+    assert 'cached' in hit.flags and hit.text == '<p>rendered</p>'
+    print("✓ Canonical URLs share an entry")
+    
+    plain = fetch(middleware, 'https://www.shoutt.co/creators/ugc?page=2&sort=new', render=False, body='<p>shell</p>')
+    other_role = fetch(middleware, 'https://www.shoutt.co/creators/ugc?page=2&sort=new', role='Video')
+    assert 'cached' not in plain.flags and 'cached' not in other_role.flags
+    print("✓ Renderer and role are part of the key")
+    
+    with open(next(iter(storage.entries)), 'rb') as f:
+        assert f.read(2) == b'\x1f\x8b'
+    print("✓ Entries stored gzip-compressed")
+    
+    fetch(middleware, 'https://www.shoutt.co/creators/video')
+    time.sleep(1.1)
+    assert 'cached' in fetch(middleware, 'https://www.shoutt.co/creators/ugc?page=2&sort=new').flags
+    assert 'cached' not in fetch(middleware, 'https://www.shoutt.co/creators/video').flags
+    assert storage.counters['expired'] == 1
+    print("✓ TTL applies per URL pattern")
+    
+    # Offline: stale entries are served and misses never reach the network
+    time.sleep(1.1)
+    middleware, storage = open_cache(RENDER_CACHE_OFFLINE=True, HTTPCACHE_IGNORE_MISSING=True)
+    assert 'cached' in fetch(middleware, 'https://www.shoutt.co/creators/video').flags
+    try:
+        fetch(middleware, 'https://www.shoutt.co/creators/photo')
+        raise AssertionError("offline replay went to the network")
+    except IgnoreRequest:
+        pass
+    print("✓ Offline replay serves expired entries and ignores misses")
+    
+    # LRU eviction: the least recently used entry goes first
+    entry_size = max(storage.entries.values())
+    middleware, storage = open_cache(RENDER_CACHE_MAX_BYTES=entry_size * 3 + 100)
+    for role in ('A', 'B', 'C'):
+        fetch(middleware, 'https://www.shoutt.co/creators/ugc', role=role)
+    assert len(storage.entries) <= 3
+    fetch(middleware, 'https://www.shoutt.co/creators/ugc', role='A')
+    fetch(middleware, 'https://www.shoutt.co/creators/ugc', role='D')
+    assert storage.total_bytes <= storage.max_bytes
+    assert 'cached' in fetch(middleware, 'https://www.shoutt.co/creators/ugc', role='A').flags
+    assert storage.counters['evicted'] > 0
+    assert sum(os.path.getsize(path) for path in storage.entries) == storage.total_bytes
+    print(f"✓ Evicted {storage.counters['evicted']} entries to stay under {storage.max_bytes} bytes")
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Running Middleware Tests")
+    print("=" * 50)
+    print()
+    
+    test_resource_blocking()
+    test_page_callback_only_for_playwright()
+    test_page_pool_reuse()
+    test_page_pool_middleware_isolates_roles()
+    test_parse_callback_timing()
+    test_aimd_controller()
+    test_aimd_against_rate_limited_server()
+    test_render_cache()
+    
+    print("=" * 50)
+    print("All tests completed!")
+    print("=" * 50)
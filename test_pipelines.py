@@ -48,6 +48,48 @@ def test_email_validation():
     print()
 
 
+def test_email_validation_cache():
+    """Test email validation caching and pre-check counters"""
+    print("Testing Email Validation Cache...")
+    pipeline = EmailValidationPipeline()
+    
+    emails = [
+        "john.doe@example.com",
+        "jane.doe@example.com",
+        "john.doe@example.com",
+        "Postmaster@Example.COM",
+        "not-an-email",
+    ]
+    
+    accepted = []
+    for email in emails:
+        item = ProfileItem(
+            name="Cache Test",
+            email=email,
+            profile_link="http://example.com/cache",
+            role_type="UGC"
+        )
+        try:
+            accepted.append(pipeline.process_item(item, None)['email'])
+        except DropItem:
+            pass
+    
+    counters = pipeline.normalizer.counters
+    assert accepted == [
+        "john.doe@example.com",
+        "jane.doe@example.com",
+        "john.doe@example.com",
+        "postmaster@example.com",
+    ]
+    assert counters['cache_hit'] == 1
+    assert counters['cache_miss'] == 3
+    assert counters['domain_cache_miss'] == 2
+    assert counters['precheck_rejected'] == 1
+    print(f"✓ Cache counters: {counters}")
+    
+    print()
+
+
 def test_brand_filter():
     """Test brand name filtering pipeline"""
     print("Testing Brand Name Filter Pipeline...")
@@ -89,6 +131,22 @@ def test_brand_filter():
         except DropItem:
             print(f"✓ Brand name '{name}' correctly dropped (keyword: {keyword})")
     
+    # Keywords only match whole words
+    for name in ["Nicole Turner", "Theodore Coleman"]:
+        item = ProfileItem(
+            name=name,
+            email="person@example.com",
+            profile_link="http://example.com/person",
+            role_type="UGC"
+        )
+        
+        try:
+            pipeline.process_item(item, None)
+            print(f"✓ Person name '{name}' passed")
+        except DropItem as e:
+            print(f"✗ Person name '{name}' failed: {e}")
+            raise
+    
     print()
 
 
@@ -142,6 +200,505 @@ def test_deduplication():
     print()
 
 
+def test_persistent_deduplication(tmp_path=None):
+    """Test that the SQLite dedup store survives across runs"""
+    print("Testing Persistent Deduplication Store...")
+    import os
+    import tempfile
+    from roster_scraper.stores import SQLiteSeenStore, BloomSeenStore
+    
+    directory = tmp_path or tempfile.mkdtemp()
+    path = os.path.join(str(directory), "seen.sqlite3")
+    
+    item = ProfileItem(
+        name="Alice Smith",
+        email="alice@example.com",
+        profile_link="http://example.com/alice",
+        role_type="UGC"
+    )
+    
+    # First run sees the email for the first time
+    pipeline = DeduplicationPipeline(store=BloomSeenStore(SQLiteSeenStore(path), capacity=1000))
+    pipeline.process_item(item, None)
+    pipeline.close_spider(None)
+    print("✓ First run accepted alice@example.com")
+    
+    # Second run remembers it; the Bloom bits are loaded, not rebuilt
+    assert os.path.exists(path + ".bloom")
+    store = BloomSeenStore(SQLiteSeenStore(path), capacity=1000)
+    assert store.bloom.count == 1 and not os.path.exists(path + ".bloom")
+    pipeline = DeduplicationPipeline(store=store)
+    try:
+        pipeline.process_item(item, None)
+        print("✗ Email from previous run should have been dropped")
+        raise AssertionError("duplicate across runs was accepted")
+    except DropItem:
+        print("✓ Email from previous run correctly dropped")
+    finally:
+        pipeline.close_spider(None)
+    
+    # Saved bits sized for another capacity are ignored and rebuilt
+    store = BloomSeenStore(SQLiteSeenStore(path), capacity=50)
+    assert "alice@example.com" in store
+    store.close()
+    print("✓ Bloom filter saved on close and loaded on the next open")
+    
+    print()
+
+
+def test_batched_export(tmp_path=None):
+    """Test buffered export to CSV and JSON Lines"""
+    print("Testing Batched Export Pipeline...")
+    import csv
+    import json
+    import os
+    import tempfile
+    from roster_scraper.pipelines import CSVExportPipeline
+    
+    class MockSpider:
+        pass
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    items = [
+        ProfileItem(
+            name=f"Person {i}",
+            email=f"person{i}@example.com",
+            profile_link=f"http://example.com/person{i}",
+            role_type="UGC"
+        )
+        for i in range(5)
+    ]
+    
+    for output_format in ["csv", "jsonl"]:
+        spider = MockSpider()
+        spider.output_file = os.path.join(directory, f"profiles.{output_format}")
+        pipeline = CSVExportPipeline(output_format=output_format, batch_size=2)
+        pipeline.open_spider(spider)
+        for item in items:
+            pipeline.process_item(item, spider)
+        
+        # Two full batches written, one row still buffered
+        assert pipeline.rows_written == 4
+        pipeline.close_spider(spider)
+        assert pipeline.rows_written == 5
+        
+        with open(spider.output_file, encoding="utf-8") as f:
+            if output_format == "csv":
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f]
+        assert [row["email"] for row in rows] == [item["email"] for item in items]
+        assert list(rows[0]) == ["name", "email", "profile_link", "role_type"]
+        print(f"✓ {output_format} export wrote {len(rows)} rows")
+    
+    print()
+
+
+def test_background_export(tmp_path=None):
+    """Test the background writer thread, its backpressure and clean drain"""
+    print("Testing Background Export Writer...")
+    import csv
+    import os
+    import tempfile
+    import threading
+    import time
+    from twisted.internet import reactor
+    from twisted.internet.defer import Deferred
+    from roster_scraper.exporters import BackgroundRowWriter
+    from roster_scraper.pipelines import CSVExportPipeline
+    
+    class SlowWriter:
+        def __init__(self):
+            self.gate = threading.Event()
+            self.batches = []
+            self.closed = False
+        
+        def write_batch(self, rows):
+            self.gate.wait()
+            if rows == [('boom',)]:
+                raise OSError("disk full")
+            self.batches.append(rows)
+        
+        def close(self):
+            self.closed = True
+    
+    inner = SlowWriter()
+    writer = BackgroundRowWriter(inner, max_batches=2)
+    writer.write_batch([(0,)])
+    while writer.queue_depth:
+        time.sleep(0.01)
+    # The thread holds batch 0 at the closed gate; two more fill the queue
+    writer.write_batch([(1,)])
+    writer.write_batch([(2,)])
+    assert not inner.batches
+    
+    # The queue is full: later batches are held back in order and the
+    # producer gets Deferreds instead of blocking the reactor thread
+    held = [writer.write_batch([(3,)]), writer.write_batch([(4,)])]
+    assert all(isinstance(d, Deferred) for d in held) and writer.queue_depth == 4
+    fired = []
+    for d in held:
+        d.addCallback(fired.append)
+    inner.gate.set()
+    writer.drain()
+    # The writer thread fires them through the reactor's thread call queue
+    reactor.runUntilCurrent()
+    assert inner.batches == [[(0,)], [(1,)], [(2,)], [(3,)], [(4,)]]
+    assert fired == [None, None]
+    assert writer.counters['blocked'] == 1 and writer.counters['max_queue_depth'] == 2
+    assert writer.write_batch([(5,)]) is None
+    writer.drain()
+    print(f"✓ Producer held back once at {writer.counters['max_queue_depth']} queued batches, then drained")
+    
+    writer.write_batch([('boom',)])
+    try:
+        writer.drain()
+        assert False, "writer thread error was not raised"
+    except RuntimeError:
+        pass
+    try:
+        writer.close()
+    except RuntimeError:
+        pass
+    assert inner.closed
+    print("✓ Writer thread errors surface on the producer side")
+    
+    class MockSpider:
+        pass
+    
+    spider = MockSpider()
+    spider.output_file = os.path.join(str(tmp_path or tempfile.mkdtemp()), "profiles.csv")
+    pipeline = CSVExportPipeline(batch_size=3, background=True, queue_size=2, fsync_interval=0.001)
+    pipeline.open_spider(spider)
+    for i in range(10):
+        pipeline.process_item(ProfileItem(name=f"P{i}", email=f"p{i}@example.com",
+                                          profile_link="x", role_type="UGC"), spider)
+    state = pipeline.checkpoint()
+    assert state['rows_written'] == 10 and state['output_offset'] == os.path.getsize(spider.output_file)
+    pipeline.close_spider(spider)
+    with open(spider.output_file, newline='', encoding='utf-8') as f:
+        emails = [row['email'] for row in csv.DictReader(f)]
+    assert emails == [f"p{i}@example.com" for i in range(10)]
+    assert pipeline.writer.counters['fsyncs'] >= 1
+    print("✓ Export pipeline wrote every row in order through the writer thread")
+    
+    # With periodic fsyncs off the file is still fsynced on close
+    class SyncedWriter(SlowWriter):
+        def fsync(self):
+            self.synced = True
+    
+    inner = SyncedWriter()
+    inner.gate.set()
+    writer = BackgroundRowWriter(inner, fsync_interval=0)
+    writer.write_batch([(0,)])
+    writer.close()
+    assert inner.synced and writer.counters['fsyncs'] == 1
+    print("✓ Writer fsyncs once on close with fsync_interval=0")
+    print()
+
+
+def test_compact_records(tmp_path=None):
+    """Test that ProfileRecord takes the same path through the pipelines as ProfileItem"""
+    print("Testing compact ProfileRecord items...")
+    import csv
+    import os
+    import tempfile
+    from itemadapter import ItemAdapter
+    from roster_scraper.items import ProfileRecord
+    from roster_scraper.pipelines import CSVExportPipeline
+    
+    class MockSpider:
+        pass
+    
+    record = ProfileRecord(name="Jane", email="Jane@Example.com", profile_link="x", role_type="UGC")
+    assert not hasattr(record, '__dict__')
+    assert ItemAdapter.is_item(record) and ItemAdapter(record).asdict()['role_type'] == 'UGC'
+    assert record['name'] == 'Jane' and record.get('missing', 'n/a') == 'n/a'
+    print("✓ Slotted record works as a Scrapy item and as a mapping")
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    profiles = [
+        ("Jane Doe", "jane.doe@Example.com"),
+        ("Creative Studio", "hello@studio.com"),
+        ("John Smith", "not-an-email"),
+        ("Jane D", "jane.doe@example.com"),
+        ("Ana Lopez", ""),
+        ("Ana Lopez", "ana@example.com"),
+    ]
+    outcomes = {}
+    for item_class in (ProfileItem, ProfileRecord):
+        spider = MockSpider()
+        spider.output_file = os.path.join(directory, f"{item_class.__name__}.csv")
+        stages = [EmailValidationPipeline(), BrandNameFilterPipeline(), DeduplicationPipeline(),
+                  CSVExportPipeline(batch_size=10)]
+        for stage in stages:
+            if hasattr(stage, 'open_spider'):
+                stage.open_spider(spider)
+        reasons = []
+        for name, email in profiles:
+            item = item_class(name=name, email=email, profile_link="http://example.com", role_type="UGC")
+            try:
+                for stage in stages:
+                    item = stage.process_item(item, spider)
+                reasons.append('accepted')
+            except DropItem as e:
+                reasons.append(e.reason)
+        stages[-1].close_spider(spider)
+        with open(spider.output_file, newline='', encoding='utf-8') as f:
+            outcomes[item_class] = (reasons, list(csv.reader(f)))
+    
+    assert outcomes[ProfileItem] == outcomes[ProfileRecord]
+    reasons, rows = outcomes[ProfileRecord]
+    assert reasons == ['accepted', 'brand_name', 'invalid_email', 'duplicate_email', 'missing_email', 'accepted']
+    assert [row[1] for row in rows[1:]] == ['jane.doe@example.com', 'ana@example.com']
+    print("✓ Same drops and exported rows as ProfileItem")
+    print()
+
+
+def test_fused_pipeline(tmp_path=None):
+    """Test that the fused pipeline accepts and drops like the separate stages"""
+    print("Testing Fused Pipeline...")
+    import itertools
+    import os
+    import tempfile
+    from roster_scraper.items import ProfileRecord
+    from roster_scraper.pipelines import CSVExportPipeline, FusedProfilePipeline
+    
+    class MockSpider:
+        pass
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    profiles = [
+        ("Jane Doe", "jane.doe@Example.com"),
+        ("Creative Studio", "hello@studio.com"),
+        ("John Smith", "not-an-email"),
+        ("Jane D", "jane.doe@example.com"),
+        ("Jane Again", "jane.doe@Example.com"),
+        ("Media Agency", "jane.doe@Example.com"),
+        ("Ana Lopez", ""),
+        ("Ana Lopez", "ana@example.com"),
+        ("Design Labs", "bad@"),
+        ("Creative Studio", "a@example.com"),
+        ("Jane Doe", "a@example.com"),
+    ]
+    
+    def run(stages, item_class=ProfileItem):
+        spider = MockSpider()
+        spider.output_file = os.path.join(directory, f"run{len(os.listdir(directory))}.csv")
+        for stage in stages:
+            if hasattr(stage, 'open_spider'):
+                stage.open_spider(spider)
+        reasons = []
+        for name, email in profiles:
+            item = item_class(name=name, email=email, profile_link="http://example.com", role_type="UGC")
+            try:
+                for stage in stages:
+                    item = stage.process_item(item, spider)
+                reasons.append('accepted')
+            except DropItem as e:
+                reasons.append(e.reason)
+        stages[-1].close_spider(spider)
+        with open(spider.output_file, encoding='utf-8') as f:
+            return reasons, f.read()
+    
+    staged = run([EmailValidationPipeline(), BrandNameFilterPipeline(), DeduplicationPipeline(),
+                  CSVExportPipeline(batch_size=10)])
+    in_order = run([FusedProfilePipeline()])
+    assert in_order == staged
+    print("✓ Default (staged) step order gives the same drop reasons and output")
+    
+    fused = FusedProfilePipeline(steps=['brand', 'dedup', 'email', 'export'])
+    reasons, output = run([fused], ProfileRecord)
+    assert output == staged[1]
+    assert [r == 'accepted' for r in reasons] == [r == 'accepted' for r in staged[0]]
+    # Cheap checks first: a brand name with a bad address is dropped as a brand
+    assert reasons[-3] == 'brand_name' and staged[0][-3] == 'invalid_email'
+    assert fused.counters['raw_dedup_hits'] == 1
+    assert fused.counters['accepted'] == 3 and fused.counters['duplicate_email'] == 2
+    print(f"✓ Cheap-first order accepts the same items; drops counted: {fused.counters}")
+    
+    # A later filter step dropping an item must not make its address taken
+    for order in itertools.permutations(['email', 'brand', 'dedup']):
+        reasons, output = run([FusedProfilePipeline(steps=list(order) + ['export'])], ProfileRecord)
+        assert output == staged[1], order
+        assert [r == 'accepted' for r in reasons] == [r == 'accepted' for r in staged[0]], order
+        assert reasons[-2:] == ['brand_name', 'accepted'], order
+    print("✓ Every step order accepts the same items as the staged chain")
+    
+    try:
+        FusedProfilePipeline(steps=['export', 'email'])
+        assert False, "export must be the last step"
+    except ValueError:
+        print("✓ Export step must come last")
+    print()
+
+
+def test_pipeline_metrics(tmp_path=None):
+    """Test per-stage timing and drop reasons from the metrics extension"""
+    print("Testing Pipeline Metrics...")
+    import logging
+    import os
+    import tempfile
+    from scrapy.pipelines import ItemPipelineManager
+    from scrapy.statscollectors import MemoryStatsCollector
+    from scrapy.utils.test import get_crawler
+    from roster_scraper.extensions import CrawlMetrics
+    
+    crawler = get_crawler(settings_dict={
+        'ITEM_PIPELINES': {
+            'roster_scraper.pipelines.EmailValidationPipeline': 100,
+            'roster_scraper.pipelines.BrandNameFilterPipeline': 200,
+            'roster_scraper.pipelines.DeduplicationPipeline': 300,
+        },
+    })
+    crawler.stats = MemoryStatsCollector(crawler)
+    manager = ItemPipelineManager.from_crawler(crawler)
+    textfile = os.path.join(str(tmp_path or tempfile.mkdtemp()), "roster.prom")
+    metrics = CrawlMetrics(stats=crawler.stats, textfile=textfile)
+    
+    profiles = [
+        ("Alice Smith", "alice@example.com"),
+        ("Bob", "not-an-email"),
+        ("Creative Studio", "studio@example.com"),
+        ("Alice Again", "alice@example.com"),
+    ]
+    # Pipelines report to the active extension, set when the spider opens
+    CrawlMetrics.active = metrics
+    try:
+        for name, email in profiles:
+            item = ProfileItem(name=name, email=email, profile_link="http://example.com", role_type="UGC")
+            try:
+                for pipeline in manager.middlewares:
+                    item = pipeline.process_item(item, None)
+            except DropItem:
+                pass
+    finally:
+        CrawlMetrics.active = None
+    assert metrics.stages == [
+        'EmailValidationPipeline', 'BrandNameFilterPipeline', 'DeduplicationPipeline'
+    ]
+    
+    registry = metrics.registry
+    assert registry.counter_value(
+        'pipeline_items_total', stage='EmailValidationPipeline', outcome='dropped', reason='invalid_email'
+    ) == 1
+    assert registry.counter_value(
+        'pipeline_items_total', stage='BrandNameFilterPipeline', outcome='dropped', reason='brand_name'
+    ) == 1
+    assert registry.counter_value(
+        'pipeline_items_total', stage='DeduplicationPipeline', outcome='accepted', reason=''
+    ) == 1
+    assert registry.histogram('pipeline_stage_seconds', stage='EmailValidationPipeline').count == 4
+    print("✓ Stage latencies and drop reasons recorded")
+    
+    metrics.refresh()
+    assert crawler.stats.get_value('metrics/pipeline/DeduplicationPipeline/dropped/duplicate_email') == 1
+    assert crawler.stats.get_value('metrics/pipeline_stage/DeduplicationPipeline/count') == 2
+    with open(textfile, encoding="utf-8") as f:
+        exported = f.read()
+    assert '# TYPE roster_pipeline_stage_seconds histogram' in exported
+    assert 'roster_pipeline_items_total{outcome="dropped",reason="brand_name",stage="BrandNameFilterPipeline"} 1' in exported
+    assert 'roster_pipeline_stage_seconds_count{stage="EmailValidationPipeline"} 4' in exported
+    print("✓ Metrics published to stats and the Prometheus textfile")
+    
+    # The fused stage's export step is timed once, as part of the fused stage
+    from roster_scraper.pipelines import FusedProfilePipeline
+    
+    class MockSpider:
+        output_file = os.path.join(os.path.dirname(textfile), "fused.csv")
+    
+    fused = FusedProfilePipeline()
+    fused.open_spider(MockSpider)
+    metrics = CrawlMetrics()
+    CrawlMetrics.active = metrics
+    try:
+        fused.process_item(ProfileItem(name="Ana Lopez", email="ana@example.com", profile_link="x", role_type="UGC"), MockSpider)
+    finally:
+        CrawlMetrics.active = None
+        fused.close_spider(MockSpider)
+    assert metrics.stages == ['FusedProfilePipeline']
+    print("✓ Stages run inside the fused stage are not timed twice")
+    
+    # Loaded pipelines without the decorator are reported
+    class Untimed:
+        def process_item(self, item, spider):
+            return item
+    
+    class FakeCrawler:
+        class engine:
+            class scraper:
+                class itemproc:
+                    middlewares = [fused, Untimed()]
+    
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    logging.getLogger().addHandler(handler)
+    try:
+        CrawlMetrics(crawler=FakeCrawler).check_stages()
+    finally:
+        logging.getLogger().removeHandler(handler)
+    assert warnings == ["Pipelines without @timed_stage are not timed: Untimed"]
+    print("✓ Pipelines that do not report their timing are logged")
+    print()
+
+
+def test_sort_merge_dedup(tmp_path=None):
+    """Test that the external sort-merge keeps the newest row per profile"""
+    print("Testing external sort-merge dedup...")
+    import csv
+    import json
+    import os
+    import tempfile
+    from roster_scraper.exporters import FIELDNAMES
+    from roster_scraper.sortmerge import merge_outputs
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    old_file = os.path.join(directory, 'old.csv')
+    new_file = os.path.join(directory, 'new.jsonl')
+    output_file = os.path.join(directory, 'merged.csv')
+    with open(old_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        writer.writerow(['Ann', 'ann@example.com', 'http://example.com/ann', 'UGC'])
+        writer.writerow(['Bob', 'bob@example.com', 'http://example.com/bob', 'UGC'])
+        writer.writerow(['Bob Smith', 'bob@example.com', 'http://example.com/bob', 'UGC'])
+        writer.writerow(['Cy', '', 'http://example.com/cy', 'Video'])
+        for i in range(10):
+            writer.writerow([f'User {i}', f'user{i}@example.com', f'http://example.com/u{i}', 'Video'])
+    with open(new_file, 'w', encoding='utf-8') as f:
+        for name, email, link in [
+            ('Ann Lee', ' ANN@Example.com', 'http://example.com/ann-lee'),
+            ('Cy Young', '', 'http://example.com/cy'),
+            ('Dee', 'dee@example.com', 'http://example.com/dee'),
+        ]:
+            f.write(json.dumps(dict(zip(FIELDNAMES, [name, email, link, 'UGC']))) + '\n')
+    os.utime(old_file, (1000000000, 1000000000))
+    
+    # Tiny chunks and fan-in force several runs and merge passes
+    counters = merge_outputs([new_file, old_file], output_file, chunk_rows=3, fan_in=2)
+    with open(output_file, newline='', encoding='utf-8') as f:
+        rows = {row['profile_link']: row for row in csv.DictReader(f)}
+    assert counters['rows_read'] == 17
+    assert counters['rows_written'] == len(rows) == 14
+    assert counters['runs'] == 6 and counters['merge_passes'] > 1
+    print(f"✓ {counters['rows_read']} rows merged to {counters['rows_written']} over {counters['runs']} runs")
+    
+    assert 'http://example.com/ann' not in rows
+    assert rows['http://example.com/ann-lee']['name'] == 'Ann Lee'
+    assert rows['http://example.com/cy']['name'] == 'Cy Young'
+    assert rows['http://example.com/bob']['name'] == 'Bob Smith'
+    print("✓ Newest file and latest row win per email, or per link without an email")
+    
+    # Taken in the order given, the CSV is now the newer file
+    merge_outputs([new_file, old_file], output_file, order='given', chunk_rows=1000)
+    with open(output_file, newline='', encoding='utf-8') as f:
+        names = {row['name'] for row in csv.DictReader(f)}
+    assert {'Ann', 'Cy'} <= names and 'Ann Lee' not in names
+    print("✓ Input order decides recency with order='given'")
+    print()
+
+
 if __name__ == "__main__":
     print("=" * 50)
     print("Running Pipeline Tests")
@@ -149,8 +706,16 @@ if __name__ == "__main__":
     print()
     
     test_email_validation()
+    test_email_validation_cache()
     test_brand_filter()
     test_deduplication()
+    test_persistent_deduplication()
+    test_batched_export()
+    test_background_export()
+    test_compact_records()
+    test_fused_pipeline()
+    test_pipeline_metrics()
+    test_sort_merge_dedup()
     
     print("=" * 50)
     print("All tests completed!")
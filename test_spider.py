@@ -0,0 +1,857 @@
+#!/usr/bin/env python3
+"""
+Test script for validating spider parsing without hitting the website
+"""
+
+import asyncio
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse, Request
+from roster_scraper.items import ProfileItem
+from roster_scraper.spiders.shoutt_spider import ShouttSpider, url_pattern
+
+
+LISTING_HTML = """
+<html><body>
+  <div class="creator-card">
+    <a href="/profiles/jane">Jane Smith</a>
+    <h3>Jane Smith</h3>
+    <a href="mailto:jane@example.com">Email</a>
+  </div>
+  <div class="creator-card">
+    <a href="/profiles/john">John Doe</a>
+    <h3>John Doe</h3>
+    <p>Contact: john@example.com</p>
+  </div>
+  <a class="next" href="/creators/ugc?page=2">Next</a>
+</body></html>
+"""
+
+XPATH_ONLY_HTML = """
+<html><body>
+  <div class="user-profile-box">
+    <a href="/profiles/ana">Ana Lopez</a>
+    <h2>Ana Lopez</h2>
+    <a href="mailto:ana@example.com">Email</a>
+  </div>
+  <a href="/creators/ugc?page=3">Next page</a>
+</body></html>
+"""
+
+SHELL_HTML = """
+<html><body><script src="/app.js"></script></body></html>
+"""
+
+
+def make_response(url, body, meta):
+    request = Request(url=url, meta=meta)
+    return HtmlResponse(url=url, body=body.encode('utf-8'), encoding='utf-8', request=request)
+
+
+def test_url_pattern():
+    """Test that paginated URLs share a pattern"""
+    print("Testing URL patterns...")
+    assert url_pattern('https://www.shoutt.co/creators/ugc?page=2') == \
+        url_pattern('https://www.shoutt.co/creators/ugc?page=3')
+    assert url_pattern('https://www.shoutt.co/creators/ugc') != \
+        url_pattern('https://www.shoutt.co/creators/video')
+    print("✓ Paginated URLs share a pattern")
+    print()
+
+
+def test_hybrid_plain_http():
+    """Test that plain HTML with cards is parsed without rendering"""
+    print("Testing hybrid fetch with server-rendered cards...")
+    spider = ShouttSpider(roles='UGC', min_per_role=5)
+    
+    start = list(spider.start_requests())
+    assert not start[0].meta.get('playwright')
+    print("✓ First request uses plain HTTP")
+    
+    response = make_response(spider.role_urls['UGC'], LISTING_HTML, start[0].meta)
+    results = list(spider.parse(response))
+    items = [r for r in results if isinstance(r, ProfileItem)]
+    requests = [r for r in results if isinstance(r, Request)]
+    
+    assert [item['email'] for item in items] == ['jane@example.com', 'john@example.com']
+    assert len(requests) == 1 and not requests[0].meta.get('playwright')
+    print(f"✓ Parsed {len(items)} items and followed pagination over plain HTTP")
+    print()
+
+
+def test_hybrid_render_fallback():
+    """Test that an empty shell page is re-requested through Playwright"""
+    print("Testing hybrid fetch fallback to Playwright...")
+    spider = ShouttSpider(roles='UGC', min_per_role=5)
+    url = spider.role_urls['UGC']
+    
+    response = make_response(url, SHELL_HTML, {'role_type': 'UGC', 'page_num': 1})
+    results = list(spider.parse(response))
+    assert len(results) == 1 and results[0].meta.get('playwright')
+    print("✓ Shell page re-requested with Playwright")
+    
+    rendered = make_response(url, LISTING_HTML, results[0].meta)
+    list(spider.parse(rendered))
+    assert spider.should_render(url + '?page=2')
+    print("✓ Later pages of the same pattern go straight to Playwright")
+    print()
+
+
+class FakeScrollPage:
+    """Stands in for a Playwright page that adds cards on every scroll"""
+    
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.scrolls = 0
+        self.closed = False
+    
+    async def evaluate(self, script, arg=None):
+        if arg is None:
+            self.scrolls += 1
+            return None
+        return self.batches.pop(0) if self.batches else []
+    
+    async def wait_for_timeout(self, timeout):
+        pass
+    
+    def is_closed(self):
+        return self.closed
+    
+    async def close(self):
+        self.closed = True
+
+
+def card_html(i):
+    return (
+        f'<div class="creator-card"><a href="/profiles/p{i}">Person {i}</a>'
+        f'<h3>Person {i}</h3><a href="mailto:p{i}@example.com">Email</a></div>'
+    )
+
+
+def run_scroll(spider, page):
+    response = make_response(
+        spider.role_urls['UGC'], '<html><body></body></html>',
+        {'role_type': 'UGC', 'playwright_page': page},
+    )
+    
+    async def collect():
+        items = []
+        async for item in spider.parse_scroll(response):
+            # Every item passes the pipelines
+            spider.item_accepted(item)
+            items.append(item)
+        return items
+    
+    return asyncio.run(collect())
+
+
+def test_scroll_harvest_stops_at_quota():
+    """Test that scroll harvesting yields new cards and stops at the quota"""
+    print("Testing scroll harvest quota...")
+    spider = ShouttSpider(roles='UGC', min_per_role=3, harvest_mode='scroll')
+    page = FakeScrollPage([[card_html(0), card_html(1)], [card_html(2), card_html(3)], [card_html(4)]])
+    
+    items = run_scroll(spider, page)
+    assert [item['email'] for item in items] == ['p0@example.com', 'p1@example.com', 'p2@example.com']
+    assert page.scrolls == 1 and page.closed
+    print(f"✓ Harvested {len(items)} items in {page.scrolls} scroll and closed the page")
+    print()
+
+
+def test_scroll_harvest_stops_when_idle():
+    """Test that scroll harvesting stops when no new cards appear"""
+    print("Testing scroll harvest idle timeout...")
+    spider = ShouttSpider(roles='UGC', min_per_role=50, harvest_mode='scroll')
+    spider.scroll_idle_timeout = 0
+    page = FakeScrollPage([[card_html(0)]])
+    
+    items = run_scroll(spider, page)
+    assert len(items) == 1 and page.closed
+    print("✓ Stopped once no new cards appeared")
+    print()
+
+
+def test_selector_strategy_learns_and_persists(tmp_path=None):
+    """Test that winning selectors are tried first and saved for the next run"""
+    print("Testing learned selector strategy...")
+    import os
+    import tempfile
+    from roster_scraper.selectors import SelectorStrategy
+    
+    path = os.path.join(str(tmp_path or tempfile.mkdtemp()), 'strategy.json')
+    spider = ShouttSpider(roles='UGC', min_per_role=50)
+    spider.selector_strategy = SelectorStrategy(path)
+    meta = {'role_type': 'UGC', 'page_num': 1, 'playwright': True}
+    
+    for page in range(3):
+        response = make_response(spider.role_urls['UGC'], XPATH_ONLY_HTML, dict(meta))
+        spider.role_counts['UGC'] = 0
+        items = [r for r in spider.parse(response) if isinstance(r, ProfileItem)]
+        assert [item['email'] for item in items] == ['ana@example.com']
+    
+    strategy = spider.selector_strategy
+    assert strategy.preferred['UGC/next_page'].startswith('xpath:')
+    assert 'UGC/card' not in strategy.preferred and 'UGC/name' not in strategy.preferred
+    assert strategy.saved > 0
+    print(f"✓ Learned next-page XPath, saved {strategy.saved} selector evaluations")
+    
+    strategy.save()
+    warm = SelectorStrategy(path)
+    warm.load()
+    assert warm.preferred == strategy.preferred
+    print("✓ Learned strategy reloaded from disk")
+    print()
+
+
+def test_selector_priority_kept_per_card():
+    """Test that a fallback selector winning once does not outrank better ones"""
+    print("Testing selector priority across cards...")
+    html = """
+    <html><body>
+      <div class="creator-card"><a href="/p/ana">Ana Lopez</a><p>ana@example.com</p></div>
+      <div class="creator-card"><a href="/p/bob">View profile</a><h3>Bob Smith</h3><p>bob@example.com</p></div>
+      <div class="creator-card"><div class="creator-inner"><a href="/p/cy">Cy</a></div><h3>Cy Young</h3><p>cy@example.com</p></div>
+    </body></html>
+    """
+    meta = {'role_type': 'UGC', 'page_num': 1, 'playwright': True}
+    spider = ShouttSpider(roles='UGC', min_per_role=50)
+    for page in range(2):
+        response = make_response(spider.role_urls['UGC'], html, dict(meta))
+        names = [r['name'] for r in spider.parse(response) if isinstance(r, ProfileItem)]
+        assert names == ['Ana Lopez', 'Bob Smith', 'Cy Young'], names
+    assert 'UGC/name' not in spider.selector_strategy.preferred
+    assert 'UGC/card' not in spider.selector_strategy.preferred
+    print("✓ Names follow the declared priority on every card and page")
+    
+    # Name selectors that match nothing on the page are skipped for later cards
+    links_only = """
+    <html><body>
+      <div class="creator-card"><a href="/p/dee">Dee Park</a><p>dee@example.com</p></div>
+      <div class="creator-card"><a href="/p/eve">Eve Stone</a><p>eve@example.com</p></div>
+    </body></html>
+    """
+    response = make_response(spider.role_urls['UGC'], links_only, dict(meta))
+    saved = spider.selector_strategy.saved
+    names = [r['name'] for r in spider.parse(response) if isinstance(r, ProfileItem)]
+    assert names == ['Dee Park', 'Eve Stone']
+    assert spider.selector_strategy.saved - saved == 2
+    print("✓ Candidates empty on the whole page are skipped for the next card")
+    print()
+
+
+def test_page_wide_email_extraction():
+    """Test single-pass email extraction, obfuscations and nested cards"""
+    print("Testing page-wide email extraction...")
+    from parsel import Selector
+    from roster_scraper.extractors import EmailExtractor, find_emails
+    
+    assert find_emails("mail jane [at] example [dot] com now") == ["jane@example.com"]
+    assert find_emails("Reach me: sam (at) mail (dot) co (dot) uk") == ["sam@mail.co.uk"]
+    print("✓ Obfuscated addresses decoded")
+    
+    selector = Selector(text="""
+        <div class="user-list">
+          <div class="user-card"><h3>Ana</h3><p>ana@example.com</p></div>
+          <div class="user-card"><h3>Ben</h3><script>var x = "spam@tracker.com";</script></div>
+          <div class="user-card"><h3>Cy</h3><p>cy {at} example {dot} org</p></div>
+        </div>
+    """)
+    outer = selector.css('.user-list')[0].root
+    cards = [card.root for card in selector.css('.user-card')]
+    emails = EmailExtractor().scan(selector.root, [outer] + cards)
+    
+    assert emails[cards[0]] == "ana@example.com"
+    assert cards[1] not in emails
+    assert emails[cards[2]] == "cy@example.org"
+    assert emails[outer] == "ana@example.com"
+    print("✓ Matches mapped back to the innermost and enclosing cards")
+    print()
+
+
+def test_checkpoint_resume(tmp_path=None):
+    """Test that a resumed job continues from pending pages without duplicate rows"""
+    print("Testing checkpoint and resume...")
+    import csv
+    import os
+    import tempfile
+    from scrapy.utils.test import get_crawler
+    from roster_scraper.checkpoint import truncate_partial_record
+    from roster_scraper.extensions import CrawlCheckpoint
+    from roster_scraper.pipelines import CSVExportPipeline, DeduplicationPipeline
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    output_file = os.path.join(directory, 'profiles.csv')
+    settings = {
+        'CHECKPOINT_DIR': os.path.join(directory, 'job'),
+        'SELECTOR_STRATEGY_FILE': None,
+    }
+    
+    def start_job():
+        crawler = get_crawler(ShouttSpider, settings_dict=settings)
+        spider = ShouttSpider.from_crawler(crawler, roles='UGC', min_per_role=5, output_file=output_file)
+        dedup = DeduplicationPipeline()
+        export = CSVExportPipeline(background=False)
+        dedup.open_spider(spider)
+        export.open_spider(spider)
+        return crawler, spider, dedup, export
+    
+    # First run parses page 1 and checkpoints before it dies
+    crawler, spider, dedup, export = start_job()
+    assert not spider.job.resumed
+    start = list(spider.start_requests())
+    response = make_response(start[0].url, LISTING_HTML, start[0].meta)
+    results = list(spider.parse(response))
+    for item in results:
+        if isinstance(item, ProfileItem):
+            export.process_item(dedup.process_item(item, spider), spider)
+            spider.item_accepted(item)
+    state = export.checkpoint()
+    state.update(spider.checkpoint_state())
+    spider.job.save(state)
+    assert list(spider.pending) == ['https://www.shoutt.co/creators/ugc?page=2']
+    # A complete row after the checkpoint, then one torn by the crash inside
+    # a quoted newline
+    export.writer.write_batch([('Half\nLine', 'half@exa')])
+    with open(output_file, 'a', encoding='utf-8') as f:
+        f.write('"Torn\nRow",torn@')
+    export.writer.file.close()
+    print("✓ Checkpoint saved after page 1")
+    
+    # Second run resumes at page 2 and keeps the rows already written
+    crawler, spider, dedup, export = start_job()
+    assert spider.job.resumed
+    assert spider.role_counts['UGC'] == 2
+    resumed = list(spider.start_requests())
+    assert [r.url for r in resumed] == ['https://www.shoutt.co/creators/ugc?page=2']
+    assert resumed[0].meta['page_num'] == 2
+    print("✓ Resumed at the pending page, page 1 is not fetched again")
+    
+    # Page 1 items seen again (e.g. re-parsed) are duplicates
+    for item in [r for r in results if isinstance(r, ProfileItem)]:
+        try:
+            dedup.process_item(item, spider)
+            raise AssertionError("row from the previous run was accepted again")
+        except DropItem:
+            pass
+    item = ProfileItem(name='Ana Lopez', email='ana@example.com', profile_link='x', role_type='UGC')
+    export.process_item(dedup.process_item(item, spider), spider)
+    export.close_spider(spider)
+    assert export.rows_written == 4
+    
+    with open(output_file, newline='', encoding='utf-8') as f:
+        emails = [row['email'] for row in csv.DictReader(f)]
+    assert emails == ['jane@example.com', 'john@example.com', 'half@exa', 'ana@example.com']
+    print("✓ Output appended without the torn row or duplicates")
+    
+    # A torn record is found from the checkpointed offset, not the last newline
+    with open(output_file, 'a', encoding='utf-8', newline='') as f:
+        f.write('"Torn\r\nRow",torn@')
+    size = os.path.getsize(output_file)
+    truncate_partial_record(output_file, spider.job.state['output_offset'])
+    assert os.path.getsize(output_file) == size - len('"Torn\r\nRow",torn@')
+    print("✓ Torn CSV record with a quoted newline cut back to the last complete row")
+    
+    # The checkpoint extension saves the final state on close
+    CrawlCheckpoint(crawler).spider_closed(spider, 'finished')
+    assert spider.job.load()['finished']
+    print()
+
+
+def test_quota_counts_accepted_items():
+    """Test that quotas follow accepted items and cancel the role's requests"""
+    print("Testing quota accounting...")
+    from scrapy import signals
+    from scrapy.exceptions import IgnoreRequest
+    from scrapy.utils.test import get_crawler
+    from roster_scraper.middlewares import RoleQuotaMiddleware
+    from roster_scraper.pipelines import ProfileDropped, RoleQuotaPipeline
+    
+    class FakeEngine:
+        closed = None
+        
+        async def close_spider_async(self, reason):
+            FakeEngine.closed = reason
+    
+    class FakePage:
+        closed = False
+        
+        def is_closed(self):
+            return self.closed
+        
+        async def close(self):
+            self.closed = True
+    
+    crawler = get_crawler(ShouttSpider, settings_dict={'SELECTOR_STRATEGY_FILE': None})
+    crawler.engine = FakeEngine()
+    spider = ShouttSpider.from_crawler(crawler, roles='UGC,Video', min_per_role=2)
+    middleware = RoleQuotaMiddleware.from_crawler(crawler)
+    
+    # Yielding items does not count towards the quota
+    response = make_response(spider.role_urls['UGC'], LISTING_HTML, {'role_type': 'UGC', 'page_num': 1})
+    items = [r for r in spider.parse(response) if isinstance(r, ProfileItem)]
+    assert len(items) == 2 and spider.role_counts['UGC'] == 0
+    print("✓ Yielded items are not counted before the pipelines accept them")
+    
+    queued = spider.listing_request(spider.role_urls['UGC'] + '?page=3', 'UGC', 3)
+    # No page pool: the middleware asks scrapy-playwright for the page itself
+    rendering = spider.listing_request(spider.role_urls['UGC'] + '?page=2', 'UGC', 2, render=True)
+    middleware.process_request(rendering, spider)
+    assert rendering.meta['playwright_include_page']
+    rendering.meta['playwright_page'] = page = FakePage()
+    
+    async def render(request):
+        # A render that finishes normally; its page is closed, not leaked
+        request.meta['playwright_page'] = rendered_page = FakePage()
+        middleware.process_response(request, make_response(request.url, LISTING_HTML, request.meta), spider)
+        await asyncio.sleep(0)
+        return rendered_page
+    
+    finished = spider.listing_request(spider.role_urls['Video'], 'Video', 1, render=True)
+    middleware.process_request(finished, spider)
+    assert asyncio.run(render(finished)).closed and 'playwright_page' not in finished.meta
+    print("✓ Pages the middleware asked for are closed once their render finishes")
+    
+    async def accept(items, response=None):
+        # Page closes and the engine shutdown are scheduled on the event loop
+        for item in items:
+            crawler.signals.send_catch_log(signals.item_scraped, item=item, response=response, spider=spider)
+        await asyncio.sleep(0)
+    
+    # Items still in the pipelines hold their place in the quota, so the rest
+    # of the page that fills it is dropped instead of overshooting
+    quota = RoleQuotaPipeline.from_crawler(crawler)
+    extra = ProfileItem(name='Extra', email='extra@example.com', profile_link='y', role_type='UGC')
+    assert [quota.process_item(item, spider) for item in items] == items
+    try:
+        quota.process_item(extra, spider)
+        raise AssertionError("item past the quota was let through")
+    except ProfileDropped as e:
+        assert e.reason == 'quota_met'
+    # A place is given back when its item is dropped by a later stage
+    crawler.signals.send_catch_log(signals.item_dropped, item=items[1], response=response,
+                                   exception=DropItem("duplicate"), spider=spider)
+    assert quota.process_item(extra, spider) is extra
+    crawler.signals.send_catch_log(signals.item_dropped, item=extra, response=response,
+                                   exception=DropItem("duplicate"), spider=spider)
+    
+    asyncio.run(accept(items, response))
+    assert spider.role_counts['UGC'] == 2 and spider.role_satisfied('UGC')
+    assert not any(quota.pending.values())
+    try:
+        quota.process_item(extra, spider)
+        raise AssertionError("item of a satisfied role was let through")
+    except ProfileDropped:
+        pass
+    assert crawler.stats.get_value('quota/dropped_items') == 2
+    print("✓ Quota pipeline drops the items past a role's quota")
+    
+    try:
+        middleware.process_request(queued, spider)
+        raise AssertionError("queued request of a satisfied role was downloaded")
+    except IgnoreRequest:
+        pass
+    assert page.closed and rendering.meta['quota_cancelled']
+    print("✓ Queued and in-flight requests of the satisfied role are cancelled")
+    
+    video = ProfileItem(name='Ana', email='ana@example.com', profile_link='x', role_type='Video')
+    asyncio.run(accept([video]))
+    assert FakeEngine.closed is None
+    asyncio.run(accept([video]))
+    assert FakeEngine.closed == 'quota_met'
+    print("✓ Spider closes once every role quota is met")
+    print()
+
+
+NO_EMAIL_HTML = """
+<html><body>
+  <div class="creator-card">
+    <a href="/profiles/jane">Jane Smith</a>
+    <h3>Jane Smith</h3>
+    <a href="mailto:jane@example.com">Email</a>
+  </div>
+  <div class="creator-card">
+    <a href="/profiles/ravi">Ravi Patel</a>
+    <h3>Ravi Patel</h3>
+  </div>
+</body></html>
+"""
+
+PROFILE_HTML = """
+<html><body>
+  <h1>Ravi Patel</h1>
+  <p>Bookings: ravi [at] example [dot] com</p>
+  <footer><a href="mailto:support@shoutt.co">Support</a></footer>
+</body></html>
+"""
+
+PROFILE_SHELL_HTML = """
+<html><body><footer><a href="mailto:support@shoutt.co">Support</a></footer></body></html>
+"""
+
+
+def test_detail_pages_for_missing_emails():
+    """Test that cards without an email are followed to their profile page"""
+    print("Testing profile detail pages...")
+    from scrapy.utils.test import get_crawler
+    from roster_scraper.throttle import AIMDController
+    
+    spider = ShouttSpider(roles='UGC', min_per_role=5)
+    response = make_response(spider.role_urls['UGC'], NO_EMAIL_HTML, {'role_type': 'UGC', 'page_num': 1})
+    assert [r['email'] for r in spider.parse(response) if isinstance(r, ProfileItem)] == ['jane@example.com']
+    print("✓ Cards without an email are skipped when detail pages are off")
+    
+    spider = ShouttSpider(roles='UGC', min_per_role=5)
+    spider.detail_pages = True
+    response = make_response(spider.role_urls['UGC'], NO_EMAIL_HTML, {'role_type': 'UGC', 'page_num': 1})
+    details = [r for r in spider.parse(response) if isinstance(r, Request)]
+    assert len(details) == 1
+    detail = details[0]
+    assert detail.url == 'https://www.shoutt.co/profiles/ravi'
+    assert detail.priority < 0 and detail.meta['download_slot'] == 'profile-details'
+    assert not detail.meta.get('playwright')
+    assert not [r for r in spider.parse(response) if isinstance(r, Request)]
+    print("✓ Profile link followed once, at low priority in its own slot, over plain HTTP")
+    
+    shell = make_response(detail.url, PROFILE_SHELL_HTML, detail.meta)
+    results = list(spider.parse_detail(shell))
+    assert len(results) == 1 and results[0].meta.get('playwright')
+    assert results[0].meta['playwright_context'] == 'profile-details'
+    print("✓ Profile page without an email is rendered; the site's own address is ignored")
+    
+    rendered = make_response(detail.url, PROFILE_HTML, results[0].meta)
+    items = list(spider.parse_detail(rendered))
+    assert len(items) == 1 and items[0]['email'] == 'ravi@example.com'
+    assert items[0]['name'] == 'Ravi Patel' and items[0]['role_type'] == 'UGC'
+    assert detail.url in spider.completed and detail.url not in spider.pending
+    print("✓ Email found on the rendered profile page")
+    
+    spider.satisfied_roles.add('UGC')
+    assert not list(spider.parse_detail(make_response(detail.url, PROFILE_HTML, detail.meta)))
+    print("✓ Detail pages of a satisfied role yield nothing")
+    
+    # The detail slot stays within its own budget under AIMD
+    controller = AIMDController(max_concurrency=4, start_delay=0.25)
+    for _ in range(20):
+        state = controller.on_response('profile-details', 0.1, None, ceiling=2)
+    assert state.concurrency == 2
+    print("✓ Detail slot concurrency capped at its budget")
+    
+    # Without AIMD the downloader sizes the slot from DOWNLOAD_SLOTS
+    crawler = get_crawler(ShouttSpider, settings_dict={
+        'AIMD_ENABLED': False, 'DETAIL_PAGES_ENABLED': True, 'DETAIL_PAGE_CONCURRENCY': 3,
+        'DOWNLOAD_SLOTS': {'www.shoutt.co': {'concurrency': 1}},
+    })
+    slots = crawler.settings.getdict('DOWNLOAD_SLOTS')
+    assert slots['profile-details'] == {'concurrency': 3}
+    assert slots['www.shoutt.co'] == {'concurrency': 1}
+    print("✓ Detail slot budget holds with AIMD disabled")
+    print()
+
+
+PAGE_TWO_HTML = """
+<html><body>
+  <div class="creator-card">
+    <a href="/profiles/ana">Ana Lopez</a>
+    <h3>Ana Lopez</h3>
+    <a href="mailto:ana@example.com">Email</a>
+  </div>
+  <script>window.renderedAt = %d;</script>
+</body></html>
+"""
+
+
+def test_incremental_delta_crawl(tmp_path=None):
+    """Test that a second run exports only what changed since the first"""
+    print("Testing incremental delta crawl...")
+    import csv
+    import os
+    import tempfile
+    from scrapy.utils.test import get_crawler
+    from roster_scraper.pipelines import CSVExportPipeline, DeduplicationPipeline
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    output_file = os.path.join(directory, 'profiles.csv')
+    delta_file = os.path.join(directory, 'profiles.delta.csv')
+    settings = {'DELTA_CRAWL_ENABLED': True, 'SELECTOR_STRATEGY_FILE': None}
+    page_one = 'https://www.shoutt.co/creators/ugc'
+    page_two = 'https://www.shoutt.co/creators/ugc?page=2'
+    
+    def crawl(pages):
+        """Run one crawl over canned pages; returns the spider and URLs parsed"""
+        crawler = get_crawler(ShouttSpider, settings_dict=settings)
+        spider = ShouttSpider.from_crawler(crawler, roles='UGC', min_per_role=10, output_file=output_file)
+        dedup = DeduplicationPipeline()
+        export = CSVExportPipeline(crawler=crawler)
+        export.flush_interval = 0
+        dedup.open_spider(spider)
+        export.open_spider(spider)
+        requests = list(spider.start_requests())
+        while requests:
+            request = requests.pop(0)
+            response = make_response(request.url, pages[request.url], request.meta)
+            for result in spider.parse(response):
+                if isinstance(result, Request):
+                    requests.append(result)
+                    continue
+                try:
+                    export.process_item(dedup.process_item(result, spider), spider)
+                    spider.item_accepted(result)
+                except DropItem:
+                    pass
+        export.close_spider(spider)
+        dedup.close_spider(spider)
+        return spider, crawler.stats
+    
+    def read(path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    
+    spider, stats = crawl({page_one: LISTING_HTML, page_two: PAGE_TWO_HTML % 1})
+    assert [row['change'] for row in read(delta_file)] == ['added'] * 3
+    assert len(read(output_file)) == 3
+    print("✓ First run: every profile is added")
+    
+    # Page 2 only differs in a script; John left page 1 and Jane changed name
+    changed = LISTING_HTML.replace('<h3>Jane Smith</h3>', '<h3>Jane Smith-Lee</h3>')
+    changed = changed.replace('Contact: john@example.com', 'Contact: (none)')
+    spider, stats = crawl({page_one: changed, page_two: PAGE_TWO_HTML % 2})
+    assert stats.get_value('delta/pages_skipped') == 1
+    assert spider.role_counts['UGC'] == 2
+    print("✓ Unchanged page skipped, its profiles still count towards the quota")
+    
+    delta = {row['email']: row['change'] for row in read(delta_file)}
+    assert delta == {'jane@example.com': 'changed', 'john@example.com': 'removed'}
+    snapshot = {row['email']: row['name'] for row in read(output_file)}
+    assert snapshot == {'ana@example.com': 'Ana Lopez', 'jane@example.com': 'Jane Smith-Lee'}
+    print("✓ Delta holds only changed and removed profiles; snapshot merged")
+    
+    spider, stats = crawl({page_one: changed, page_two: PAGE_TWO_HTML % 3})
+    assert read(delta_file) == [] and len(read(output_file)) == 2
+    assert stats.get_value('delta/pages_skipped') == 2
+    print("✓ Nothing changed: empty delta, both pages skipped")
+    print()
+
+
+class MockDirectoryHandler(BaseHTTPRequestHandler):
+    """Three listing pages of three creators per role; counts page hits"""
+    
+    hits = {}
+    lock = threading.Lock()
+    
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        match = re.fullmatch(r'/creators/(\w+)', parts.path)
+        page = int(parse_qs(parts.query).get('page', ['1'])[0])
+        if match is None or not 1 <= page <= 3:
+            self.send_error(404)
+            return
+        with self.lock:
+            self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        role = match.group(1)
+        cards = []
+        for i in range(3):
+            # The first creator is listed under both roles
+            email = 'both@example.com' if page == 1 and i == 0 else f'{role}{page}{i}@example.com'
+            cards.append(
+                f'<div class="creator-card"><a href="/profiles/{role}{page}{i}">x</a>'
+                f'<h3>Creator {role} {page}{i}</h3><a href="mailto:{email}">Email</a></div>'
+            )
+        if page < 3:
+            cards.append(f'<a class="next" href="/creators/{role}?page={page + 1}">Next</a>')
+        body = f"<html><body>{''.join(cards)}</body></html>".encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def test_distributed_workers(tmp_path=None):
+    """Test that workers share one queue, dedup and output against a mock site"""
+    print("Testing distributed crawl with two workers...")
+    import csv
+    import os
+    import tempfile
+    from run_scraper import run_distributed
+    from roster_scraper.distributed import SQLiteWorkQueue, request_task, shard_path
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    output_file = os.path.join(directory, 'profiles.csv')
+    queue_path = os.path.join(directory, 'queue.sqlite3')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockDirectoryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    overrides = {
+        'ROLE_URLS': {'UGC': f'{base}/creators/ugc', 'Video': f'{base}/creators/video'},
+        'DOWNLOAD_HANDLERS': {},
+        'FETCH_MODE': 'http',
+        'DOWNLOAD_DELAY': 0,
+        'AIMD_MIN_DELAY': 0,
+        'WORKER_POLL_INTERVAL': 0.2,
+        'SELECTOR_STRATEGY_FILE': None,
+        'METRICS_ENABLED': False,
+        'LOG_LEVEL': 'WARNING',
+        'EXPORT_FORMAT': 'csv',
+    }
+    spider_kwargs = {'roles': 'UGC,Video', 'min_per_role': 100, 'output_file': output_file}
+    try:
+        status = run_distributed(2, queue_path, spider_kwargs, overrides)
+    finally:
+        server.shutdown()
+    assert status == 0
+    
+    assert sorted(MockDirectoryHandler.hits.values()) == [1] * 6
+    print("✓ Every listing page fetched exactly once across workers")
+    
+    queue = SQLiteWorkQueue(queue_path)
+    assert queue.task_counts() == {'done': 6}
+    assert set(queue.workers()) == {'1', '2'}
+    queue.close()
+    assert all(os.path.exists(shard_path(output_file, worker)) for worker in ('1', '2'))
+    
+    with open(output_file, newline='', encoding='utf-8') as f:
+        emails = [row['email'] for row in csv.DictReader(f)]
+    assert len(emails) == len(set(emails)) == 17
+    print(f"✓ {len(emails)} profiles merged from both shards, shared creator kept once")
+    
+    # A request stopped because its role's quota is met is cancelled, not failed
+    from scrapy.exceptions import IgnoreRequest
+    from twisted.python.failure import Failure
+    
+    spider = ShouttSpider(roles='UGC', min_per_role=1)
+    spider.work_queue = SQLiteWorkQueue(os.path.join(directory, 'errback.sqlite3'))
+    for page in (1, 2):
+        spider.work_queue.push(request_task(spider.listing_request(f'{base}/creators/ugc?page={page}', 'UGC', page)))
+    
+    def errback(request, error):
+        failure = Failure(error)
+        failure.request = request
+        spider.task_failed(failure)
+    
+    (first_id, first), (second_id, second) = spider.work_queue.claim('1', 2)
+    errback(spider.task_request(first_id, first), ConnectionRefusedError())
+    spider.satisfied_roles.add('UGC')
+    errback(spider.task_request(second_id, second), IgnoreRequest('UGC quota already met'))
+    assert spider.work_queue.task_counts() == {'failed': 1, 'cancelled': 1}
+    spider.work_queue.close()
+    print("✓ Quota cancellations end as cancelled tasks, real errors as failed")
+    
+    # A live worker's heartbeat keeps its claim; a silent one loses it
+    import time
+    queue = SQLiteWorkQueue(os.path.join(directory, 'lease.sqlite3'), lease_timeout=0.2)
+    queue.push(request_task(spider.listing_request(f'{base}/creators/video', 'Video', 1)))
+    assert len(queue.claim('1')) == 1
+    time.sleep(0.3)
+    assert queue.heartbeat('1') == 1
+    assert queue.claim('2') == []
+    time.sleep(0.3)
+    assert len(queue.claim('2')) == 1
+    queue.close()
+    print("✓ Leases renewed by the heartbeat are not handed out again")
+    
+    # A registered worker whose shard is not here fails the merge
+    from roster_scraper.distributed import merge_shards
+    shards = [shard_path(output_file, worker) for worker in ('1', '2', 'remote-host')]
+    try:
+        merge_shards(shards, os.path.join(directory, 'partial.csv'))
+        raise AssertionError("merge ignored a missing shard")
+    except FileNotFoundError as e:
+        assert 'worker-remote-host.jsonl' in str(e)
+    assert not os.path.exists(os.path.join(directory, 'partial.csv'))
+    print("✓ Missing shards fail the merge instead of being skipped")
+    print()
+
+
+def test_parallel_roles(tmp_path=None):
+    """Test that role processes stream rows back to one deduped output"""
+    print("Testing parallel role processes...")
+    import csv
+    import os
+    import tempfile
+    from run_scraper import run_parallel_roles
+    
+    directory = str(tmp_path or tempfile.mkdtemp())
+    output_file = os.path.join(directory, 'profiles.csv')
+    MockDirectoryHandler.hits.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockDirectoryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    overrides = {
+        'ROLE_URLS': {'UGC': f'{base}/creators/ugc', 'Video': f'{base}/creators/video'},
+        'DOWNLOAD_HANDLERS': {},
+        'FETCH_MODE': 'http',
+        'DOWNLOAD_DELAY': 0,
+        'AIMD_MIN_DELAY': 0,
+        'SELECTOR_STRATEGY_FILE': None,
+        'METRICS_ENABLED': False,
+        'LOG_LEVEL': 'WARNING',
+        'EXPORT_FORMAT': 'csv',
+    }
+    spider_kwargs = {'roles': 'UGC,Video', 'min_per_role': 100, 'output_file': output_file}
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        status = run_parallel_roles(spider_kwargs, overrides)
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+        server.shutdown()
+    assert status == 0
+    print("✓ Both role processes finished cleanly")
+    
+    # The shared creator is dropped inside a role process, before it counts
+    # towards that role's quota, not later in the parent
+    summaries = [re.search(r'(\d+) rows received, (\d+) written', m) for m in messages if m.startswith('Role ')]
+    summaries = [match.groups() for match in summaries if match]
+    assert len(summaries) == 2 and all(received == written for received, written in summaries)
+    assert sorted(int(written) for _, written in summaries) == [8, 9]
+    assert any('below --min-per-role 100' in m for m in messages)
+    assert not os.path.exists(os.path.join(directory, 'profiles.seen.sqlite3'))
+    print("✓ Roles dedup against a shared store; shortfalls against the quota are reported")
+    
+    with open(output_file, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    emails = [row['email'] for row in rows]
+    assert len(emails) == len(set(emails)) == 17
+    assert {row['role_type'] for row in rows} == {'UGC', 'Video'}
+    print(f"✓ {len(emails)} profiles merged from both roles, shared creator kept once")
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Running Spider Tests")
+    print("=" * 50)
+    print()
+    
+    test_url_pattern()
+    test_hybrid_plain_http()
+    test_hybrid_render_fallback()
+    test_selector_strategy_learns_and_persists()
+    test_selector_priority_kept_per_card()
+    test_page_wide_email_extraction()
+    test_scroll_harvest_stops_at_quota()
+    test_scroll_harvest_stops_when_idle()
+    test_checkpoint_resume()
+    test_quota_counts_accepted_items()
+    test_detail_pages_for_missing_emails()
+    test_incremental_delta_crawl()
+    test_distributed_workers()
+    test_parallel_roles()
+    
+    print("=" * 50)
+    print("All tests completed!")
+    print("=" * 50)